@@ -0,0 +1,144 @@
+import os
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+
+
+# ----------------------------
+# Config
+# ----------------------------
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() == "true"
+# Cosine similarity between query embeddings required for a hit
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))
+# Fraction of retrieved chunks two turns must share (Jaccard) to reuse an answer
+ANSWER_CACHE_CONTEXT_OVERLAP = float(os.getenv("ANSWER_CACHE_CONTEXT_OVERLAP", "0.6"))
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "2000"))
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", str(6 * 3600)))
+# How many trailing history messages make up the "conversation state"
+ANSWER_CACHE_HISTORY_MESSAGES = int(os.getenv("ANSWER_CACHE_HISTORY_MESSAGES", "2"))
+
+
+def context_fingerprint(chunks: Iterable[str]) -> frozenset:
+    """Order-insensitive fingerprint of the retrieved context: the set of chunk hashes."""
+    return frozenset(hashlib.sha1(c.strip().encode("utf-8")).hexdigest()[:16] for c in chunks)
+
+
+def state_fingerprint(chat_history: list, variant: str = "") -> str:
+    # The prompt variant changes the answer as much as the history does
+    recent = chat_history[-ANSWER_CACHE_HISTORY_MESSAGES:] if ANSWER_CACHE_HISTORY_MESSAGES else []
+    joined = variant + "\x1d" + "\x1e".join(f"{role}\x1f{msg}" for role, msg in recent)
+    return hashlib.sha1(joined.encode("utf-8")).hexdigest()
+
+
+class _Entry:
+    __slots__ = ("vector", "context_fp", "state_fp", "answer", "llm_seconds", "expires_at")
+
+    def __init__(self, vector, context_fp, state_fp, answer, llm_seconds, expires_at):
+        self.vector = vector
+        self.context_fp = context_fp
+        self.state_fp = state_fp
+        self.answer = answer
+        self.llm_seconds = llm_seconds
+        self.expires_at = expires_at
+
+
+class SemanticAnswerCache:
+    """
+    Returns a stored LLM answer when a new question is semantically close to a
+    previous one (cosine >= threshold), was asked in the same conversation
+    state, and retrieved substantially the same context.
+
+    Entries are evicted LRU-first beyond `max_entries` and expire after `ttl`.
+    `invalidate()` drops everything, e.g. after the FAISS index is rebuilt.
+    """
+
+    def __init__(self, threshold: float = ANSWER_CACHE_THRESHOLD,
+                 context_overlap: float = ANSWER_CACHE_CONTEXT_OVERLAP,
+                 max_entries: int = ANSWER_CACHE_MAX_ENTRIES, ttl: float = ANSWER_CACHE_TTL):
+        self.threshold = threshold
+        self.context_overlap = context_overlap
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[int, _Entry]" = OrderedDict()
+        self._next_id = 0
+        self._index_version: Optional[str] = None
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "bypassed": 0, "invalidations": 0,
+                       "latency_saved_seconds": 0.0}
+
+    @staticmethod
+    def _unit(vector: List[float]) -> np.ndarray:
+        v = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(v)
+        return v / norm if norm else v
+
+    def _overlap(self, a: frozenset, b: frozenset) -> float:
+        if not a and not b:
+            return 1.0
+        return len(a & b) / len(a | b)
+
+    def lookup(self, query_vector: List[float], context_fp: frozenset, state_fp: str) -> Optional[str]:
+        q = self._unit(query_vector)
+        now = time.time()
+        with self._lock:
+            best_id, best_sim = None, self.threshold
+            for entry_id, entry in list(self._entries.items()):
+                if entry.expires_at < now:
+                    del self._entries[entry_id]
+                    continue
+                if entry.state_fp != state_fp:
+                    continue
+                sim = float(np.dot(q, entry.vector))
+                if sim >= best_sim and self._overlap(entry.context_fp, context_fp) >= self.context_overlap:
+                    best_id, best_sim = entry_id, sim
+
+            if best_id is None:
+                self._stats["misses"] += 1
+                return None
+            entry = self._entries[best_id]
+            self._entries.move_to_end(best_id)
+            self._stats["hits"] += 1
+            self._stats["latency_saved_seconds"] += entry.llm_seconds
+            return entry.answer
+
+    def store(self, query_vector: List[float], context_fp: frozenset, state_fp: str,
+              answer: str, llm_seconds: float) -> None:
+        entry = _Entry(self._unit(query_vector), context_fp, state_fp, answer, llm_seconds,
+                       time.time() + self.ttl)
+        with self._lock:
+            self._entries[self._next_id] = entry
+            self._next_id += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def record_bypass(self) -> None:
+        with self._lock:
+            self._stats["bypassed"] += 1
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._stats["invalidations"] += 1
+
+    def sync_index_version(self, version: str) -> None:
+        """Drop every entry when the FAISS index answers were computed against changes."""
+        if version != self._index_version:
+            if self._index_version is not None:
+                self.invalidate()
+            self._index_version = version
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            snapshot = dict(self._stats)
+            snapshot["entries"] = len(self._entries)
+        lookups = snapshot["hits"] + snapshot["misses"]
+        snapshot["hit_rate"] = snapshot["hits"] / lookups if lookups else 0.0
+        snapshot["enabled"] = ANSWER_CACHE_ENABLED
+        return snapshot
+
+
+answer_cache = SemanticAnswerCache()
@@ -1,16 +1,34 @@
+import os
+import json
+import asyncio
+import logging
+from contextlib import asynccontextmanager
 import markdown2
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Header
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
 from pydantic import BaseModel, EmailStr
 from typing import List, Optional, Dict, Any
 from uuid import uuid4
 from datetime import datetime
-import psycopg2
 
-from database_setup import DB_NAME, DB_USER, DB_PASSWORD, DB_HOST, DB_PORT
-from backend.chat_logic import build_chatbot_response
+from backend import db
+from backend.message_writer import arecord_turn, pending_messages, write_behind, writer_stats
+from backend.chat_logic import abuild_chatbot_response, astream_chatbot_response
+from backend.llm_client import prompt_registry
+from backend.model_router import model_router
+from backend.retriever import embedding_model, live_index, web_index
+from backend.answer_cache import answer_cache
+from backend.web_cache import web_cache
+from backend.history_manager import SessionHistory, aload_summary, schedule_summary_update
+from crawler.browser_pool import browser_pool
 
 
+# The app owns logging setup; set LOG_LEVEL=DEBUG to also get sampled full prompts (llm_client.py)
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO").upper(),
+                    format="[%(levelname)s] %(name)s: %(message)s")
+
 app = FastAPI()
 
 # Allow frontend to access backend
@@ -22,6 +40,13 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Upper bound on chats being answered at once in this process; requests beyond
+# it wait up to CHAT_QUEUE_TIMEOUT seconds for a slot, then get a 503.
+CHAT_MAX_CONCURRENCY = int(os.getenv("CHAT_MAX_CONCURRENCY", "256"))
+CHAT_QUEUE_TIMEOUT = float(os.getenv("CHAT_QUEUE_TIMEOUT", "30"))
+chat_limiter = asyncio.Semaphore(CHAT_MAX_CONCURRENCY)
+chat_stats = {"in_flight": 0, "rejected": 0}
+
 
 # ----------------------------
 # Pydantic Models
@@ -44,6 +69,8 @@ class UserRegisterResponse(BaseModel):
 class SentMessage(BaseModel):
     query: str
     session_id: str
+    bypass_cache: bool = False  # skip the semantic answer cache for this session/turn
+    prompt_variant: Optional[str] = None  # "comprehensive" | "concise"; None uses PROMPT_VARIANT
 
 
 class ChatResponse(BaseModel):
@@ -51,6 +78,8 @@ class ChatResponse(BaseModel):
     answer: str
     source: Optional[str] = None
     matched: bool = True
+    # Retrieval route (kb | web | none) and the similarity scores behind it
+    retrieval: Optional[Dict[str, Any]] = None
 
 
 class HistoryResponse(BaseModel):
@@ -62,16 +91,7 @@ class HistoryResponse(BaseModel):
 # DB Helpers
 # ----------------------------
 
-def _get_conn():
-    return psycopg2.connect(
-        dbname=DB_NAME, user=DB_USER, password=DB_PASSWORD, host=DB_HOST, port=DB_PORT
-    )
-
-
-def save_user_and_new_session(*, username, email, mobile, browser, ip) -> str:
-    conn = _get_conn()
-    cursor = conn.cursor()
-
+def _save_user_and_new_session(cursor, *, username, email, mobile, browser, ip) -> str:
     # 1. Ensure user exists
     cursor.execute("""
         INSERT INTO users (username, email, mobile, browser, ip)
@@ -101,37 +121,17 @@ def save_user_and_new_session(*, username, email, mobile, browser, ip) -> str:
         VALUES (%s, %s, %s, %s)
     """, (session_id, "bot", "Hello 👋 How can I assist you today?", datetime.now().isoformat()))
 
-    conn.commit()
-    cursor.close()
-    conn.close()
     return session_id
 
 
-def save_message(*, session_id, role, message, timestamp):
-    conn = _get_conn()
-    cursor = conn.cursor()
-    cursor.execute("""
-        INSERT INTO messages (session_id, role, message, timestamp)
-        VALUES (%s, %s, %s, %s)
-    """, (session_id, role, message, timestamp))
-    conn.commit()
-    cursor.close()
-    conn.close()
-
-
-def get_messages_for_session(session_id):
-    conn = _get_conn()
-    cursor = conn.cursor()
+def _get_messages_for_session(cursor, session_id):
     cursor.execute("""
         SELECT role, message, timestamp
         FROM messages
         WHERE session_id = %s
         ORDER BY timestamp ASC
     """, (session_id,))
-    rows = cursor.fetchall()
-    cursor.close()
-    conn.close()
-    return rows
+    return cursor.fetchall()
 
 
 # ----------------------------
@@ -139,9 +139,10 @@ def get_messages_for_session(session_id):
 # ----------------------------
 
 @app.post("/user/register", response_model=UserRegisterResponse)
-def register_user(user: UserCreate):
+async def register_user(user: UserCreate):
     try:
-        session_id = save_user_and_new_session(
+        session_id = await db.arun(
+            _save_user_and_new_session,
             username=user.username,
             email=user.email,
             mobile=user.mobile,
@@ -157,14 +158,58 @@ def register_user(user: UserCreate):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+async def _acquire_chat_slot():
+    try:
+        await asyncio.wait_for(chat_limiter.acquire(), timeout=CHAT_QUEUE_TIMEOUT)
+    except asyncio.TimeoutError:
+        chat_stats["rejected"] += 1
+        raise HTTPException(status_code=503, detail="Chat service is busy, please retry")
+    chat_stats["in_flight"] += 1
+
+
+def _release_chat_slot():
+    chat_stats["in_flight"] -= 1
+    chat_limiter.release()
+
+
+@asynccontextmanager
+async def _chat_slot():
+    await _acquire_chat_slot()
+    try:
+        yield
+    finally:
+        _release_chat_slot()
+
+
+async def _load_history(session_id: str) -> SessionHistory:
+    rows, (summary, summarized) = await asyncio.gather(
+        db.arun(_get_messages_for_session, session_id), aload_summary(session_id)
+    )
+    rows = rows + pending_messages(session_id)
+    return SessionHistory([(r, m) for (r, m, _) in rows], summary=summary, summarized=summarized)
+
+
+def _render_markdown(text: str) -> str:
+    return markdown2.markdown(text, extras=["fenced-code-blocks", "tables"])
+
+
+def _sse(event: str, payload: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+
+
 @app.post("/chat/send", response_model=ChatResponse)
-def send_message(req: SentMessage):
+async def send_message(req: SentMessage):
+    async with _chat_slot():
+        return await _answer_message(req)
+
+
+async def _answer_message(req: SentMessage) -> ChatResponse:
     timestamp = datetime.now().isoformat()
 
     # Build response
-    rows = get_messages_for_session(req.session_id)
-    history = [(r, m) for (r, m, _) in rows]
-    result = build_chatbot_response(req.query, history)
+    history = await _load_history(req.session_id)
+    result = await abuild_chatbot_response(req.query, history, use_cache=not req.bypass_cache,
+                                           prompt_variant=req.prompt_variant)
 
     try:
         answer, matched, meta = result
@@ -173,11 +218,14 @@ def send_message(req: SentMessage):
         meta = {}
 
     # Convert answer to HTML using markdown2
-    answer_html = markdown2.markdown(answer, extras=["fenced-code-blocks", "tables"])
+    answer_html = _render_markdown(answer)
     
-    # Save messages
-    save_message(session_id=req.session_id, role="user", message=req.query, timestamp=timestamp)
-    save_message(session_id=req.session_id, role="bot", message=answer, timestamp=timestamp)
+    # Save both sides of the turn together (one transaction, or write-behind)
+    await arecord_turn([
+        (req.session_id, "user", req.query, timestamp),
+        (req.session_id, "bot", answer, timestamp),
+    ])
+    schedule_summary_update(req.session_id, history)
 
     # Source info
     source_flag = None
@@ -192,23 +240,121 @@ def send_message(req: SentMessage):
         session_id=req.session_id,
         answer=answer_html,
         source=source_flag,
-        matched=matched
+        matched=matched,
+        retrieval=meta.get("retrieval") if isinstance(meta, dict) else None,
+    )
+
+
+@app.post("/chat/stream")
+async def stream_message(req: SentMessage):
+    """
+    Server-Sent Events version of /chat/send.
+
+    Emits `token` events ({"token": "..."}) as the LLM produces text, then one
+    `done` event carrying the full answer rendered as HTML and the retrieval
+    metadata. The turn is saved once the stream has finished.
+    """
+    await _acquire_chat_slot()
+    timestamp = datetime.now().isoformat()
+    slot = {"held": True}
+
+    def release_once():
+        # Called from the generator and again as a background task, in case the
+        # client disconnects before the generator ever starts
+        if slot["held"]:
+            slot["held"] = False
+            _release_chat_slot()
+
+    async def events():
+        try:
+            history = await _load_history(req.session_id)
+            pieces, meta = [], {}
+            async for piece in astream_chatbot_response(req.query, history, use_cache=not req.bypass_cache,
+                                                        metadata=meta, prompt_variant=req.prompt_variant):
+                pieces.append(piece)
+                yield _sse("token", {"token": piece})
+
+            if meta.get("failed"):
+                # Don't persist a partial answer; the client already got the error text
+                yield _sse("error", {"detail": "The answer was interrupted, please retry"})
+                return
+            answer = "".join(pieces)
+            await arecord_turn([
+                (req.session_id, "user", req.query, timestamp),
+                (req.session_id, "bot", answer, timestamp),
+            ])
+            schedule_summary_update(req.session_id, history)
+            yield _sse("done", {"session_id": req.session_id, "answer": _render_markdown(answer),
+                                "retrieval": meta.get("retrieval")})
+        except Exception as e:
+            yield _sse("error", {"detail": str(e)})
+        finally:
+            release_once()
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        background=BackgroundTask(release_once),
     )
 
 
 @app.get("/chat/{session_id}/messages", response_model=HistoryResponse)
-def get_chat_messages(session_id: str):
-    rows = get_messages_for_session(session_id)
+async def get_chat_messages(session_id: str):
+    rows = await db.arun(_get_messages_for_session, session_id) + pending_messages(session_id)
     if not rows:
         raise HTTPException(status_code=404, detail="No messages found for this session")
 
     messages = [
         {"role": role, 
         #  "message": msg,
-         "message": markdown2.markdown(msg, extras=["fenced-code-blocks", "tables"]),
+         "message": _render_markdown(msg),
          "timestamp": ts.isoformat() if ts else None
          }
         for (role, msg, ts) in rows
     ]
 
     return HistoryResponse(session_id=session_id, messages=messages)
+
+
+# Shared secret for /admin routes; when unset they are open (local/dev setups)
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+
+
+@app.post("/admin/index/reload")
+def reload_index(force: bool = False, x_admin_token: Optional[str] = Header(default=None)):
+    # Sync route: the load runs on the threadpool while queries keep using the old index
+    if ADMIN_TOKEN and x_admin_token != ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+    swapped = live_index.reload(force=force)
+    return {"reloaded": swapped, "index": live_index.snapshot()}
+
+
+@app.get("/metrics")
+def get_metrics():
+    return {
+        "db_pool": db.pool_stats(),
+        "message_writer": writer_stats(),
+        "chat": {**chat_stats, "max_concurrency": CHAT_MAX_CONCURRENCY},
+        "embedding_cache": embedding_model.stats(),
+        "answer_cache": answer_cache.stats(),
+        "web_cache": web_cache.stats(),
+        "browser_pool": dict(browser_pool.stats),
+        "index": live_index.snapshot(),
+        "prompts": prompt_registry.stats(),
+        "llm_routes": model_router.stats(),
+        "web_index": web_index.snapshot(),
+    }
+
+
+@app.on_event("startup")
+def start_index_watcher():
+    live_index.start_watcher()
+
+
+@app.on_event("shutdown")
+def close_pools():
+    live_index.stop_watcher()
+    write_behind.close()
+    db.pool.closeall()
+    browser_pool.close()
@@ -1,8 +1,52 @@
-from backend.retriever import retriever
-from backend.llm_client import call_llm_with_context
-from typing import List
-from backend.search_client import search_site
-from crawler.scraper import scrape_url
+import time
+import asyncio
+from dataclasses import dataclass, field
+from backend.retriever import retrieve_fused, aretrieve_fused, embedding_model, index_version
+from backend.llm_client import (
+    call_llm_with_context, acall_llm_with_context,
+    stream_llm_with_context, astream_llm_with_context, prompt_registry,
+)
+from backend.answer_cache import (
+    answer_cache, context_fingerprint, state_fingerprint, ANSWER_CACHE_ENABLED,
+)
+from typing import List, Optional
+from backend.web_fallback import collect_web_pages, acollect_web_pages
+from backend.reranker import make_reranker, rerank, select_within_budget
+from backend.history_manager import render_history
+from backend.model_router import ModelRoute, LARGE_ROUTE, model_router
+from backend.relevance import ROUTE_KB, ROUTE_WEB, ROUTE_NONE, RetrievalDecision, decide
+from backend.web_index import CHUNK_SIZE, CHUNK_OVERLAP
+from chunking.chunk_generator import chunk_text
+
+# Orders retrieved chunks by relevance before they're cut to the context token budget;
+# candidate chunks bypass the embedding cache so they don't evict cached queries
+reranker = make_reranker(embeddings=embedding_model.underlying, query_embeddings=embedding_model)
+
+
+@dataclass
+class PreparedInputs:
+    """Everything the LLM call needs for one turn, plus what the caches key on."""
+    context_text: str
+    history_text: str
+    chunks: List[str] = field(default_factory=list)
+    cache_key: Optional[tuple] = None
+    decision: Optional[RetrievalDecision] = None
+    used_web: bool = False
+    variant: str = prompt_registry.default
+    route: ModelRoute = LARGE_ROUTE
+    route_reason: str = "default"
+
+    def metadata(self) -> dict:
+        """Response metadata: where the context came from and the scores behind it."""
+        route = self.decision.route if self.decision else ROUTE_KB
+        fallback = self.decision.fallback if self.decision else None
+        return {
+            "used_kb": route == ROUTE_KB or fallback == ROUTE_KB,
+            "used_web": self.used_web,
+            "retrieval": self.decision.as_metadata() if self.decision else None,
+            "prompt_variant": self.variant,
+            "model_route": {"route": self.route.name, "model": self.route.model_name, "reason": self.route_reason},
+        }
 
 
 def _dedupe_chunks(docs) -> List[str]:
@@ -24,77 +68,299 @@ def _maybe_expand_queries(query: str) -> List[str]:
         f"In-depth explanation of {query}",
     ]))
 
-def build_chatbot_response(query: str, chat_history: list, site: str="ditstek.com"):
-    """
-    Retrieves context for the query, calls LLM, and returns chatbot response.
-    `chat_history` is a list of tuples: [(role, message), ...]
-    """
-    # 1) Retrieve with light fusion
-    variant_queries = _maybe_expand_queries(query)
-    pooled_docs = []
-    for q in variant_queries:
-        pooled_docs.extend(retriever.get_relevant_documents(q))
+def _select_context(query: str, texts: List[str]) -> List[str]:
+    ranked = rerank(reranker, query, texts)
+    return select_within_budget([text for text, _ in ranked])
 
-    # De-duplicate chunks
+def _build_context(query: str, pooled_docs):
+    # Fused results are already unique; re-rank them and fill the token budget
     unique_texts = _dedupe_chunks(pooled_docs)
+    chunks = _select_context(query, unique_texts)
 
-    # Construct richer context (cap to avoid over-long prompts)
-    MAX_CHUNKS = 10
     context_text = "\n\n---\n\n".join([
         f"Source {i+1}:\n{chunk}"
-        for i, chunk in enumerate(
-        unique_texts[:MAX_CHUNKS])
+        for i, chunk in enumerate(chunks)
     ])
 
     # Debug logs
     print(f"[DEBUG] Retrieved {len(pooled_docs)} docs, {len(unique_texts)} unique. "
-      f"Using {min(len(unique_texts), MAX_CHUNKS)} chunks.")
+      f"Using {len(chunks)} chunks after {reranker.name} re-ranking.")
     print("\n[DEBUG] Final context passed to LLM:\n", context_text[:1500],
       "\n[...]" if len(context_text) > 1500 else "")
+    return context_text, chunks
 
-    # 2) If FAISS gave nothing, fallback to site-specific internet search
-    if not context_text.strip():
-        print("[DEBUG] No context from FAISS. Falling back to internet search...")
-        search_results = search_site(query, site)
-        scraped_texts = []
-
-        for res in search_results:
-            url = res.get("url")
-            title = res.get("title") or url
-            if url:
-                text = scrape_url(url)  # ✅ sync call into Playwright
-                if text:
-                    scraped_texts.append(f"[{title}]({url}): {text}")
-
-        context_text = "\n\n".join(scraped_texts[:MAX_CHUNKS])
-
-        if not context_text.strip():
-            return (
-                "No relevant content found. Please visit the website directly "
-                f"[{site}](https://{site}).",
-                True
+def _uses_web_index(docs, chunks: List[str]) -> bool:
+    # Chunks retrieved from the live web index (scraped pages) count as web sources
+    web_texts = {d.page_content.strip() for d in docs if d.metadata.get("origin") == "web"}
+    return any(chunk in web_texts for chunk in chunks)
+
+def _web_context(query: str, pages):
+    # Chunk each page like the KB so the reranker and token budget pick passages,
+    # not whole pages; every chunk keeps its page's title and URL for citation
+    scraped_texts = []
+    for res, text in pages:
+        if text:
+            title = res.get("title") or res.get("url")
+            scraped_texts.extend(
+                f"[{title}]({res.get('url')}): {chunk}"
+                for chunk in chunk_text(text, chunk_size=CHUNK_SIZE, overlap=CHUNK_OVERLAP)
             )
+    scraped_texts = _select_context(query, scraped_texts)
+    return "\n\n".join(scraped_texts), scraped_texts
 
-    # 3) Format history
-    history_text = "\n".join(
-        f"{'User' if role == 'user' else 'Assistant'}: {msg}"
-        for role, msg in chat_history
-    )
+def _format_history(chat_history: list) -> str:
+    # Rolling summary + newest messages, trimmed to the history token budget
+    return render_history(chat_history)
 
-    answer = call_llm_with_context(
-    context=context_text,
-    history=history_text,
-    question=query,
-    detail_level="high"  # Always request detailed responses
+# Sent in place of retrieved context when the question is off-topic for the site
+NO_CONTEXT_TEXT = "(No relevant knowledge base content for this question; answer from general knowledge.)"
+
+def _no_content_response(site: str, prepared: PreparedInputs):
+    return (
+        "No relevant content found. Please visit the website directly "
+        f"[{site}](https://{site}).",
+        True,
+        prepared.metadata(),
     )
 
+EMPTY_ANSWER_FALLBACK = (
+    "No relevant content found. Please submit your query via our "
+    "[Contact Form](https://www.ditstek.com/contact)."
+)
+
+def _finalize_answer(answer: str):
     # 5) Fallback phrasing: relax strict check
     # Only fallback if the answer is *completely empty*
     if not answer.strip():
-        return (
-            "No relevant content found. Please submit your query via our "
-            "[Contact Form](https://www.ditstek.com/contact).",
-            True
-        )
+        return EMPTY_ANSWER_FALLBACK, True
 
     return answer, True
+
+def _prepare_llm_inputs(query: str, chat_history: list, site: str) -> PreparedInputs:
+    """
+    Runs retrieval, then the relevance policy decides between knowledge-base
+    context, the web fallback, or no context at all. An empty `context_text`
+    means nothing relevant was found.
+    """
+    # 1) Retrieve with light fusion (one embedding call, RRF-merged results)
+    pooled_docs = retrieve_fused(_maybe_expand_queries(query))
+    decision, relevant_docs = decide(pooled_docs)
+    prepared = PreparedInputs("", _format_history(chat_history), decision=decision)
+
+    # 2) Knowledge base covers it, the web might, or it's off-topic for the site
+    if decision.route == ROUTE_KB:
+        prepared.context_text, prepared.chunks = _build_context(query, relevant_docs)
+        prepared.used_web = _uses_web_index(relevant_docs, prepared.chunks)
+    if decision.route == ROUTE_WEB or (decision.route == ROUTE_KB and not prepared.context_text.strip()):
+        print("[DEBUG] No relevant context from FAISS. Falling back to internet search...")
+        pages = collect_web_pages(query, site)
+        prepared.context_text, prepared.chunks = _web_context(query, pages)
+        prepared.used_web = bool(prepared.chunks)
+        if not prepared.used_web and decision.route == ROUTE_WEB and relevant_docs:
+            # Nothing from the web: near-topic KB chunks beat no answer at all
+            decision.fallback = ROUTE_KB
+            prepared.context_text, prepared.chunks = _build_context(query, relevant_docs)
+            prepared.used_web = _uses_web_index(relevant_docs, prepared.chunks)
+    if decision.route == ROUTE_NONE:
+        prepared.context_text = NO_CONTEXT_TEXT
+    return prepared
+
+async def _aprepare_llm_inputs(query: str, chat_history: list, site: str) -> PreparedInputs:
+    """Async variant of `_prepare_llm_inputs`."""
+    # 1) Retrieve with light fusion (one embedding call, RRF-merged results)
+    pooled_docs = await aretrieve_fused(_maybe_expand_queries(query))
+    decision, relevant_docs = decide(pooled_docs)
+    prepared = PreparedInputs("", _format_history(chat_history), decision=decision)
+
+    # 2) Knowledge base covers it, the web might (search + scrape concurrently), or it's off-topic
+    if decision.route == ROUTE_KB:
+        prepared.context_text, prepared.chunks = await asyncio.to_thread(_build_context, query, relevant_docs)
+        prepared.used_web = _uses_web_index(relevant_docs, prepared.chunks)
+    if decision.route == ROUTE_WEB or (decision.route == ROUTE_KB and not prepared.context_text.strip()):
+        print("[DEBUG] No relevant context from FAISS. Falling back to internet search...")
+        pages = await acollect_web_pages(query, site)
+        prepared.context_text, prepared.chunks = await asyncio.to_thread(_web_context, query, pages)
+        prepared.used_web = bool(prepared.chunks)
+        if not prepared.used_web and decision.route == ROUTE_WEB and relevant_docs:
+            # Nothing from the web: near-topic KB chunks beat no answer at all
+            decision.fallback = ROUTE_KB
+            prepared.context_text, prepared.chunks = await asyncio.to_thread(_build_context, query, relevant_docs)
+            prepared.used_web = _uses_web_index(relevant_docs, prepared.chunks)
+    if decision.route == ROUTE_NONE:
+        prepared.context_text = NO_CONTEXT_TEXT
+    return prepared
+
+def _choose_route(prepared: PreparedInputs, query: str, prompt_variant: Optional[str]) -> None:
+    # Quick questions get the small model and the concise prompt unless the request picked a prompt
+    route, reason = model_router.choose(query, prepared.decision.route if prepared.decision else None)
+    prepared.route, prepared.route_reason = route, reason
+    prepared.variant = prompt_registry.resolve(prompt_variant or route.variant)
+    print(f"[DEBUG] Model route: {route.name} ({route.model_name}, {reason}), prompt {prepared.variant}")
+
+# ----------------------------
+# Semantic answer cache
+# ----------------------------
+
+def _cache_enabled(use_cache: bool) -> bool:
+    if not ANSWER_CACHE_ENABLED:
+        return False
+    if not use_cache:
+        answer_cache.record_bypass()
+        return False
+    answer_cache.sync_index_version(index_version())
+    return True
+
+def _cache_lookup(prepared: PreparedInputs, query_vector, chat_history: list) -> Optional[str]:
+    # The query vector is already in the embedding cache from retrieval
+    prepared.cache_key = (
+        query_vector, context_fingerprint(prepared.chunks), state_fingerprint(chat_history, f"{prepared.variant}/{prepared.route.name}")
+    )
+    cached = answer_cache.lookup(*prepared.cache_key)
+    if cached is not None:
+        print("[DEBUG] Semantic answer cache hit — skipping LLM call.")
+    return cached
+
+def _cache_store(prepared: PreparedInputs, answer: str, llm_seconds: float) -> None:
+    if prepared.cache_key is not None and answer.strip() and not answer.startswith("[Error invoking LLM"):
+        answer_cache.store(*prepared.cache_key, answer=answer, llm_seconds=llm_seconds)
+
+# ----------------------------
+# Entry points
+# ----------------------------
+
+def build_chatbot_response(query: str, chat_history: list, site: str="ditstek.com", use_cache: bool = True,
+                           prompt_variant: Optional[str] = None):
+    """
+    Retrieves context for the query, calls LLM, and returns
+    (answer, matched, metadata), metadata describing the retrieval route.
+    `chat_history` is a list of tuples: [(role, message), ...]
+    Pass `use_cache=False` to skip the semantic answer cache for this turn, and
+    `prompt_variant` ("comprehensive" or "concise") to pick the prompt.
+    """
+    prepared = _prepare_llm_inputs(query, chat_history, site)
+    _choose_route(prepared, query, prompt_variant)
+    if not prepared.context_text.strip():
+        return _no_content_response(site, prepared)
+
+    if _cache_enabled(use_cache):
+        cached = _cache_lookup(prepared, embedding_model.embed_query(query), chat_history)
+        if cached is not None:
+            return cached, True, prepared.metadata()
+
+    started = time.perf_counter()
+    answer = call_llm_with_context(
+    context=prepared.context_text,
+    history=prepared.history_text,
+    question=query,
+    detail_level=prepared.route.detail_level,  # Short answers for quick questions
+    variant=prepared.variant,
+    route=prepared.route,
+    route_reason=prepared.route_reason
+    )
+    _cache_store(prepared, answer, time.perf_counter() - started)
+
+    return (*_finalize_answer(answer), prepared.metadata())
+
+async def abuild_chatbot_response(query: str, chat_history: list, site: str="ditstek.com", use_cache: bool = True,
+                                  prompt_variant: Optional[str] = None):
+    """
+    Async variant of `build_chatbot_response`: retrieval, the web fallback and
+    the LLM call are all awaited, so no worker thread is held while they run.
+    """
+    prepared = await _aprepare_llm_inputs(query, chat_history, site)
+    _choose_route(prepared, query, prompt_variant)
+    if not prepared.context_text.strip():
+        return _no_content_response(site, prepared)
+
+    if _cache_enabled(use_cache):
+        cached = _cache_lookup(prepared, await embedding_model.aembed_query(query), chat_history)
+        if cached is not None:
+            return cached, True, prepared.metadata()
+
+    started = time.perf_counter()
+    answer = await acall_llm_with_context(
+    context=prepared.context_text,
+    history=prepared.history_text,
+    question=query,
+    detail_level=prepared.route.detail_level,  # Short answers for quick questions
+    variant=prepared.variant,
+    route=prepared.route,
+    route_reason=prepared.route_reason
+    )
+    _cache_store(prepared, answer, time.perf_counter() - started)
+
+    return (*_finalize_answer(answer), prepared.metadata())
+
+def stream_chatbot_response(query: str, chat_history: list, site: str="ditstek.com", use_cache: bool = True,
+                            metadata: Optional[dict] = None, prompt_variant: Optional[str] = None):
+    """
+    Same pipeline as `build_chatbot_response`, but yields the answer in pieces
+    as the LLM produces them. Pass a dict as `metadata` to receive the response
+    metadata (retrieval route and scores) once retrieval has run; it also gets
+    `failed=True` if the LLM stream broke off, in which case the partial answer
+    must not be saved.
+    """
+    prepared = _prepare_llm_inputs(query, chat_history, site)
+    _choose_route(prepared, query, prompt_variant)
+    if metadata is not None:
+        metadata.update(prepared.metadata())
+    if not prepared.context_text.strip():
+        yield _no_content_response(site, prepared)[0]
+        return
+
+    if _cache_enabled(use_cache):
+        cached = _cache_lookup(prepared, embedding_model.embed_query(query), chat_history)
+        if cached is not None:
+            yield cached
+            return
+
+    started = time.perf_counter()
+    pieces = []
+    status = metadata if metadata is not None else {}
+    for piece in stream_llm_with_context(prepared.context_text, prepared.history_text, query,
+                                         detail_level=prepared.route.detail_level, variant=prepared.variant,
+                                         route=prepared.route, route_reason=prepared.route_reason,
+                                         status=status):
+        pieces.append(piece)
+        yield piece
+    if status.get("failed"):
+        return  # partial answer plus error text: never cache it
+    answer = "".join(pieces)
+    if not answer.strip():
+        yield EMPTY_ANSWER_FALLBACK
+        return
+    _cache_store(prepared, answer, time.perf_counter() - started)
+
+async def astream_chatbot_response(query: str, chat_history: list, site: str="ditstek.com", use_cache: bool = True,
+                                   metadata: Optional[dict] = None, prompt_variant: Optional[str] = None):
+    """Async variant of `stream_chatbot_response`."""
+    prepared = await _aprepare_llm_inputs(query, chat_history, site)
+    _choose_route(prepared, query, prompt_variant)
+    if metadata is not None:
+        metadata.update(prepared.metadata())
+    if not prepared.context_text.strip():
+        yield _no_content_response(site, prepared)[0]
+        return
+
+    if _cache_enabled(use_cache):
+        cached = _cache_lookup(prepared, await embedding_model.aembed_query(query), chat_history)
+        if cached is not None:
+            yield cached
+            return
+
+    started = time.perf_counter()
+    pieces = []
+    status = metadata if metadata is not None else {}
+    async for piece in astream_llm_with_context(prepared.context_text, prepared.history_text, query,
+                                                detail_level=prepared.route.detail_level, variant=prepared.variant,
+                                                route=prepared.route, route_reason=prepared.route_reason,
+                                                status=status):
+        pieces.append(piece)
+        yield piece
+    if status.get("failed"):
+        return  # partial answer plus error text: never cache it
+    answer = "".join(pieces)
+    if not answer.strip():
+        yield EMPTY_ANSWER_FALLBACK
+        return
+    _cache_store(prepared, answer, time.perf_counter() - started)
@@ -0,0 +1,206 @@
+import os
+import time
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import partial
+from typing import Any, Callable, Dict
+
+import psycopg2
+from psycopg2 import pool as pg_pool
+
+from database_setup import DB_NAME, DB_USER, DB_PASSWORD, DB_HOST, DB_PORT
+
+
+# ----------------------------
+# Config
+# ----------------------------
+DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", "1"))
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", "10"))
+# Seconds a caller may wait for a free connection before giving up
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+# Connections idle longer than this are pinged with SELECT 1 before reuse
+DB_POOL_HEALTHCHECK_AFTER = float(os.getenv("DB_POOL_HEALTHCHECK_AFTER", "30"))
+
+
+class PoolTimeout(Exception):
+    """Raised when no pooled connection becomes free within DB_POOL_TIMEOUT."""
+
+
+class ConnectionPool:
+    """
+    Bounded, thread-safe psycopg2 pool with health-checked checkout.
+
+    psycopg2's ThreadedConnectionPool raises immediately when exhausted, so a
+    semaphore sized to `maxconn` makes callers queue instead, and the time they
+    spend queued is recorded in `stats()`.
+    """
+
+    def __init__(self, minconn: int = DB_POOL_MIN, maxconn: int = DB_POOL_MAX,
+                 timeout: float = DB_POOL_TIMEOUT,
+                 healthcheck_after: float = DB_POOL_HEALTHCHECK_AFTER, **conn_kwargs):
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.healthcheck_after = healthcheck_after
+        self._conn_kwargs = conn_kwargs
+        self._pool = None
+        self._init_lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(maxconn)
+        self._last_used: Dict[int, float] = {}
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            "checkouts": 0,
+            "timeouts": 0,
+            "healthcheck_failures": 0,
+            "in_use": 0,
+            "wait_seconds_total": 0.0,
+            "wait_seconds_max": 0.0,
+        }
+
+    def _get_pool(self):
+        # Created lazily so importing the API never opens a socket
+        if self._pool is None:
+            with self._init_lock:
+                if self._pool is None:
+                    self._pool = pg_pool.ThreadedConnectionPool(
+                        self.minconn, self.maxconn, **self._conn_kwargs
+                    )
+                    # The `minconn` connections opened up front idle like returned ones
+                    now = time.monotonic()
+                    for conn in getattr(self._pool, "_pool", []):
+                        self._last_used[id(conn)] = now
+        return self._pool
+
+    def _is_healthy(self, conn) -> bool:
+        if conn.closed:
+            return False
+        last_used = self._last_used.get(id(conn))
+        # Never returned to the pool: psycopg2 just opened it for this checkout
+        if last_used is None or time.monotonic() - last_used < self.healthcheck_after:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def getconn(self):
+        started = time.monotonic()
+        if not self._slots.acquire(timeout=self.timeout):
+            with self._stats_lock:
+                self._stats["timeouts"] += 1
+            raise PoolTimeout(f"No database connection available after {self.timeout}s")
+        waited = time.monotonic() - started
+
+        try:
+            pool = self._get_pool()
+            # After a database restart every idle connection may be dead; discard
+            # them until one passes or psycopg2 opens a new one (never pinged).
+            # maxconn + 1 attempts always gets that far.
+            for _ in range(self.maxconn + 1):
+                conn = pool.getconn()
+                if self._is_healthy(conn):
+                    break
+                with self._stats_lock:
+                    self._stats["healthcheck_failures"] += 1
+                self._last_used.pop(id(conn), None)
+                pool.putconn(conn, close=True)
+            else:
+                raise psycopg2.OperationalError("No healthy database connection after discarding stale ones")
+        except Exception:
+            self._slots.release()
+            raise
+
+        with self._stats_lock:
+            self._stats["checkouts"] += 1
+            self._stats["in_use"] += 1
+            self._stats["wait_seconds_total"] += waited
+            self._stats["wait_seconds_max"] = max(self._stats["wait_seconds_max"], waited)
+        return conn
+
+    def putconn(self, conn, close: bool = False):
+        try:
+            if close or conn.closed:
+                self._last_used.pop(id(conn), None)
+            else:
+                self._last_used[id(conn)] = time.monotonic()
+            self._get_pool().putconn(conn, close=close or bool(conn.closed))
+        finally:
+            with self._stats_lock:
+                self._stats["in_use"] -= 1
+            self._slots.release()
+
+    def closeall(self):
+        if self._pool is not None:
+            self._pool.closeall()
+            self._pool = None
+            self._last_used.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            snapshot = dict(self._stats)
+        snapshot["max_size"] = self.maxconn
+        snapshot["wait_seconds_avg"] = (
+            snapshot["wait_seconds_total"] / snapshot["checkouts"] if snapshot["checkouts"] else 0.0
+        )
+        return snapshot
+
+
+pool = ConnectionPool(
+    dbname=DB_NAME, user=DB_USER, password=DB_PASSWORD, host=DB_HOST, port=DB_PORT
+)
+
+# DB work for async routes runs here rather than on FastAPI's default threadpool,
+# sized to the pool so queued coroutines wait on the pool and not on threads.
+_executor = ThreadPoolExecutor(max_workers=DB_POOL_MAX, thread_name_prefix="db")
+
+
+# ----------------------------
+# Public helpers
+# ----------------------------
+
+@contextmanager
+def connection():
+    """Check out a pooled connection; commits on success, rolls back on error."""
+    conn = pool.getconn()
+    broken = False
+    try:
+        yield conn
+        conn.commit()
+    except psycopg2.InterfaceError:
+        broken = True
+        raise
+    except Exception:
+        if not conn.closed:
+            conn.rollback()
+        raise
+    finally:
+        pool.putconn(conn, close=broken)
+
+
+@contextmanager
+def cursor():
+    """Shortcut for `connection()` that yields a cursor instead."""
+    with connection() as conn:
+        with conn.cursor() as cur:
+            yield cur
+
+
+def run(fn: Callable, *args, **kwargs):
+    """Run `fn(cursor, *args, **kwargs)` inside a single pooled transaction."""
+    with cursor() as cur:
+        return fn(cur, *args, **kwargs)
+
+
+async def arun(fn: Callable, *args, **kwargs):
+    """Awaitable variant of `run()` for async routes."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, partial(run, fn, *args, **kwargs))
+
+
+def pool_stats() -> Dict[str, Any]:
+    return pool.stats()
@@ -0,0 +1,211 @@
+import os
+import time
+import asyncio
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+
+# ----------------------------
+# Config
+# ----------------------------
+EMBED_CACHE_MAX_ENTRIES = int(os.getenv("EMBED_CACHE_MAX_ENTRIES", "5000"))
+EMBED_CACHE_TTL = float(os.getenv("EMBED_CACHE_TTL", str(24 * 3600)))
+# Path of the optional SQLite tier; empty disables it
+EMBED_CACHE_SQLITE = os.getenv("EMBED_CACHE_SQLITE", "")
+
+
+def normalize_text(text: str) -> str:
+    """Collapse whitespace and case so trivially different queries share a key."""
+    return " ".join(text.split()).casefold()
+
+
+def cache_key(model: str, text: str) -> str:
+    return hashlib.sha256(f"{model}\x00{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+
+class LRUTTLCache:
+    """Thread-safe in-process LRU with a per-entry time-to-live."""
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires_at = item
+            if expires_at < time.time():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value) -> None:
+        with self._lock:
+            self._data[key] = (value, time.time() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class SQLiteVectorStore:
+    """
+    Persistent key -> float32 vector tier. WAL mode lets several uvicorn
+    workers read and write the same file concurrently.
+    """
+
+    def __init__(self, path: str, ttl: float):
+        self.path = path
+        self.ttl = ttl
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        conn = self._conn()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " key TEXT PRIMARY KEY, vector BLOB NOT NULL, expires_at REAL NOT NULL)"
+        )
+        conn.commit()
+
+    def _conn(self) -> sqlite3.Connection:
+        # sqlite3 connections can't be shared across threads
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get_many(self, keys: List[str]) -> Dict[str, List[float]]:
+        if not keys:
+            return {}
+        placeholders = ",".join("?" * len(keys))
+        rows = self._conn().execute(
+            f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders}) AND expires_at >= ?",
+            (*keys, time.time()),
+        ).fetchall()
+        return {key: np.frombuffer(blob, dtype=np.float32).tolist() for key, blob in rows}
+
+    def set_many(self, items: Dict[str, List[float]]) -> None:
+        if not items:
+            return
+        expires_at = time.time() + self.ttl
+        conn = self._conn()
+        conn.executemany(
+            "INSERT OR REPLACE INTO embeddings (key, vector, expires_at) VALUES (?, ?, ?)",
+            [(k, np.asarray(v, dtype=np.float32).tobytes(), expires_at) for k, v in items.items()],
+        )
+        conn.commit()
+
+    def clear(self) -> None:
+        conn = self._conn()
+        conn.execute("DELETE FROM embeddings")
+        conn.commit()
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Wraps an Embeddings model with a memory LRU/TTL tier and an optional SQLite
+    tier. Only cache misses are sent to the wrapped model, in one batched call.
+    The async methods do their SQLite reads and writes in a worker thread so
+    the event loop never waits on disk.
+    """
+
+    def __init__(self, underlying: Embeddings, max_entries: int = EMBED_CACHE_MAX_ENTRIES,
+                 ttl: float = EMBED_CACHE_TTL, sqlite_path: Optional[str] = EMBED_CACHE_SQLITE or None):
+        self.underlying = underlying
+        self.model = str(getattr(underlying, "model", type(underlying).__name__))
+        self.memory = LRUTTLCache(max_entries, ttl)
+        self.disk = SQLiteVectorStore(sqlite_path, ttl) if sqlite_path else None
+        self._stats_lock = threading.Lock()
+        self._stats = {"hits": 0, "disk_hits": 0, "misses": 0}
+
+    def _count(self, name: str, n: int) -> None:
+        if n:
+            with self._stats_lock:
+                self._stats[name] += n
+
+    def _lookup(self, texts: List[str]):
+        keys = [cache_key(self.model, t) for t in texts]
+        found: Dict[str, List[float]] = {}
+        for key in keys:
+            vector = self.memory.get(key)
+            if vector is not None:
+                found[key] = vector
+        self._count("hits", len(found))
+
+        if self.disk is not None:
+            missing = [k for k in dict.fromkeys(keys) if k not in found]
+            from_disk = self.disk.get_many(missing)
+            for key, vector in from_disk.items():
+                self.memory.set(key, vector)
+            found.update(from_disk)
+            self._count("disk_hits", len(from_disk))
+
+        # Unique texts still to embed, in first-seen order
+        to_embed: Dict[str, str] = {}
+        for key, text in zip(keys, texts):
+            if key not in found and key not in to_embed:
+                to_embed[key] = text
+        self._count("misses", len(to_embed))
+        return keys, found, to_embed
+
+    def _store(self, found: Dict[str, List[float]], new: Dict[str, List[float]],
+               disk: bool = True) -> None:
+        for key, vector in new.items():
+            self.memory.set(key, vector)
+        if disk and self.disk is not None:
+            self.disk.set_many(new)
+        found.update(new)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys, found, to_embed = self._lookup(texts)
+        if to_embed:
+            vectors = self.underlying.embed_documents(list(to_embed.values()))
+            self._store(found, dict(zip(to_embed.keys(), vectors)))
+        return [found[k] for k in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        if self.disk is not None:
+            keys, found, to_embed = await asyncio.to_thread(self._lookup, texts)
+        else:
+            keys, found, to_embed = self._lookup(texts)
+        if to_embed:
+            vectors = await self.underlying.aembed_documents(list(to_embed.values()))
+            new = dict(zip(to_embed.keys(), vectors))
+            self._store(found, new, disk=False)
+            if self.disk is not None:
+                await asyncio.to_thread(self.disk.set_many, new)
+        return [found[k] for k in keys]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return (await self.aembed_documents([text]))[0]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            snapshot = dict(self._stats)
+        lookups = snapshot["hits"] + snapshot["disk_hits"] + snapshot["misses"]
+        snapshot["hit_rate"] = (snapshot["hits"] + snapshot["disk_hits"]) / lookups if lookups else 0.0
+        snapshot["memory_entries"] = len(self.memory)
+        snapshot["disk_enabled"] = self.disk is not None
+        return snapshot
@@ -0,0 +1,153 @@
+import os
+import asyncio
+from typing import Iterable, List, Optional, Set, Tuple
+
+from langchain.chat_models import ChatOpenAI
+
+from backend import db
+from backend.tokens import count_tokens, truncate_to_tokens
+
+
+# ----------------------------
+# Config
+# ----------------------------
+# Most recent turns (user + assistant message pairs) never folded into the summary
+HISTORY_RECENT_TURNS = int(os.getenv("HISTORY_RECENT_TURNS", "3"))
+# Tokens of history (summary + verbatim messages) allowed in the prompt
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "1200"))
+HISTORY_SUMMARY_MAX_TOKENS = int(os.getenv("HISTORY_SUMMARY_MAX_TOKENS", "300"))
+# Only re-summarize once this many messages have aged out of the recent window
+HISTORY_SUMMARY_MIN_NEW = int(os.getenv("HISTORY_SUMMARY_MIN_NEW", "4"))
+HISTORY_SUMMARY_MODEL = os.getenv("HISTORY_SUMMARY_MODEL", "gpt-3.5-turbo")
+
+summary_llm = ChatOpenAI(model_name=HISTORY_SUMMARY_MODEL, temperature=0, max_tokens=HISTORY_SUMMARY_MAX_TOKENS)
+
+SUMMARY_PROMPT = """You maintain a running summary of a conversation between a user and an assistant
+for the DITS Technologies website chatbot.
+
+Current summary (may be empty):
+{summary}
+
+New messages to fold in:
+{messages}
+
+Write the updated summary in at most {max_words} words. Keep names, requirements, products,
+technologies and any open questions the user raised; drop greetings and filler."""
+
+
+class SessionHistory(list):
+    """
+    A session's (role, message) pairs plus its rolling summary. `summarized`
+    is how many leading messages the summary already covers; they're only
+    rendered through the summary. Being a list, it drops in wherever a plain
+    chat history is expected.
+    """
+
+    def __init__(self, messages: Iterable[Tuple[str, str]] = (), summary: str = "", summarized: int = 0):
+        super().__init__(messages)
+        self.summary = summary
+        self.summarized = summarized
+
+
+def _line(role: str, message: str) -> str:
+    return f"{'User' if role == 'user' else 'Assistant'}: {message}"
+
+
+def render_history(chat_history: list, budget: int = HISTORY_TOKEN_BUDGET) -> str:
+    """
+    Prompt text for a chat history within `budget` tokens: the rolling summary
+    (if any) followed by as many of the newest unsummarized messages as fit.
+    """
+    summary = getattr(chat_history, "summary", "")
+    summarized = getattr(chat_history, "summarized", 0)
+
+    parts: List[str] = []
+    used = 0
+    if summary:
+        summary = truncate_to_tokens(summary, min(HISTORY_SUMMARY_MAX_TOKENS, budget))
+        parts.append(f"Summary of earlier conversation: {summary}")
+        used = count_tokens(parts[0])
+
+    recent: List[str] = []
+    for role, message in reversed(chat_history[summarized:]):
+        line = _line(role, message)
+        tokens = count_tokens(line) + 1  # newline
+        if used + tokens > budget:
+            break
+        recent.append(line)
+        used += tokens
+    return "\n".join(parts + recent[::-1])
+
+
+# ----------------------------
+# Persistence (migrations/004)
+# ----------------------------
+def _get_session_summary(cursor, session_id: str) -> Tuple[str, int]:
+    cursor.execute(
+        "SELECT summary, summarized_messages FROM session_summaries WHERE session_id = %s",
+        (session_id,),
+    )
+    row = cursor.fetchone()
+    return (row[0], row[1]) if row else ("", 0)
+
+
+def _save_session_summary(cursor, session_id: str, summary: str, summarized: int) -> None:
+    # Never move backwards if two updates for the same session race
+    cursor.execute("""
+        INSERT INTO session_summaries (session_id, summary, summarized_messages, updated_at)
+        VALUES (%s, %s, %s, CURRENT_TIMESTAMP)
+        ON CONFLICT (session_id) DO UPDATE
+        SET summary = EXCLUDED.summary,
+            summarized_messages = EXCLUDED.summarized_messages,
+            updated_at = EXCLUDED.updated_at
+        WHERE session_summaries.summarized_messages < EXCLUDED.summarized_messages
+    """, (session_id, summary, summarized))
+
+
+async def aload_summary(session_id: str) -> Tuple[str, int]:
+    return await db.arun(_get_session_summary, session_id)
+
+
+# ----------------------------
+# Incremental summarization
+# ----------------------------
+def _pending_for_summary(history: SessionHistory) -> Optional[Tuple[List[Tuple[str, str]], int]]:
+    """Messages that have aged out of the recent window but aren't summarized yet."""
+    boundary = len(history) - 2 * HISTORY_RECENT_TURNS
+    if boundary - history.summarized < HISTORY_SUMMARY_MIN_NEW:
+        return None
+    return list(history[history.summarized:boundary]), boundary
+
+
+async def aupdate_summary(session_id: str, history: SessionHistory) -> None:
+    pending = _pending_for_summary(history)
+    if pending is None:
+        return
+    messages, boundary = pending
+    prompt = SUMMARY_PROMPT.format(
+        summary=history.summary or "(none)",
+        messages="\n".join(_line(r, m) for r, m in messages),
+        max_words=int(HISTORY_SUMMARY_MAX_TOKENS * 0.75),
+    )
+    try:
+        response = await summary_llm.ainvoke(prompt)
+        summary = getattr(response, "content", str(response)).strip()
+        if summary:
+            await db.arun(_save_session_summary, session_id, summary, boundary)
+            print(f"[DEBUG] Session {session_id}: summary now covers {boundary} messages "
+                  f"({count_tokens(summary)} tokens)")
+    except Exception as e:
+        # The summary only lags; the next turn retries
+        print(f"⚠️ Summary update failed for session {session_id}: {e}")
+
+
+_background: Set[asyncio.Task] = set()
+
+
+def schedule_summary_update(session_id: str, history: SessionHistory) -> None:
+    """Fold aged-out messages into the summary after the response, off the request path."""
+    if _pending_for_summary(history) is None:
+        return
+    task = asyncio.create_task(aupdate_summary(session_id, history))
+    _background.add(task)
+    task.add_done_callback(_background.discard)
@@ -1,12 +1,44 @@
 # streamlit_app/backend/llm_client.py
-from langchain.prompts import PromptTemplate
+import os
+import time
+import random
+import logging
+import threading
+from typing import Dict, Optional, Tuple
+
 from langchain.chat_models import ChatOpenAI
 from langchain.schema import AIMessage
 
-# Define LLM instance here so it always exists
-llm = ChatOpenAI(model_name="gpt-4", temperature=0.2, max_tokens=None)
+from backend.tokens import count_tokens
+from backend.model_router import ModelRoute, LARGE_ROUTE, SMALL_ROUTE, model_router
+
+# Define LLM instances here so they always exist: `llm` for complex questions,
+# `small_llm` for the quick ones (see model_router.py)
+llm = ChatOpenAI(model_name=LARGE_ROUTE.model_name, temperature=0.2, max_tokens=LARGE_ROUTE.max_tokens)
+small_llm = ChatOpenAI(model_name=SMALL_ROUTE.model_name, temperature=0.2, max_tokens=SMALL_ROUTE.max_tokens)
+
+# ----------------------------
+# Config
+# ----------------------------
+# Prompt variant used when a request doesn't pick one: comprehensive | concise
+PROMPT_VARIANT = os.getenv("PROMPT_VARIANT", "comprehensive").lower()
+# Fraction of prompts dumped in full when this module's logger is at DEBUG
+PROMPT_LOG_SAMPLE_RATE = float(os.getenv("PROMPT_LOG_SAMPLE_RATE", "0.01"))
+PROMPT_LOG_PREVIEW_CHARS = 1200
+
+# Every prompt's token breakdown is logged at INFO; full prompts only at DEBUG, sampled
+logger = logging.getLogger(__name__)
+
+DETAIL_INSTRUCTIONS = {
+    "low": "Provide a brief but complete answer to the question.",
+    "medium": "Provide a moderately detailed answer with key points and explanations.",
+    "high": "Provide a comprehensive, thorough answer with detailed explanations, examples, and multiple perspectives where relevant."
+}
+DEFAULT_DETAIL_INSTRUCTION = "Provide a detailed answer."
 
-prompt_template = PromptTemplate.from_template("""
+# {detail_instruction} is filled in once per detail level when the registry compiles
+PROMPT_VARIANTS = {
+    "comprehensive": """
 You are a knowledgeable and thorough assistant providing comprehensive information.
 Your goal is to give detailed, well-structured answers that fully address the user's question.
 
@@ -19,6 +51,8 @@ Relevant context from the knowledge base:
 User's latest question:
 {question}
 
+Detail instruction: {detail_instruction}
+
 Instructions for responding:
 1. Provide a comprehensive answer that thoroughly addresses all aspects of the question
 2. Include specific details, examples, and explanations where appropriate
@@ -34,9 +68,106 @@ Format your response with:
 - A clear introductory paragraph
 - Well-organized body sections with appropriate headings
 - A brief conclusion when appropriate
-""")
+""",
+    "concise": """
+You are a helpful assistant answering questions about the DITS Technologies website.
+
+Conversation so far:
+{history}
+
+Relevant context from the knowledge base:
+{context}
+
+User's latest question:
+{question}
+
+Detail instruction: {detail_instruction}
+
+Answer directly in a short paragraph or a few bullet points, under about 150 words.
+Use the context first; if it is partial, fill the gaps from general knowledge.
+Use **bold** for key terms. No headings, introduction or conclusion.
+""",
+}
+
+
+class PromptRegistry:
+    """
+    Prompt templates compiled once per (variant, detail level), so building a
+    prompt is a dict lookup and one `str.format`. Each compiled template also
+    stores the token count of its fixed text, so a prompt's size is that plus
+    the tokens of the three parts, without re-tokenizing the whole prompt.
+    Also keeps per-variant prompt counts and prompt-token totals.
+    """
+
+    def __init__(self, variants: Dict[str, str] = PROMPT_VARIANTS, default: str = PROMPT_VARIANT):
+        self.default = default if default in variants else "comprehensive"
+        levels = dict(DETAIL_INSTRUCTIONS, default=DEFAULT_DETAIL_INSTRUCTION)
+        self._templates: Dict[Tuple[str, str], Tuple[str, int]] = {}
+        for variant, text in variants.items():
+            for level, instruction in levels.items():
+                template = text.replace("{detail_instruction}", instruction)
+                fixed = count_tokens(template.format(history="", context="", question=""))
+                self._templates[(variant, level)] = (template, fixed)
+        self._lock = threading.Lock()
+        self._stats = {variant: {"prompts": 0, "prompt_tokens": 0} for variant in variants}
+
+    def resolve(self, variant: Optional[str]) -> str:
+        """The variant actually used for a request; unknown names fall back to the default."""
+        return variant if variant in self._stats else self.default
+
+    def build(self, context: str, history: str, question: str,
+              detail_level: str = "high", variant: Optional[str] = None) -> Tuple[str, int]:
+        """
+        Returns the formatted prompt and its token count (the sum of the
+        template's and the parts' counts; can be off by a token or two where
+        BPE would merge across a part boundary).
+        """
+        variant = self.resolve(variant)
+        template, fixed = self._templates.get((variant, detail_level)) or self._templates[(variant, "default")]
+        prompt = template.format(history=history, context=context, question=question)
+        context_tokens, history_tokens, question_tokens = (
+            count_tokens(context), count_tokens(history), count_tokens(question))
+        tokens = fixed + context_tokens + history_tokens + question_tokens
+        with self._lock:
+            stats = self._stats[variant]
+            stats["prompts"] += 1
+            stats["prompt_tokens"] += tokens
+
+        if logger.isEnabledFor(logging.INFO):
+            # Per-request prompt size, broken down by the parts we control
+            logger.info("Prompt tokens (%s/%s): %d total (context %d, history %d, question %d)",
+                        variant, detail_level, tokens, context_tokens, history_tokens, question_tokens)
+        if logger.isEnabledFor(logging.DEBUG) and random.random() < PROMPT_LOG_SAMPLE_RATE:
+            logger.debug("Full LLM prompt (first %d chars):\n%s%s", PROMPT_LOG_PREVIEW_CHARS,
+                         prompt[:PROMPT_LOG_PREVIEW_CHARS],
+                         "..." if len(prompt) > PROMPT_LOG_PREVIEW_CHARS else "")
+        return prompt, tokens
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        with self._lock:
+            return {variant: dict(s) for variant, s in self._stats.items()}
+
+
+prompt_registry = PromptRegistry()
+
+
+def _answer_text(raw_answer) -> str:
+    return raw_answer.content if isinstance(raw_answer, AIMessage) else str(raw_answer)
+
+
+def _llm_for(route: ModelRoute):
+    return small_llm if route.name == SMALL_ROUTE.name else llm
+
 
-def call_llm_with_context(context: str, history: str, question: str, detail_level: str = "high") -> str:
+def _record(route: ModelRoute, reason: str, started: float, prompt_tokens: int, answer: str,
+            failed: bool = False) -> None:
+    model_router.record(route, reason, time.perf_counter() - started, prompt_tokens,
+                        0 if failed else count_tokens(answer), failed=failed)
+
+
+def call_llm_with_context(context: str, history: str, question: str, detail_level: str = "high",
+                          variant: Optional[str] = None, route: ModelRoute = LARGE_ROUTE,
+                          route_reason: str = "default") -> str:
     """
     Calls the LLM with history, context, and user question.
     
@@ -45,55 +176,81 @@ def call_llm_with_context(context: str, history: str, question: str, detail_leve
         history: Conversation history
         question: User's question
         detail_level: Controls response detail ("low", "medium", "high")
+        variant: Prompt variant ("comprehensive", "concise"); defaults to PROMPT_VARIANT
+        route: Model to answer with (see `model_router.choose`); latency and
+            tokens are recorded against it, tagged with `route_reason`
     """
+    started, prompt_tokens = time.perf_counter(), 0
     try:
-        # Add detail instruction based on level
-        detail_instruction = {
-            "low": "Provide a brief but complete answer to the question.",
-            "medium": "Provide a moderately detailed answer with key points and explanations.",
-            "high": "Provide a comprehensive, thorough answer with detailed explanations, examples, and multiple perspectives where relevant."
-        }.get(detail_level, "Provide a detailed answer.")
-        
-        # Create a temporary prompt template with detail instruction
-        temp_prompt_template = PromptTemplate.from_template(f"""
-You are a knowledgeable and thorough assistant providing comprehensive information.
-Your goal is to give detailed, well-structured answers that fully address the user's question.
+        prompt, prompt_tokens = prompt_registry.build(context, history, question, detail_level, variant)
+        raw_answer = _llm_for(route).invoke(prompt)
+        answer = _answer_text(raw_answer)
+        _record(route, route_reason, started, prompt_tokens, answer)
+        return answer
+    except Exception as e:
+        _record(route, route_reason, started, prompt_tokens, "", failed=True)
+        return f"[Error invoking LLM: {e}]"
 
-Conversation so far:
-{{history}}
 
-Relevant context from the knowledge base:
-{{context}}
+async def acall_llm_with_context(context: str, history: str, question: str, detail_level: str = "high",
+                                 variant: Optional[str] = None, route: ModelRoute = LARGE_ROUTE,
+                                 route_reason: str = "default") -> str:
+    """Async variant of `call_llm_with_context`; awaits the LLM instead of blocking a thread."""
+    started, prompt_tokens = time.perf_counter(), 0
+    try:
+        prompt, prompt_tokens = prompt_registry.build(context, history, question, detail_level, variant)
+        raw_answer = await _llm_for(route).ainvoke(prompt)
+        answer = _answer_text(raw_answer)
+        _record(route, route_reason, started, prompt_tokens, answer)
+        return answer
+    except Exception as e:
+        _record(route, route_reason, started, prompt_tokens, "", failed=True)
+        return f"[Error invoking LLM: {e}]"
 
-User's latest question:
-{{question}}
 
-Detail instruction: {detail_instruction}
+def _chunk_text(chunk) -> str:
+    return chunk.content if hasattr(chunk, "content") else str(chunk)
 
-Instructions for responding:
-1. Provide a comprehensive answer that thoroughly addresses all aspects of the question
-2. Include specific details, examples, and explanations where appropriate
-3. Structure your response with clear sections using markdown formatting
-4. Use **bold** for key terms and concepts
-5. When relevant, include bullet points or numbered lists to organize information
-6. If the context contains multiple relevant pieces of information, synthesize them into a cohesive response
-7. If context is limited or partial, still provide the most complete answer possible using your general knowledge
-8. Do NOT be overly brief - aim for thoroughness and completeness
-9. Include relevant background information that helps understand the topic
 
-Format your response with:
-- A clear introductory paragraph
-- Well-organized body sections with appropriate headings
-- A brief conclusion when appropriate
-""")
-        
-        prompt = temp_prompt_template.format(history=history, context=context, question=question)
-        
-        # 🔎 Debug: show constructed prompt
-        print("[DEBUG] Full LLM prompt (first 1200 chars):\n"
-              f"{prompt[:1200]}{'...' if len(prompt) > 1200 else ''}\n[DEBUG] End prompt\n")
-        
-        raw_answer = llm.invoke(prompt)
-        return raw_answer.content if isinstance(raw_answer, AIMessage) else str(raw_answer)
+def stream_llm_with_context(context: str, history: str, question: str, detail_level: str = "high",
+                            variant: Optional[str] = None, route: ModelRoute = LARGE_ROUTE,
+                            route_reason: str = "default", status: Optional[dict] = None):
+    """
+    Yields the answer piece by piece as the LLM emits tokens. If the call fails
+    (possibly after some pieces were yielded) an error message is yielded and
+    `status["failed"]` is set, so callers can avoid caching or saving the answer.
+    """
+    started, prompt_tokens, pieces = time.perf_counter(), 0, []
+    try:
+        prompt, prompt_tokens = prompt_registry.build(context, history, question, detail_level, variant)
+        for chunk in _llm_for(route).stream(prompt):
+            text = _chunk_text(chunk)
+            if text:
+                pieces.append(text)
+                yield text
+        _record(route, route_reason, started, prompt_tokens, "".join(pieces))
     except Exception as e:
-        return f"[Error invoking LLM: {e}]"
+        _record(route, route_reason, started, prompt_tokens, "", failed=True)
+        if status is not None:
+            status["failed"] = True
+        yield f"[Error invoking LLM: {e}]"
+
+
+async def astream_llm_with_context(context: str, history: str, question: str, detail_level: str = "high",
+                                   variant: Optional[str] = None, route: ModelRoute = LARGE_ROUTE,
+                                   route_reason: str = "default", status: Optional[dict] = None):
+    """Async variant of `stream_llm_with_context`."""
+    started, prompt_tokens, pieces = time.perf_counter(), 0, []
+    try:
+        prompt, prompt_tokens = prompt_registry.build(context, history, question, detail_level, variant)
+        async for chunk in _llm_for(route).astream(prompt):
+            text = _chunk_text(chunk)
+            if text:
+                pieces.append(text)
+                yield text
+        _record(route, route_reason, started, prompt_tokens, "".join(pieces))
+    except Exception as e:
+        _record(route, route_reason, started, prompt_tokens, "", failed=True)
+        if status is not None:
+            status["failed"] = True
+        yield f"[Error invoking LLM: {e}]"
@@ -0,0 +1,222 @@
+import os
+import logging
+import threading
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import psycopg2
+from psycopg2.extras import execute_values
+
+from backend import db
+
+
+# ----------------------------
+# Config
+# ----------------------------
+# "sync" commits each turn before the request returns;
+# "write_behind" buffers turns and flushes them in bulk from a background thread.
+MESSAGE_WRITE_MODE = os.getenv("MESSAGE_WRITE_MODE", "sync")
+WRITE_BEHIND_BATCH_SIZE = int(os.getenv("WRITE_BEHIND_BATCH_SIZE", "200"))
+WRITE_BEHIND_FLUSH_INTERVAL = float(os.getenv("WRITE_BEHIND_FLUSH_INTERVAL", "1.0"))
+# A turn that fails this many flushes while other turns get written is dropped
+WRITE_BEHIND_MAX_ATTEMPTS = int(os.getenv("WRITE_BEHIND_MAX_ATTEMPTS", "5"))
+# Oldest turns are dropped once this many rows are waiting (e.g. Postgres is down)
+MESSAGE_BUFFER_MAX = int(os.getenv("MESSAGE_BUFFER_MAX", "10000"))
+
+logger = logging.getLogger(__name__)
+
+# (session_id, role, message, timestamp)
+MessageRow = Tuple[str, str, str, str]
+
+
+def _insert_messages(cursor, rows: List[MessageRow]) -> None:
+    execute_values(
+        cursor,
+        "INSERT INTO messages (session_id, role, message, timestamp) VALUES %s",
+        rows,
+        page_size=max(len(rows), 1),
+    )
+
+
+def save_turn(rows: Iterable[MessageRow]) -> None:
+    """Persist every message of a turn with one multi-row INSERT in one transaction."""
+    rows = list(rows)
+    if rows:
+        db.run(_insert_messages, rows)
+
+
+async def asave_turn(rows: Iterable[MessageRow]) -> None:
+    rows = list(rows)
+    if rows:
+        await db.arun(_insert_messages, rows)
+
+
+class WriteBehindWriter:
+    """
+    Buffers message rows from many sessions and flushes them with a single
+    execute_values INSERT once `batch_size` rows are queued or
+    `flush_interval` seconds have passed, whichever comes first.
+
+    If the bulk INSERT fails, the batch is retried turn by turn so one bad turn
+    can't hold back the rest. Failed turns stay buffered for the next flush
+    until they have failed `max_attempts` flushes that other turns survived
+    (i.e. the turn itself is bad, not the database), and the buffer never holds
+    more than `max_rows` rows; turns dropped either way are logged.
+    """
+
+    def __init__(self, batch_size: int = WRITE_BEHIND_BATCH_SIZE,
+                 flush_interval: float = WRITE_BEHIND_FLUSH_INTERVAL,
+                 max_attempts: int = WRITE_BEHIND_MAX_ATTEMPTS, max_rows: int = MESSAGE_BUFFER_MAX):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_attempts = max_attempts
+        self.max_rows = max_rows
+        # One entry per submitted turn: [failed attempts so far, rows]
+        self._buffer: List[List[Any]] = []
+        self._rows = 0
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.stats: Dict[str, float] = {"flushes": 0, "rows_flushed": 0, "flush_errors": 0, "rows_dropped": 0}
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="message-writer", daemon=True)
+            self._thread.start()
+
+    def submit(self, rows: Iterable[MessageRow]) -> None:
+        rows = list(rows)
+        if not rows:
+            return
+        with self._lock:
+            self._buffer.append([0, rows])
+            self._rows += len(rows)
+            self._enforce_cap()
+            full = self._rows >= self.batch_size
+        self.start()
+        if full:
+            self._wakeup.set()
+
+    def _enforce_cap(self) -> None:
+        # Caller holds self._lock
+        while self._rows > self.max_rows and len(self._buffer) > 1:
+            _, rows = self._buffer.pop(0)
+            self._drop(rows, "buffer full")
+
+    def _drop(self, rows: List[MessageRow], reason: str) -> None:
+        self._rows -= len(rows)
+        self.stats["rows_dropped"] += len(rows)
+        logger.error("Write-behind dropped a %d-message turn for session %s (%s)", len(rows), rows[0][0], reason)
+
+    def pending_for_session(self, session_id: str) -> List[MessageRow]:
+        """Rows queued for `session_id` that are not in Postgres yet."""
+        with self._lock:
+            return [r for _, rows in self._buffer for r in rows if str(r[0]) == str(session_id)]
+
+    def flush(self) -> int:
+        with self._flush_lock:
+            with self._lock:
+                turns, self._buffer = self._buffer, []
+            if not turns:
+                return 0
+            batch = [r for _, rows in turns for r in rows]
+            try:
+                db.run(_insert_messages, batch)
+                failed, bad = [], []
+            except Exception as e:
+                self.stats["flush_errors"] += 1
+                logger.warning("Write-behind flush of %d messages failed, retrying turn by turn: %s", len(batch), e)
+                failed, bad = self._flush_turns(turns)
+            written = len(batch) - sum(len(rows) for _, rows, *_ in failed + bad)
+
+            with self._lock:
+                self._rows -= written
+                for _, rows, e in bad:
+                    self._drop(rows, f"{type(e).__name__}: {e}")
+                retry = []
+                for attempts, rows in failed:
+                    # Only count attempts while other turns get through; if nothing
+                    # does, Postgres itself is down and the buffer cap takes over
+                    attempts += bool(written)
+                    if attempts >= self.max_attempts:
+                        self._drop(rows, f"failed {attempts} flushes")
+                    else:
+                        retry.append([attempts, rows])
+                # Turns submitted during the flush stay behind the ones being retried
+                self._buffer = retry + self._buffer
+                self._enforce_cap()
+            if written:
+                self.stats["flushes"] += 1
+                self.stats["rows_flushed"] += written
+            return written
+
+    def _flush_turns(self, turns: List[List[Any]]) -> Tuple[List[List[Any]], List[List[Any]]]:
+        """
+        Insert each turn in its own transaction. Returns the turns worth
+        retrying, and the turns whose rows Postgres rejected (with the error).
+        """
+        failed, bad = [], []
+        for attempts, rows in turns:
+            try:
+                db.run(_insert_messages, rows)
+            except (psycopg2.DataError, psycopg2.IntegrityError) as e:
+                # The rows themselves are bad; retrying can't help
+                bad.append([attempts, rows, e])
+            except Exception as e:
+                logger.warning("Write-behind insert of a %d-message turn for session %s failed: %s",
+                               len(rows), rows[0][0], e)
+                failed.append([attempts, rows])
+        return failed, bad
+
+    def _run(self) -> None:
+        while not self._stopped.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def close(self) -> None:
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.flush_interval + 5)
+            self._thread = None
+        self.flush()
+
+    def buffered(self) -> int:
+        with self._lock:
+            return self._rows
+
+
+write_behind = WriteBehindWriter()
+
+
+def record_turn(rows: Iterable[MessageRow]) -> None:
+    """Persist a turn according to MESSAGE_WRITE_MODE."""
+    if MESSAGE_WRITE_MODE == "write_behind":
+        write_behind.submit(rows)
+    else:
+        save_turn(rows)
+
+
+async def arecord_turn(rows: Iterable[MessageRow]) -> None:
+    if MESSAGE_WRITE_MODE == "write_behind":
+        write_behind.submit(rows)
+    else:
+        await asave_turn(rows)
+
+
+def pending_messages(session_id: str) -> List[Tuple[str, str, datetime]]:
+    """Buffered rows for a session shaped like `SELECT role, message, timestamp`."""
+    return [
+        (role, message, datetime.fromisoformat(ts) if isinstance(ts, str) else ts)
+        for _, role, message, ts in write_behind.pending_for_session(session_id)
+    ]
+
+
+def writer_stats() -> Dict[str, Any]:
+    stats = dict(write_behind.stats)
+    stats["mode"] = MESSAGE_WRITE_MODE
+    stats["buffered"] = write_behind.buffered()
+    return stats
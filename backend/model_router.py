@@ -0,0 +1,122 @@
+import os
+import re
+import threading
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Tuple
+
+
+# ----------------------------
+# Config
+# ----------------------------
+LLM_ROUTING = os.getenv("LLM_ROUTING", "true").lower() == "true"
+LARGE_MODEL = os.getenv("LARGE_MODEL", "gpt-4")
+# 0 leaves the large model's answer length uncapped
+LARGE_MAX_TOKENS = int(os.getenv("LARGE_MAX_TOKENS", "0")) or None
+SMALL_MODEL = os.getenv("SMALL_MODEL", "gpt-3.5-turbo")
+SMALL_MAX_TOKENS = int(os.getenv("SMALL_MAX_TOKENS", "350"))
+# Contact-style and off-topic questions up to this many words go to the small model
+ROUTER_SIMPLE_MAX_WORDS = int(os.getenv("ROUTER_SIMPLE_MAX_WORDS", "12"))
+
+# The whole message is a greeting or acknowledgement, nothing more
+_GREETING_RE = re.compile(
+    r"^\s*((hi|hello|hey|thanks|thank you|good (morning|afternoon|evening)|bye|goodbye|ok(ay)?|cool|great)"
+    r"( (there|team|all|everyone|so much|a lot))?[\s,.!?]*)+$",
+    re.IGNORECASE,
+)
+# Contact-page style questions with short factual answers
+_FAQ_RE = re.compile(
+    r"\b(phone|number|email|e-mail|address|contact|located|location|office|hours|timings?|"
+    r"careers?|jobs?|hiring|founded|ceo|founder)\b",
+    re.IGNORECASE,
+)
+# Any of these keeps a question off the small-model shortcuts
+_COMPLEX_RE = re.compile(
+    r"\b(why|how (do|does|can|could|would|should|to)|explain|compare|comparison|differences?|versus|vs|"
+    r"pros and cons|trade-?offs?|architecture|strategy|step[- ]by[- ]step|in detail|detailed|"
+    r"implement\w*|integrat\w*|migrat\w*|roadmap|estimate)\b",
+    re.IGNORECASE,
+)
+
+
+@dataclass(frozen=True)
+class ModelRoute:
+    """A model choice plus the answer length and prompt that go with it."""
+    name: str
+    model_name: str
+    max_tokens: Optional[int]
+    detail_level: str
+    # Prompt variant used unless the request picked one; None keeps PROMPT_VARIANT
+    variant: Optional[str] = None
+
+
+SMALL_ROUTE = ModelRoute("small", SMALL_MODEL, SMALL_MAX_TOKENS, detail_level="low", variant="concise")
+LARGE_ROUTE = ModelRoute("large", LARGE_MODEL, LARGE_MAX_TOKENS, detail_level="high")
+
+
+def _new_route_stats() -> Dict[str, Any]:
+    return {"requests": 0, "errors": 0, "seconds": 0.0, "max_seconds": 0.0,
+            "prompt_tokens": 0, "completion_tokens": 0, "reasons": {}}
+
+
+class ModelRouter:
+    """
+    Sends a few recognisable kinds of question to the small model using cheap
+    heuristics on the question text (no model call); everything else goes to
+    the large model. Keeps per-route latency and token totals for /metrics.
+    """
+
+    def __init__(self, enabled: bool = LLM_ROUTING):
+        self.enabled = enabled
+        self.routes = {SMALL_ROUTE.name: SMALL_ROUTE, LARGE_ROUTE.name: LARGE_ROUTE}
+        self._lock = threading.Lock()
+        self._stats = {name: _new_route_stats() for name in self.routes}
+
+    def choose(self, query: str, retrieval_route: Optional[str] = None) -> Tuple[ModelRoute, str]:
+        """
+        Returns the route and the reason it was picked. Bare greetings, and
+        short off-topic or contact-style questions without any complexity
+        keyword, go small. Everything else, including ordinary product
+        questions, goes large.
+        """
+        if not self.enabled:
+            return LARGE_ROUTE, "routing_disabled"
+
+        if _GREETING_RE.match(query):
+            return SMALL_ROUTE, "greeting"
+        if len(query.split()) <= ROUTER_SIMPLE_MAX_WORDS and not _COMPLEX_RE.search(query):
+            if retrieval_route == "none":
+                return SMALL_ROUTE, "off_topic"
+            if _FAQ_RE.search(query):
+                return SMALL_ROUTE, "faq"
+        return LARGE_ROUTE, "default"
+
+    def record(self, route: ModelRoute, reason: str, seconds: float, prompt_tokens: int,
+               completion_tokens: int, failed: bool = False) -> None:
+        with self._lock:
+            stats = self._stats[route.name]
+            stats["requests"] += 1
+            stats["errors"] += failed
+            stats["seconds"] += seconds
+            stats["max_seconds"] = max(stats["max_seconds"], seconds)
+            stats["prompt_tokens"] += prompt_tokens
+            stats["completion_tokens"] += completion_tokens
+            stats["reasons"][reason] = stats["reasons"].get(reason, 0) + 1
+
+    def stats(self) -> Dict[str, Any]:
+        snapshot: Dict[str, Any] = {"enabled": self.enabled}
+        with self._lock:
+            for name, stats in self._stats.items():
+                route = self.routes[name]
+                requests = stats["requests"]
+                snapshot[name] = {
+                    **stats,
+                    "reasons": dict(stats["reasons"]),
+                    "model": route.model_name,
+                    "max_tokens": route.max_tokens,
+                    "avg_seconds": stats["seconds"] / requests if requests else 0.0,
+                    "avg_completion_tokens": stats["completion_tokens"] / requests if requests else 0.0,
+                }
+        return snapshot
+
+
+model_router = ModelRouter()
@@ -0,0 +1,96 @@
+import os
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from langchain.docstore.document import Document
+
+
+# ----------------------------
+# Config
+# ----------------------------
+# Cosine similarity a dense hit needs to be sent to the LLM
+RELEVANCE_THRESHOLD = float(os.getenv("RELEVANCE_THRESHOLD", "0.80"))
+# Below this best score the question isn't about the site at all: answer without context
+OFF_TOPIC_THRESHOLD = float(os.getenv("OFF_TOPIC_THRESHOLD", "0.72"))
+# BM25 score at which a lexical hit counts as relevant on its own (exact-term
+# matches for names, codes or products the embeddings miss)
+LEXICAL_MIN_SCORE = float(os.getenv("LEXICAL_MIN_SCORE", "4.0"))
+
+ROUTE_KB = "kb"
+ROUTE_WEB = "web"
+ROUTE_NONE = "none"
+
+
+@dataclass
+class RetrievalDecision:
+    """Where a turn's context comes from, and the similarity scores behind that choice."""
+    route: str
+    top_score: Optional[float] = None
+    scores: List[float] = field(default_factory=list)
+    kept: int = 0
+    dropped: int = 0
+    lexical_hits: int = 0
+    # Set when the chosen route found nothing and near-topic KB chunks were used instead
+    fallback: Optional[str] = None
+
+    def as_metadata(self) -> Dict[str, Any]:
+        return {
+            "route": self.route,
+            "top_score": None if self.top_score is None else round(self.top_score, 4),
+            "scores": [round(s, 4) for s in self.scores],
+            "kept": self.kept,
+            "dropped": self.dropped,
+            "lexical_hits": self.lexical_hits,
+            "fallback": self.fallback,
+            "threshold": RELEVANCE_THRESHOLD,
+            "lexical_threshold": LEXICAL_MIN_SCORE,
+            "off_topic_threshold": OFF_TOPIC_THRESHOLD,
+        }
+
+
+def _strong_lexical(doc: Document) -> bool:
+    return doc.metadata.get("bm25", 0.0) >= LEXICAL_MIN_SCORE
+
+
+def decide(docs: List[Document]) -> Tuple[RetrievalDecision, List[Document]]:
+    """
+    Pick the context route from the fused results' dense similarity and BM25
+    scores, and return the chunks to use with it:
+
+    - kb:   some chunk scores >= RELEVANCE_THRESHOLD, or some BM25 hit scores
+            >= LEXICAL_MIN_SCORE; keep exactly those chunks (a BM25-only hit
+            with no dense score is kept only if it is a strong lexical match)
+    - web:  the best chunk is near-topic but below the threshold, so search
+            the site; the near-topic chunks are returned for use if the web
+            search comes back empty
+    - none: the best chunk is below OFF_TOPIC_THRESHOLD; send no context at all
+
+    Results without any dense scores (e.g. a legacy index) are all kept as kb.
+    """
+    scored = [d.metadata["score"] for d in docs if "score" in d.metadata]
+    lexical_hits = sum(1 for d in docs if _strong_lexical(d))
+    if not scored:
+        return RetrievalDecision(ROUTE_KB if docs else ROUTE_WEB, kept=len(docs), lexical_hits=lexical_hits), docs
+
+    top = max(scored)
+    if top >= RELEVANCE_THRESHOLD or lexical_hits:
+        route, floor = ROUTE_KB, RELEVANCE_THRESHOLD
+    elif top >= OFF_TOPIC_THRESHOLD:
+        route, floor = ROUTE_WEB, OFF_TOPIC_THRESHOLD
+    else:
+        route, floor = ROUTE_NONE, None
+
+    kept = [] if floor is None else [
+        d for d in docs if ("score" in d.metadata and d.metadata["score"] >= floor) or _strong_lexical(d)
+    ]
+    decision = RetrievalDecision(
+        route=route,
+        top_score=top,
+        scores=[d.metadata["score"] for d in kept if "score" in d.metadata],
+        kept=len(kept),
+        dropped=len(docs) - len(kept),
+        lexical_hits=lexical_hits,
+    )
+    print(f"[DEBUG] Retrieval route: {route} (top score {top:.3f}, {lexical_hits} strong BM25 hits, "
+          f"kept {decision.kept}/{len(docs)})")
+    return decision, kept
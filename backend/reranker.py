@@ -0,0 +1,144 @@
+import os
+import re
+import math
+from collections import Counter
+from typing import List, Optional, Tuple
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from backend.tokens import count_tokens, truncate_to_tokens
+
+
+# ----------------------------
+# Config
+# ----------------------------
+# lexical | embedding | cross_encoder | none
+RERANKER = os.getenv("RERANKER", "lexical").lower()
+RERANKER_MODEL = os.getenv("RERANKER_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+# Tokens of retrieved context sent to the LLM (replaces the old fixed chunk count)
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "2000"))
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+class Reranker:
+    """Scores candidate chunks against the query; higher is more relevant."""
+
+    name = "none"
+
+    def score(self, query: str, chunks: List[str]) -> List[float]:
+        # Keep retrieval order: a descending score per position
+        return [float(len(chunks) - i) for i in range(len(chunks))]
+
+
+class LexicalReranker(Reranker):
+    """
+    BM25 computed over the candidate set itself. No model, no network; good at
+    rewarding chunks that actually contain the query's rarer terms.
+    """
+
+    name = "lexical"
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+
+    def score(self, query: str, chunks: List[str]) -> List[float]:
+        docs = [Counter(_TOKEN_RE.findall(c.lower())) for c in chunks]
+        lengths = [sum(d.values()) for d in docs]
+        avg_len = (sum(lengths) / len(lengths)) if lengths else 0.0
+        terms = set(_TOKEN_RE.findall(query.lower()))
+        n = len(docs)
+        idf = {}
+        for term in terms:
+            df = sum(1 for d in docs if term in d)
+            idf[term] = math.log(1 + (n - df + 0.5) / (df + 0.5))
+        scores = []
+        for doc, length in zip(docs, lengths):
+            s = 0.0
+            for term in terms:
+                tf = doc.get(term, 0)
+                if not tf:
+                    continue
+                s += idf[term] * tf * (self.k1 + 1) / (tf + self.k1 * (1 - self.b + self.b * length / (avg_len or 1)))
+            scores.append(s)
+        return scores
+
+
+class EmbeddingReranker(Reranker):
+    """
+    Cosine similarity between query and chunk embeddings. Chunks are embedded
+    with `embeddings` directly; pass the query cache as `query_embeddings` so
+    the query (already embedded for retrieval) is a cache hit, without
+    candidate chunks evicting cached queries.
+    """
+
+    name = "embedding"
+
+    def __init__(self, embeddings: Embeddings, query_embeddings: Optional[Embeddings] = None):
+        self.embeddings = embeddings
+        self.query_embeddings = query_embeddings or embeddings
+
+    def score(self, query: str, chunks: List[str]) -> List[float]:
+        q = np.asarray(self.query_embeddings.embed_query(query), dtype=np.float32)
+        m = np.asarray(self.embeddings.embed_documents(chunks), dtype=np.float32)
+        sims = m @ q / (np.linalg.norm(m, axis=1) * np.linalg.norm(q) + 1e-9)
+        return sims.tolist()
+
+
+class CrossEncoderReranker(Reranker):
+    """Local CPU cross-encoder (sentence-transformers); the model loads on first use."""
+
+    name = "cross_encoder"
+
+    def __init__(self, model_name: str = RERANKER_MODEL):
+        self.model_name = model_name
+        self._model = None
+
+    def score(self, query: str, chunks: List[str]) -> List[float]:
+        if self._model is None:
+            from sentence_transformers import CrossEncoder
+            self._model = CrossEncoder(self.model_name, device="cpu")
+        return [float(s) for s in self._model.predict([(query, c) for c in chunks])]
+
+
+def make_reranker(kind: str = RERANKER, embeddings: Optional[Embeddings] = None,
+                  query_embeddings: Optional[Embeddings] = None) -> Reranker:
+    if kind == "cross_encoder":
+        try:
+            import sentence_transformers  # noqa: F401
+            return CrossEncoderReranker()
+        except ImportError:
+            print("⚠️ sentence-transformers not installed — using the lexical reranker")
+            return LexicalReranker()
+    if kind == "embedding" and embeddings is not None:
+        return EmbeddingReranker(embeddings, query_embeddings)
+    if kind == "none":
+        return Reranker()
+    return LexicalReranker()
+
+
+def rerank(reranker: Reranker, query: str, chunks: List[str]) -> List[Tuple[str, float]]:
+    if not chunks:
+        return []
+    scored = zip(chunks, reranker.score(query, chunks))
+    return sorted(scored, key=lambda pair: pair[1], reverse=True)
+
+
+def select_within_budget(chunks: List[str], budget: int = CONTEXT_TOKEN_BUDGET) -> List[str]:
+    """
+    Take chunks in ranked order while they fit the token budget, skipping any
+    that would overflow it. The top chunk is always kept, truncated if it alone
+    exceeds the budget.
+    """
+    selected, used = [], 0
+    for chunk in chunks:
+        tokens = count_tokens(chunk)
+        if used + tokens <= budget:
+            selected.append(chunk)
+            used += tokens
+        elif not selected:
+            selected.append(truncate_to_tokens(chunk, budget))
+            used = budget
+    return selected
@@ -1,23 +1,231 @@
 import os
+import time
+import asyncio
+import threading
+from datetime import datetime
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
 from langchain_community.vectorstores import FAISS
+from langchain_community.vectorstores.utils import DistanceStrategy
 from langchain_community.embeddings import OpenAIEmbeddings
+from langchain.docstore.document import Document
+
+from backend.embedding_cache import CachedEmbeddings
+from backend.web_index import WebIndex
+from context.index_store import (
+    FLAT_FILE_NAME, SQLiteChunkStore, current_index_dir, current_version, load_for_serving,
+)
 
+# Root of the versioned index (see context/index_store.py for the layout)
 INDEX_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "vectorstore", "faiss_index"))
-embedding_model = OpenAIEmbeddings()
+# Query embeddings are cached (memory LRU + optional SQLite tier), see embedding_cache.py
+embedding_model = CachedEmbeddings(OpenAIEmbeddings())
 
-# Load FAISS index
-vectorstore = FAISS.load_local(
-    INDEX_DIR,
-    embedding_model,
-    allow_dangerous_deserialization=True  # required for some LC versions
-)
+# Seconds between checks of the CURRENT pointer; 0 disables the watcher
+INDEX_WATCH_INTERVAL = float(os.getenv("INDEX_WATCH_INTERVAL", "30"))
 
-# Use MMR to reduce duplicate-y chunks, fetch wider, return top-k diverse
-retriever = vectorstore.as_retriever(
-    search_type="mmr",
-    search_kwargs={
-        "k": 8,         # final docs to return
-        "fetch_k": 24,  # pool to choose diverse results from
-        "lambda_mult": 0.5  # 0=diversity, 1=similarity — 0.5 is a good balance
-    }
-)
+# MMR settings shared by the retriever and the fused multi-query path
+MMR_K = 8             # final docs to return
+MMR_FETCH_K = 24      # pool to choose diverse results from
+MMR_LAMBDA_MULT = 0.5  # 0=diversity, 1=similarity — 0.5 is a good balance
+RRF_K = 60            # standard reciprocal-rank-fusion damping constant
+
+# Hybrid retrieval: BM25 over the chunk store's FTS5 index, fused with the dense results
+HYBRID_LEXICAL = os.getenv("HYBRID_LEXICAL", "true").lower() == "true"
+LEXICAL_K = int(os.getenv("LEXICAL_K", "8"))
+# Weight of each BM25 list relative to a dense list in the fusion
+LEXICAL_WEIGHT = float(os.getenv("LEXICAL_WEIGHT", "1.0"))
+
+
+class LiveIndex:
+    """
+    The served index, swappable at runtime. A new version is loaded on the
+    caller's thread (watcher or admin endpoint) while queries keep using the
+    old one; the swap is a single reference assignment, so in-flight searches
+    finish on the version they started with.
+
+    Versions are loaded memory-mapped read-only with a SQLite chunk store, so
+    uvicorn workers share the index through the page cache instead of each
+    unpickling a private copy. The ANN index is used when the build produced one.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        self._reload_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._watcher: Optional[threading.Thread] = None
+        self.stats = {"reloads": 0, "reload_failures": 0, "loaded_at": None}
+        # (vectorstore, version) swapped as one reference so readers never see a mix
+        self._current: Tuple[FAISS, str] = self._load()
+
+    @property
+    def vectorstore(self) -> FAISS:
+        return self._current[0]
+
+    @property
+    def version(self) -> str:
+        return self._current[1]
+
+    def _pointer(self) -> str:
+        # A root without CURRENT is a pre-versioning index; its mtime stands in for a version
+        return current_version(self.root) or str(os.path.getmtime(os.path.join(self.root, FLAT_FILE_NAME)))
+
+    def _load(self) -> Tuple[FAISS, str]:
+        version = self._pointer()
+        started = time.perf_counter()
+        vectorstore = load_for_serving(current_index_dir(self.root), embedding_model)
+        self.stats["loaded_at"] = datetime.now().isoformat()
+        print(f"📚 Loaded index version {version} in {time.perf_counter() - started:.2f}s")
+        return vectorstore, version
+
+    def reload(self, force: bool = False) -> bool:
+        """Load and swap in the version CURRENT points at. Returns True if it swapped."""
+        with self._reload_lock:
+            if not force and self._pointer() == self.version:
+                return False
+            try:
+                loaded = self._load()
+            except Exception as e:
+                # Keep serving the version we have
+                self.stats["reload_failures"] += 1
+                print(f"⚠️ Index reload failed: {e}")
+                return False
+            self._current = loaded
+            self.stats["reloads"] += 1
+            return True
+
+    def _watch(self, interval: float) -> None:
+        while not self._stop.wait(interval):
+            try:
+                self.reload()
+            except Exception as e:
+                print(f"⚠️ Index watcher error: {e}")
+
+    def start_watcher(self, interval: float = INDEX_WATCH_INTERVAL) -> None:
+        if interval <= 0 or self._watcher is not None:
+            return
+        self._watcher = threading.Thread(target=self._watch, args=(interval,), name="index-watcher", daemon=True)
+        self._watcher.start()
+
+    def stop_watcher(self) -> None:
+        self._stop.set()
+
+    def snapshot(self) -> Dict[str, Any]:
+        vectorstore, version = self._current
+        return {"version": version, "ntotal": vectorstore.index.ntotal,
+                "lexical": getattr(vectorstore.docstore, "has_lexical", False),
+                "watch_interval": INDEX_WATCH_INTERVAL, **self.stats}
+
+
+live_index = LiveIndex(INDEX_DIR)
+# Chunks of pages scraped by the web fallback, searched alongside the main index.
+# Page chunks bypass the query-embedding cache so they don't evict real queries.
+web_index = WebIndex(embedding_model.underlying)
+
+
+def index_version() -> str:
+    """Identifies the served index so caches built on top of it can tell when it changes."""
+    return live_index.version
+
+
+# faiss and sqlite release the GIL while searching, so per-variant searches overlap
+_search_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="faiss")
+
+
+def reciprocal_rank_fusion(ranked_lists: Sequence[List[Document]], k: int = RRF_K,
+                           weights: Optional[Sequence[float]] = None) -> List[Document]:
+    """
+    Merge several ranked result lists into one, scoring each chunk by
+    sum(weight / (k + rank)) over the lists it appears in. Chunks are identified
+    by their stripped text, so duplicates across lists collapse into one entry
+    (the copy with the highest similarity score, if any list scored it,
+    keeping the best BM25 score seen for it too).
+    """
+    scores: Dict[str, float] = {}
+    docs: Dict[str, Document] = {}
+    for i, results in enumerate(ranked_lists):
+        weight = weights[i] if weights else 1.0
+        for rank, doc in enumerate(results, start=1):
+            key = doc.page_content.strip()
+            if not key:
+                continue
+            scores[key] = scores.get(key, 0.0) + weight / (k + rank)
+            kept = docs.get(key)
+            if kept is None:
+                docs[key] = doc
+                continue
+            best, other = (doc, kept) if doc.metadata.get("score", -1.0) > kept.metadata.get("score", -1.0) else (kept, doc)
+            bm25 = max(best.metadata.get("bm25", -1.0), other.metadata.get("bm25", -1.0))
+            if bm25 > best.metadata.get("bm25", -1.0):
+                best = Document(page_content=best.page_content, metadata={**best.metadata, "bm25": bm25})
+            docs[key] = best
+    return [docs[key] for key in sorted(scores, key=scores.get, reverse=True)]
+
+
+def _cosine(vectorstore: FAISS, distance: float) -> float:
+    # OpenAI embeddings are unit length, so squared L2 distance maps straight to cosine
+    if vectorstore.distance_strategy == DistanceStrategy.MAX_INNER_PRODUCT:
+        return float(distance)
+    return 1.0 - float(distance) / 2.0
+
+
+def _mmr_by_vector(vectorstore: FAISS, vector: List[float]) -> List[Document]:
+    """MMR results, each a copy carrying its cosine similarity to the query as metadata["score"]."""
+    results = vectorstore.max_marginal_relevance_search_with_score_by_vector(
+        vector, k=MMR_K, fetch_k=MMR_FETCH_K, lambda_mult=MMR_LAMBDA_MULT
+    )
+    # Copies, so the score never leaks into documents the docstore shares between requests
+    return [
+        Document(page_content=doc.page_content,
+                 metadata={**doc.metadata, "score": _cosine(vectorstore, distance)})
+        for doc, distance in results
+    ]
+
+
+def _lexical(vectorstore: FAISS, query: str) -> List[Document]:
+    store = vectorstore.docstore
+    # Legacy pickled indexes have no BM25 table
+    if not HYBRID_LEXICAL or not isinstance(store, SQLiteChunkStore):
+        return []
+    # Copies carrying the BM25 score, which the relevance policy reads
+    return [
+        Document(page_content=doc.page_content, metadata={**doc.metadata, "bm25": float(score)})
+        for doc, score in store.lexical_search(query, LEXICAL_K)
+    ]
+
+
+def _fuse(dense: List[List[Document]], lexical: List[List[Document]], web: List[List[Document]]) -> List[Document]:
+    web = [docs for docs in web if docs]
+    weights = [1.0] * len(dense) + [LEXICAL_WEIGHT] * len(lexical) + [1.0] * len(web)
+    return reciprocal_rank_fusion(dense + lexical + web, weights=weights)
+
+
+def retrieve_fused(queries: List[str]) -> List[Document]:
+    """
+    Hybrid retrieval: BM25 and MMR searches for every query variant run
+    concurrently and are merged with weighted reciprocal-rank fusion. All
+    variants are embedded in one batched request.
+    """
+    vectorstore = live_index.vectorstore  # every search uses the same version
+    # BM25 needs no embedding, so it runs while the variants are being embedded
+    lexical = [_search_pool.submit(_lexical, vectorstore, q) for q in queries]
+    vectors = embedding_model.embed_documents(queries)
+    web = [_search_pool.submit(web_index.search_by_vector, v) for v in vectors]
+    dense = list(_search_pool.map(partial(_mmr_by_vector, vectorstore), vectors))
+    return _fuse(dense, [f.result() for f in lexical], [f.result() for f in web])
+
+
+async def aretrieve_fused(queries: List[str]) -> List[Document]:
+    """Async variant of `retrieve_fused`."""
+    vectorstore = live_index.vectorstore
+    loop = asyncio.get_running_loop()
+    lexical = [loop.run_in_executor(_search_pool, _lexical, vectorstore, q) for q in queries]
+    vectors = await embedding_model.aembed_documents(queries)
+    # The web index may refresh from SQLite, so it stays off the event loop too
+    web = [loop.run_in_executor(_search_pool, web_index.search_by_vector, v) for v in vectors]
+    dense = await asyncio.gather(*(
+        loop.run_in_executor(_search_pool, _mmr_by_vector, vectorstore, v) for v in vectors
+    ))
+    return _fuse(list(dense), list(await asyncio.gather(*lexical)), list(await asyncio.gather(*web)))
@@ -1,9 +1,8 @@
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel, EmailStr
 from datetime import datetime
-import psycopg2
 import uuid
-from database_setup import DB_NAME, DB_USER, DB_PASSWORD, DB_HOST, DB_PORT
+from backend import db
 
 router = APIRouter()
 
@@ -17,19 +16,11 @@ class UserCreate(BaseModel):
 
 
 # --- Helper Functions ---
-def get_or_create_session(*, email: str, browser: str, ip: str, discard_previous: bool = False) -> str:
-    """Return an active session_id for the user, or create one if none exists."""
-    conn = psycopg2.connect(
-        dbname=DB_NAME, user=DB_USER, password=DB_PASSWORD,
-        host=DB_HOST, port=DB_PORT
-    )
-    cursor = conn.cursor()
-
+def _get_or_create_session(cursor, *, email: str, browser: str, ip: str, discard_previous: bool = False) -> str:
     # 1. Get user_id from users table
     cursor.execute("SELECT id FROM users WHERE email = %s", (email,))
     user_row = cursor.fetchone()
     if not user_row:
-        conn.close()
         raise Exception("User not found while creating session")
     user_id = user_row[0]
 
@@ -59,21 +50,11 @@ def get_or_create_session(*, email: str, browser: str, ip: str, discard_previous
             """,
             (user_id, session_id, datetime.now(), browser, ip)
         )
-        conn.commit()
 
-    cursor.close()
-    conn.close()
     return session_id
 
 
-def save_user_to_db(*, username: str, email: str, mobile: str, browser: str, ip: str) -> None:
-    """Insert a new user if not exists."""
-    conn = psycopg2.connect(
-        dbname=DB_NAME, user=DB_USER, password=DB_PASSWORD,
-        host=DB_HOST, port=DB_PORT
-    )
-    cursor = conn.cursor()
-
+def _save_user_to_db(cursor, *, username: str, email: str, mobile: str, browser: str, ip: str) -> None:
     # Check if user already exists
     cursor.execute("SELECT id FROM users WHERE email = %s", (email,))
     if cursor.fetchone() is None:
@@ -84,18 +65,26 @@ def save_user_to_db(*, username: str, email: str, mobile: str, browser: str, ip:
             """,
             (username, email, mobile, browser, ip, datetime.now())
         )
-        conn.commit()
 
-    cursor.close()
-    conn.close()
+
+def get_or_create_session(*, email: str, browser: str, ip: str, discard_previous: bool = False) -> str:
+    """Return an active session_id for the user, or create one if none exists."""
+    return db.run(_get_or_create_session, email=email, browser=browser, ip=ip,
+                  discard_previous=discard_previous)
+
+
+def save_user_to_db(*, username: str, email: str, mobile: str, browser: str, ip: str) -> None:
+    """Insert a new user if not exists."""
+    db.run(_save_user_to_db, username=username, email=email, mobile=mobile, browser=browser, ip=ip)
 
 
 # --- API Route ---
 @router.post("/user/register")
-def register_user(user: UserCreate):
+async def register_user(user: UserCreate):
     try:
         # Save user if new
-        save_user_to_db(
+        await db.arun(
+            _save_user_to_db,
             username=user.username,
             email=user.email,
             mobile=user.mobile,
@@ -104,7 +93,8 @@ def register_user(user: UserCreate):
         )
 
         # Always create or fetch a session
-        session_id = get_or_create_session(
+        session_id = await db.arun(
+            _get_or_create_session,
             email=user.email,
             browser=user.browser,
             ip=user.ip
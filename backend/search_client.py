@@ -1,8 +1,11 @@
 import os
-from functools import lru_cache
+import asyncio
 from tavily import TavilyClient 
 from dotenv import load_dotenv
 
+from backend.embedding_cache import normalize_text
+from backend.web_cache import web_cache
+
 load_dotenv()
 
 # Initialize once
@@ -13,11 +16,11 @@ if not TAVILY_API_KEY:
 client = TavilyClient(api_key=TAVILY_API_KEY)
 
 
-@lru_cache(maxsize=500)
 def search_site(query: str, site_url: str, max_results: int = 5):
     """
     Perform a site-specific internet search using Tavily.
-    Results are cached to reduce API usage.
+    Successful results are kept in the shared TTL web cache to reduce API
+    usage; failures are returned but never cached.
     
     Args:
         query (str): User's search query
@@ -28,6 +31,10 @@ def search_site(query: str, site_url: str, max_results: int = 5):
         list of dicts with {title, url, snippet}
     """
     site_query = f"{query} site:{site_url}"
+    cache_key = f"{site_url}|{max_results}|{normalize_text(query)}"
+    cached = web_cache.get("search", cache_key)
+    if cached is not None:
+        return cached
 
     try:
         results = client.search(query=site_query, max_results=max_results)
@@ -40,7 +47,13 @@ def search_site(query: str, site_url: str, max_results: int = 5):
                 "snippet": r.get("content"),
             })
 
+        web_cache.set("search", cache_key, structured)
         return structured
 
     except Exception as e:
         return [{"error": f"Search failed: {e}"}]
+
+
+async def asearch_site(query: str, site_url: str, max_results: int = 5):
+    """Non-blocking wrapper around `search_site` (Tavily's client is sync)."""
+    return await asyncio.to_thread(search_site, query, site_url, max_results)
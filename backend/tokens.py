@@ -0,0 +1,36 @@
+from functools import lru_cache
+
+# tiktoken is optional; without it counts fall back to ~4 characters per token
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+DEFAULT_MODEL = "gpt-4"
+_CHARS_PER_TOKEN = 4
+
+
+@lru_cache(maxsize=8)
+def _encoding(model: str):
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+
+
+def count_tokens(text: str, model: str = DEFAULT_MODEL) -> int:
+    if not text:
+        return 0
+    if tiktoken is None:
+        return max(1, len(text) // _CHARS_PER_TOKEN)
+    return len(_encoding(model).encode(text, disallowed_special=()))
+
+
+def truncate_to_tokens(text: str, max_tokens: int, model: str = DEFAULT_MODEL) -> str:
+    if max_tokens <= 0:
+        return ""
+    if tiktoken is None:
+        return text[:max_tokens * _CHARS_PER_TOKEN]
+    encoding = _encoding(model)
+    tokens = encoding.encode(text, disallowed_special=())
+    return text if len(tokens) <= max_tokens else encoding.decode(tokens[:max_tokens])
@@ -0,0 +1,115 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+from typing import Any, Dict, Optional
+
+from backend.embedding_cache import LRUTTLCache
+
+
+# ----------------------------
+# Config
+# ----------------------------
+WEB_SEARCH_CACHE_TTL = float(os.getenv("WEB_SEARCH_CACHE_TTL", str(3600)))
+WEB_PAGE_CACHE_TTL = float(os.getenv("WEB_PAGE_CACHE_TTL", str(6 * 3600)))
+WEB_CACHE_MAX_ENTRIES = int(os.getenv("WEB_CACHE_MAX_ENTRIES", "2000"))
+# SQLite file shared by every worker process; empty keeps the cache per-process
+WEB_CACHE_SQLITE = os.getenv(
+    "WEB_CACHE_SQLITE",
+    os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "vectorstore", "web_cache.sqlite")),
+)
+
+
+class SQLiteTTLStore:
+    """Persistent key -> JSON value tier with per-entry expiry (WAL, thread-local connections)."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        conn = self._conn()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS web_cache ("
+            " key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+        conn.commit()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> Optional[Any]:
+        row = self._conn().execute(
+            "SELECT value FROM web_cache WHERE key = ? AND expires_at >= ?", (key, time.time())
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        conn = self._conn()
+        conn.execute(
+            "INSERT OR REPLACE INTO web_cache (key, value, expires_at) VALUES (?, ?, ?)",
+            (key, json.dumps(value), time.time() + ttl),
+        )
+        conn.commit()
+
+
+class WebCache:
+    """
+    TTL cache for Tavily results and scraped page text: a memory LRU per kind
+    in front of an optional SQLite tier shared across workers. Callers must only
+    `set` successful results; failures are never cached.
+    """
+
+    TTLS = {"search": WEB_SEARCH_CACHE_TTL, "page": WEB_PAGE_CACHE_TTL}
+
+    def __init__(self, max_entries: int = WEB_CACHE_MAX_ENTRIES, sqlite_path: Optional[str] = WEB_CACHE_SQLITE or None):
+        self.memory = {kind: LRUTTLCache(max_entries, ttl) for kind, ttl in self.TTLS.items()}
+        self.disk = None
+        if sqlite_path:
+            try:
+                self.disk = SQLiteTTLStore(sqlite_path)
+            except sqlite3.Error as e:
+                print(f"⚠️ Web cache SQLite tier disabled ({e})")
+        self._lock = threading.Lock()
+        self._stats = {f"{kind}_{event}": 0 for kind in self.TTLS for event in ("hits", "misses")}
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._stats[name] += 1
+
+    def get(self, kind: str, key: str) -> Optional[Any]:
+        full_key = f"{kind}:{key}"
+        value = self.memory[kind].get(full_key)
+        if value is None and self.disk is not None:
+            try:
+                value = self.disk.get(full_key)
+            except sqlite3.Error as e:
+                print(f"⚠️ Web cache read failed: {e}")
+            if value is not None:
+                self.memory[kind].set(full_key, value)
+        self._count(f"{kind}_{'hits' if value is not None else 'misses'}")
+        return value
+
+    def set(self, kind: str, key: str, value: Any) -> None:
+        full_key = f"{kind}:{key}"
+        self.memory[kind].set(full_key, value)
+        if self.disk is not None:
+            try:
+                self.disk.set(full_key, value, self.TTLS[kind])
+            except sqlite3.Error as e:
+                print(f"⚠️ Web cache write failed: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            snapshot = dict(self._stats)
+        snapshot["shared"] = self.disk is not None
+        return snapshot
+
+
+web_cache = WebCache()
@@ -0,0 +1,114 @@
+import os
+import time
+import asyncio
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Dict, List, Set, Tuple
+
+from backend.search_client import search_site, asearch_site
+from backend.web_cache import web_cache
+from backend.retriever import web_index
+from crawler.scraper import scrape_url, scrape_page
+
+
+# ----------------------------
+# Config
+# ----------------------------
+# Total seconds the fallback may spend scraping; slower pages fall back to Tavily's snippet
+WEB_FALLBACK_DEADLINE = float(os.getenv("WEB_FALLBACK_DEADLINE", "8"))
+
+# Sync callers (Streamlit) scrape on these threads; the browser pool bounds real concurrency
+_scrape_pool = ThreadPoolExecutor(max_workers=5, thread_name_prefix="web-fallback")
+# Async callers run web cache (SQLite) reads and writes here, off the event loop
+_cache_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="web-cache")
+
+# Scrapes still running after their request's deadline; held so they aren't garbage-collected
+_late_scrapes: Set[asyncio.Task] = set()
+
+# (search result, text to use) per result
+WebPages = List[Tuple[Dict, str]]
+
+
+def _usable(results: List[Dict]) -> List[Dict]:
+    return [r for r in results if r.get("url")]
+
+
+def _finish(results: List[Dict], texts: Dict[str, str], started: float) -> WebPages:
+    pages, snippets = [], 0
+    for res in results:
+        text = texts.get(res["url"])
+        if not text:
+            text = res.get("snippet") or ""
+            snippets += bool(text)
+        pages.append((res, text))
+    print(f"[DEBUG] Web fallback: {len(results)} results, {len(results) - snippets} pages, "
+          f"{snippets} snippets, {time.perf_counter() - started:.1f}s")
+    return pages
+
+
+def _cached_pages(results: List[Dict]) -> Tuple[Dict[str, str], List[Dict]]:
+    texts, missing = {}, []
+    for res in results:
+        text = web_cache.get("page", res["url"])
+        if text:
+            texts[res["url"]] = text
+        else:
+            missing.append(res)
+    return texts, missing
+
+
+def _store(res: Dict, text: str, texts: Dict[str, str]) -> None:
+    if text:  # empty text means the scrape failed: never cache it
+        web_cache.set("page", res["url"], text)
+        web_index.schedule_ingest(res["url"], res.get("title", ""), text)
+        texts[res["url"]] = text
+
+
+def _cache_when_done(res: Dict, offload: bool = False):
+    # Scrapes that miss the deadline keep running and warm the cache for the next turn.
+    # Async tasks call back on the event loop, so they hand the write to _cache_pool.
+    def callback(future) -> None:
+        if not future.cancelled() and future.exception() is None:
+            if offload:
+                _cache_pool.submit(_store, res, future.result(), {})
+            else:
+                _store(res, future.result(), {})
+    return callback
+
+
+def collect_web_pages(query: str, site: str, deadline: float = WEB_FALLBACK_DEADLINE) -> WebPages:
+    """
+    Search `site`, then scrape uncached results concurrently. Anything not
+    scraped within `deadline` seconds uses the search snippet instead.
+    """
+    started = time.perf_counter()
+    results = _usable(search_site(query, site))
+    texts, missing = _cached_pages(results)
+    if missing:
+        futures = {_scrape_pool.submit(scrape_url, res["url"]): res for res in missing}
+        remaining = max(0.0, deadline - (time.perf_counter() - started))
+        done, pending = wait(futures, timeout=remaining)
+        for future in done:
+            _store(futures[future], future.result(), texts)
+        for future in pending:
+            future.add_done_callback(_cache_when_done(futures[future]))
+    return _finish(results, texts, started)
+
+
+async def acollect_web_pages(query: str, site: str, deadline: float = WEB_FALLBACK_DEADLINE) -> WebPages:
+    """Async variant of `collect_web_pages`."""
+    started = time.perf_counter()
+    loop = asyncio.get_running_loop()
+    results = _usable(await asearch_site(query, site))
+    texts, missing = await loop.run_in_executor(_cache_pool, _cached_pages, results)
+    if missing:
+        tasks = {asyncio.ensure_future(scrape_page(res["url"])): res for res in missing}
+        remaining = max(0.0, deadline - (time.perf_counter() - started))
+        done, pending = await asyncio.wait(tasks, timeout=remaining)
+        await asyncio.gather(*(
+            loop.run_in_executor(_cache_pool, _store, tasks[task], task.result(), texts) for task in done
+        ))
+        for task in pending:
+            _late_scrapes.add(task)
+            task.add_done_callback(_late_scrapes.discard)
+            task.add_done_callback(_cache_when_done(tasks[task], offload=True))
+    return _finish(results, texts, started)
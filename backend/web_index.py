@@ -0,0 +1,165 @@
+import os
+import time
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain.docstore.document import Document
+
+from chunking.chunk_generator import chunk_text
+
+
+# ----------------------------
+# Config
+# ----------------------------
+WEB_INDEX_ENABLED = os.getenv("WEB_INDEX_ENABLED", "true").lower() == "true"
+WEB_INDEX_SQLITE = os.getenv(
+    "WEB_INDEX_SQLITE",
+    os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "vectorstore", "web_index.sqlite")),
+)
+# Scraped pages go stale; expire their chunks after this many seconds
+WEB_INDEX_TTL = float(os.getenv("WEB_INDEX_TTL", str(24 * 3600)))
+# Oldest chunks are evicted beyond this size
+WEB_INDEX_MAX_CHUNKS = int(os.getenv("WEB_INDEX_MAX_CHUNKS", "2000"))
+WEB_INDEX_MAX_CHUNKS_PER_PAGE = int(os.getenv("WEB_INDEX_MAX_CHUNKS_PER_PAGE", "20"))
+WEB_INDEX_K = int(os.getenv("WEB_INDEX_K", "4"))
+# Cosine similarity below which a web chunk is not returned at all
+WEB_INDEX_MIN_SCORE = float(os.getenv("WEB_INDEX_MIN_SCORE", "0.8"))
+# How often a worker checks the shared file for chunks other workers added
+WEB_INDEX_SYNC_INTERVAL = float(os.getenv("WEB_INDEX_SYNC_INTERVAL", "5"))
+
+# Same granularity as the main index build
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 200
+
+
+class WebIndex:
+    """
+    Secondary "live" vector index of pages scraped by the web fallback, so a
+    repeated fallback question is answered from local retrieval. Chunks live
+    in a SQLite file shared by all workers; each worker searches an in-memory
+    matrix of the unexpired rows (brute force is fine at this size cap) and
+    reloads it when the file changes.
+    """
+
+    def __init__(self, embeddings: Embeddings, path: str = WEB_INDEX_SQLITE,
+                 ttl: float = WEB_INDEX_TTL, max_chunks: int = WEB_INDEX_MAX_CHUNKS):
+        self.embeddings = embeddings
+        self.path = path
+        self.ttl = ttl
+        self.max_chunks = max_chunks
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._ingest_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="web-index")
+        # (matrix of unit vectors, [(url, title, content)]) swapped as one reference
+        self._snapshot: Tuple[Optional[np.ndarray], List[Tuple[str, str, str]]] = (None, [])
+        self._state = None
+        self._checked_at = 0.0
+        self.stats = {"pages_ingested": 0, "chunks_ingested": 0, "ingest_failures": 0, "hits": 0}
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        conn = self._conn()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS web_chunks ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT, url TEXT NOT NULL, title TEXT,"
+            " content TEXT NOT NULL, vector BLOB NOT NULL, expires_at REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_web_chunks_url ON web_chunks(url)")
+        conn.commit()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    # ---- ingestion ----
+    def schedule_ingest(self, url: str, title: str, text: str) -> None:
+        """Chunk, embed and store a scraped page in the background."""
+        if WEB_INDEX_ENABLED and text.strip():
+            self._ingest_pool.submit(self._ingest, url, title or url, text)
+
+    def _ingest(self, url: str, title: str, text: str) -> None:
+        try:
+            chunks = chunk_text(text, chunk_size=CHUNK_SIZE, overlap=CHUNK_OVERLAP)[:WEB_INDEX_MAX_CHUNKS_PER_PAGE]
+            if not chunks:
+                return
+            vectors = self.embeddings.embed_documents(chunks)
+            expires_at = time.time() + self.ttl
+            conn = self._conn()
+            with conn:
+                # A re-scraped page replaces its previous version
+                conn.execute("DELETE FROM web_chunks WHERE url = ?", (url,))
+                conn.executemany(
+                    "INSERT INTO web_chunks (url, title, content, vector, expires_at) VALUES (?, ?, ?, ?, ?)",
+                    [(url, title, c, np.asarray(v, dtype=np.float32).tobytes(), expires_at)
+                     for c, v in zip(chunks, vectors)],
+                )
+                conn.execute("DELETE FROM web_chunks WHERE expires_at < ?", (time.time(),))
+                conn.execute(
+                    "DELETE FROM web_chunks WHERE id NOT IN "
+                    "(SELECT id FROM web_chunks ORDER BY id DESC LIMIT ?)", (self.max_chunks,)
+                )
+            self._checked_at = 0.0  # pick it up on this worker's next search
+            self.stats["pages_ingested"] += 1
+            self.stats["chunks_ingested"] += len(chunks)
+            print(f"[DEBUG] Web index: stored {len(chunks)} chunks from {url}")
+        except Exception as e:
+            self.stats["ingest_failures"] += 1
+            print(f"⚠️ Web index ingestion failed for {url}: {e}")
+
+    # ---- search ----
+    def _refresh(self) -> None:
+        now = time.time()
+        if now - self._checked_at < WEB_INDEX_SYNC_INTERVAL:
+            return
+        with self._lock:
+            if now - self._checked_at < WEB_INDEX_SYNC_INTERVAL:
+                return
+            self._checked_at = now
+            conn = self._conn()
+            state = conn.execute("SELECT MAX(id), COUNT(*), MIN(expires_at) FROM web_chunks").fetchone()
+            expired = state[2] is not None and state[2] < now
+            if state == self._state and not expired:
+                return
+            rows = conn.execute(
+                "SELECT url, title, content, vector FROM web_chunks WHERE expires_at >= ? ORDER BY id", (now,)
+            ).fetchall()
+            self._state = state
+            if not rows:
+                self._snapshot = (None, [])
+                return
+            matrix = np.vstack([np.frombuffer(r[3], dtype=np.float32) for r in rows])
+            matrix /= np.linalg.norm(matrix, axis=1, keepdims=True) + 1e-9
+            self._snapshot = (matrix, [(r[0], r[1], r[2]) for r in rows])
+
+    def search_by_vector(self, vector: List[float], k: int = WEB_INDEX_K) -> List[Document]:
+        if not WEB_INDEX_ENABLED:
+            return []
+        try:
+            self._refresh()
+        except sqlite3.Error as e:
+            print(f"⚠️ Web index refresh failed: {e}")
+        matrix, rows = self._snapshot
+        if matrix is None:
+            return []
+        q = np.asarray(vector, dtype=np.float32)
+        sims = matrix @ (q / (np.linalg.norm(q) + 1e-9))
+        top = np.argsort(-sims)[:k]
+        docs = [
+            Document(page_content=rows[i][2],
+                     metadata={"source": rows[i][0], "title": rows[i][1], "origin": "web",
+                               "score": float(sims[i])})
+            for i in top if sims[i] >= WEB_INDEX_MIN_SCORE
+        ]
+        self.stats["hits"] += bool(docs)
+        return docs
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"enabled": WEB_INDEX_ENABLED, "chunks": len(self._snapshot[1]),
+                "max_chunks": self.max_chunks, "ttl": self.ttl, **self.stats}
@@ -0,0 +1,108 @@
+"""
+Recall-vs-latency benchmark: ANN index settings against exact flat search.
+
+Vectors come from the live flat index under vectorstore/faiss_index
+or, with --synthetic N, from random clustered data. Queries are stored
+vectors plus a little noise; ground truth is the flat index's top-k. Each
+setting reports recall@k, mean and p95 per-query latency and index size, so a
+deployment can pick INDEX_TYPE and FAISS_NPROBE / FAISS_EF_SEARCH.
+
+    python -m benchmarks.ann_recall --queries 500 --k 24
+    python -m benchmarks.ann_recall --synthetic 100000 --dim 1536
+"""
+import os
+import sys
+import time
+import argparse
+
+import numpy as np
+import faiss
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from context.ann_index import build_ann_index, factory_string, flat_vectors
+from context.index_store import FLAT_FILE_NAME, current_index_dir
+
+INDEX_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "vectorstore", "faiss_index"))
+
+
+def _synthetic(n: int, dim: int, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((max(1, n // 200), dim)).astype(np.float32)
+    vectors = centers[rng.integers(len(centers), size=n)] + 0.3 * rng.standard_normal((n, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def _queries(vectors: np.ndarray, n: int, seed: int = 1) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    picked = vectors[rng.choice(len(vectors), size=min(n, len(vectors)), replace=False)]
+    noisy = picked + 0.05 * rng.standard_normal(picked.shape).astype(np.float32)
+    return np.ascontiguousarray(noisy / np.linalg.norm(noisy, axis=1, keepdims=True), dtype=np.float32)
+
+
+def _measure(index: faiss.Index, queries: np.ndarray, k: int):
+    latencies = []
+    results = np.empty((len(queries), k), dtype=np.int64)
+    for i, q in enumerate(queries):
+        started = time.perf_counter()
+        _, ids = index.search(q[None, :], k)  # one at a time, like the API does
+        latencies.append(time.perf_counter() - started)
+        results[i] = ids[0]
+    return results, np.asarray(latencies) * 1000
+
+
+def _recall(results: np.ndarray, truth: np.ndarray) -> float:
+    hits = sum(len(set(r) & set(t)) for r, t in zip(results, truth))
+    return hits / truth.size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--synthetic", type=int, default=0, help="use N random vectors instead of the built index")
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=24, help="matches MMR_FETCH_K in the retriever")
+    parser.add_argument("--types", default="ivf_flat,hnsw,ivf_pq,opq_ivf_pq")
+    parser.add_argument("--nprobe", default="1,4,16,64")
+    parser.add_argument("--ef-search", default="16,64,256")
+    args = parser.parse_args()
+
+    if args.synthetic:
+        vectors = _synthetic(args.synthetic, args.dim)
+    else:
+        vectors = flat_vectors(faiss.read_index(os.path.join(current_index_dir(INDEX_DIR), FLAT_FILE_NAME)))
+    n, dim = vectors.shape
+    queries = _queries(vectors, args.queries)
+    out = sys.stdout.write
+
+    flat = build_ann_index(vectors, "Flat")
+    truth, flat_ms = _measure(flat, queries, args.k)
+    out(f"{n} vectors x {dim} dims, {len(queries)} queries, recall@{args.k}\n\n")
+    out(f"{'setting':<34} {'recall':>7} {'mean ms':>8} {'p95 ms':>8} {'size MB':>8}\n")
+
+    def row(name, index, ms, recall):
+        size_mb = faiss.serialize_index(index).nbytes / 1e6
+        out(f"{name:<34} {recall:7.3f} {ms.mean():8.3f} {np.percentile(ms, 95):8.3f} {size_mb:8.1f}\n")
+
+    row("Flat (exact)", flat, flat_ms, 1.0)
+    for index_type in args.types.split(","):
+        factory = factory_string(index_type, dim, n)
+        started = time.perf_counter()
+        index = build_ann_index(vectors, factory)
+        out(f"-- {factory}: built in {time.perf_counter() - started:.1f}s\n")
+
+        ivf = faiss.try_extract_index_ivf(index)
+        hnsw = getattr(faiss.downcast_index(index), "hnsw", None)
+        if ivf is not None:
+            for nprobe in (int(p) for p in args.nprobe.split(",")):
+                ivf.nprobe = min(nprobe, ivf.nlist)
+                results, ms = _measure(index, queries, args.k)
+                row(f"{factory} nprobe={ivf.nprobe}", index, ms, _recall(results, truth))
+        elif hnsw is not None:
+            for ef in (int(e) for e in args.ef_search.split(",")):
+                hnsw.efSearch = ef
+                results, ms = _measure(index, queries, args.k)
+                row(f"{factory} efSearch={ef}", index, ms, _recall(results, truth))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""
+Load benchmark: sync vs async /chat/send pipeline with a stubbed LLM.
+
+The retriever, Tavily client and scraper are replaced by in-memory fakes and
+the LLM by a stub that sleeps for --llm-latency seconds, so the run needs no
+API keys, FAISS index or browser. The sync path runs `build_chatbot_response`
+on a thread pool the size of FastAPI's default (40 threads); the async path
+runs `abuild_chatbot_response` under the same semaphore the API uses.
+
+    python -m benchmarks.chat_load --requests 400 --llm-latency 2
+"""
+import os
+import sys
+import time
+import types
+import asyncio
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark-stub")
+# Every request must reach the (stub) LLM for the comparison to mean anything
+os.environ.setdefault("ANSWER_CACHE_ENABLED", "false")
+os.environ.setdefault("WEB_CACHE_SQLITE", "")
+
+
+# -------------------------------
+# Stubs
+# -------------------------------
+RETRIEVAL_LATENCY = 0.05
+
+
+class _Doc:
+    def __init__(self, text):
+        self.page_content = text
+        self.metadata = {"source": "stub"}
+
+
+def _docs(queries):
+    return [_Doc(f"{q} chunk {i}") for q in queries for i in range(8)]
+
+
+def stub_retrieve_fused(queries):
+    time.sleep(RETRIEVAL_LATENCY)
+    return _docs(queries)
+
+
+async def stub_aretrieve_fused(queries):
+    await asyncio.sleep(RETRIEVAL_LATENCY)
+    return _docs(queries)
+
+
+class StubLLM:
+    def __init__(self, latency):
+        self.latency = latency
+
+    def invoke(self, prompt):
+        time.sleep(self.latency)
+        return "stub answer"
+
+    async def ainvoke(self, prompt):
+        await asyncio.sleep(self.latency)
+        return "stub answer"
+
+
+def _install_stubs(llm_latency: float):
+    retriever_mod = types.ModuleType("backend.retriever")
+    retriever_mod.retrieve_fused = stub_retrieve_fused
+    retriever_mod.aretrieve_fused = stub_aretrieve_fused
+    retriever_mod.embedding_model = None
+    retriever_mod.index_version = lambda: "stub"
+    retriever_mod.web_index = None  # stub scrapes return no text, so nothing is ingested
+    sys.modules["backend.retriever"] = retriever_mod
+
+    search_mod = types.ModuleType("backend.search_client")
+    search_mod.search_site = lambda query, site, max_results=5: []
+    search_mod.asearch_site = lambda query, site, max_results=5: asyncio.sleep(0, result=[])
+    sys.modules["backend.search_client"] = search_mod
+
+    scraper_mod = types.ModuleType("crawler.scraper")
+    scraper_mod.scrape_url = lambda url: ""
+    scraper_mod.scrape_page = lambda url: asyncio.sleep(0, result="")
+    sys.modules["crawler.scraper"] = scraper_mod
+
+    from backend import llm_client
+    llm_client.llm = StubLLM(llm_latency)
+    llm_client.small_llm = StubLLM(llm_latency)
+
+    # Silence the per-request debug prints so they don't dominate the timing
+    import builtins
+    builtins.print = lambda *a, **k: None
+
+    from backend import chat_logic
+    return chat_logic
+
+
+# -------------------------------
+# Runners
+# -------------------------------
+def run_sync(chat_logic, n_requests: int, threads: int) -> float:
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(lambda i: chat_logic.build_chatbot_response(f"question {i}", []), range(n_requests)))
+    return time.perf_counter() - started
+
+
+async def _run_async(chat_logic, n_requests: int, concurrency: int) -> float:
+    limiter = asyncio.Semaphore(concurrency)
+
+    async def one(i):
+        async with limiter:
+            return await chat_logic.abuild_chatbot_response(f"question {i}", [])
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(n_requests)))
+    return time.perf_counter() - started
+
+
+def run_async(chat_logic, n_requests: int, concurrency: int) -> float:
+    return asyncio.run(_run_async(chat_logic, n_requests, concurrency))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--llm-latency", type=float, default=2.0)
+    parser.add_argument("--threads", type=int, default=40, help="sync threadpool size")
+    parser.add_argument("--concurrency", type=int, default=256, help="async in-flight limit")
+    args = parser.parse_args()
+
+    chat_logic = _install_stubs(args.llm_latency)
+    out = sys.stdout.write
+
+    sync_s = run_sync(chat_logic, args.requests, args.threads)
+    out(f"sync  ({args.threads} threads):   {args.requests} req in {sync_s:6.2f}s "
+        f"-> {args.requests / sync_s:7.1f} req/s\n")
+
+    async_s = run_async(chat_logic, args.requests, args.concurrency)
+    out(f"async ({args.concurrency} in flight): {args.requests} req in {async_s:6.2f}s "
+        f"-> {args.requests / async_s:7.1f} req/s\n")
+    out(f"speedup: {sync_s / async_s:.1f}x\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+"""
+Offline benchmark: index-build embedding throughput by batch size and concurrency.
+
+Uses the stub embedder from context.embedding_pipeline, which sleeps for
+--latency seconds per request like a remote API round trip, so the run needs
+no API key. Checkpoints are disabled so every configuration embeds from scratch.
+
+    python -m benchmarks.embedding_pipeline --chunks 2000 --latency 0.3
+"""
+import os
+import sys
+import time
+import argparse
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from context.embedding_pipeline import EmbeddingPipeline, StubEmbeddings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--chunks", type=int, default=2000)
+    parser.add_argument("--latency", type=float, default=0.3, help="seconds per embedding request")
+    parser.add_argument("--batch-sizes", default="1,16,100")
+    parser.add_argument("--concurrency", default="1,4,8")
+    parser.add_argument("--tpm", type=int, default=10_000_000)
+    args = parser.parse_args()
+
+    texts = [f"benchmark chunk {i} " + "lorem ipsum " * 80 for i in range(args.chunks)]
+    embedder = StubEmbeddings(latency=args.latency)
+    out = sys.stdout.write
+
+    for batch_size in (int(b) for b in args.batch_sizes.split(",")):
+        for concurrency in (int(c) for c in args.concurrency.split(",")):
+            pipeline = EmbeddingPipeline(embedder, batch_size=batch_size, max_concurrency=concurrency,
+                                         tpm_budget=args.tpm, checkpoint_path=None, verbose=False)
+            started = time.perf_counter()
+            pipeline.embed(texts)
+            elapsed = time.perf_counter() - started
+            out(f"batch={batch_size:<4} concurrency={concurrency:<3} "
+                f"{args.chunks} chunks in {elapsed:7.2f}s -> {args.chunks / elapsed:8.1f} chunks/s\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Startup time and per-worker memory of the served index, mmap vs in-memory.
+
+Starts --workers processes at once, like uvicorn --workers, and has each one
+load the live index version and run a few searches. The workers stay alive
+until all of them have reported, so PSS shows how much of the index they share.
+  mmap      read-only memory-mapped index + SQLite chunk store (what the API uses)
+  inmemory  full private copy of index and docstore (the old FAISS.load_local)
+Linux only (reads /proc).
+
+    python -m benchmarks.index_memory --workers 8
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+INDEX_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "vectorstore", "faiss_index"))
+
+
+def _proc_kb(path: str, fields) -> dict:
+    found = {}
+    try:
+        with open(path, "r") as f:
+            for line in f:
+                name, _, rest = line.partition(":")
+                if name in fields:
+                    found[name] = int(rest.split()[0])
+    except OSError:
+        pass
+    return found
+
+
+def _memory_mb() -> dict:
+    status = _proc_kb("/proc/self/status", {"VmRSS", "RssAnon", "RssFile"})
+    rollup = _proc_kb("/proc/self/smaps_rollup", {"Pss"})
+    return {k: round(v / 1024, 1) for k, v in {**status, **rollup}.items()}
+
+
+def _child(mode: str, searches: int) -> None:
+    from context.embedding_pipeline import StubEmbeddings
+    from context.index_store import current_index_dir, load_for_serving, load_for_update
+
+    index_dir = current_index_dir(INDEX_DIR)
+    baseline = _memory_mb()
+    started = time.perf_counter()
+    if mode == "mmap":
+        store = load_for_serving(index_dir, StubEmbeddings())
+    else:
+        store = load_for_update(index_dir, StubEmbeddings())
+    load_seconds = time.perf_counter() - started
+
+    rng = np.random.default_rng(os.getpid())
+    for _ in range(searches):
+        store.similarity_search_by_vector(rng.standard_normal(store.index.d).astype(np.float32).tolist(), k=8)
+
+    print(json.dumps({"load_seconds": load_seconds, "baseline": baseline, "loaded": _memory_mb()}), flush=True)
+    sys.stdin.readline()  # stay resident until the parent has heard from every worker
+
+
+def _run(mode: str, workers: int, searches: int) -> None:
+    procs = [
+        subprocess.Popen([sys.executable, "-m", "benchmarks.index_memory", "--child", mode,
+                          "--searches", str(searches)],
+                         stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True,
+                         cwd=os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+        for _ in range(workers)
+    ]
+    reports = [json.loads(p.stdout.readline()) for p in procs]
+    for p in procs:
+        p.stdin.close()
+        p.wait()
+
+    def avg(key, field):
+        return sum(r[key].get(field, 0.0) for r in reports) / len(reports)
+
+    def delta(field):
+        return avg("loaded", field) - avg("baseline", field)
+
+    out = sys.stdout.write
+    out(f"{mode:<9} load {sum(r['load_seconds'] for r in reports) / len(reports):6.2f}s  "
+        f"RSS +{delta('VmRSS'):7.1f} MB  anon +{delta('RssAnon'):7.1f} MB  "
+        f"file +{delta('RssFile'):7.1f} MB  PSS +{delta('Pss'):7.1f} MB  per worker; "
+        f"{workers} workers PSS total +{delta('Pss') * workers:7.1f} MB\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--searches", type=int, default=50)
+    parser.add_argument("--mode", choices=["mmap", "inmemory", "both"], default="both")
+    parser.add_argument("--child", choices=["mmap", "inmemory"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        _child(args.child, args.searches)
+        return
+    for mode in (["inmemory", "mmap"] if args.mode == "both" else [args.mode]):
+        _run(mode, args.workers, args.searches)
+
+
+if __name__ == "__main__":
+    main()
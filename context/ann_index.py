@@ -0,0 +1,118 @@
+import os
+import json
+import math
+from datetime import datetime
+from typing import Optional
+
+import numpy as np
+import faiss
+
+
+# -------------------------------
+# Config
+# -------------------------------
+# flat | ivf_flat | hnsw | ivf_pq | opq_ivf_pq
+INDEX_TYPE = os.getenv("INDEX_TYPE", "flat").lower()
+# Raw faiss index_factory string; overrides INDEX_TYPE when set
+INDEX_FACTORY = os.getenv("INDEX_FACTORY", "")
+# IVF lists; 0 picks ~4*sqrt(n), capped so every list gets enough training points
+INDEX_NLIST = int(os.getenv("INDEX_NLIST", "0"))
+INDEX_HNSW_M = int(os.getenv("INDEX_HNSW_M", "32"))
+INDEX_HNSW_EF_CONSTRUCTION = int(os.getenv("INDEX_HNSW_EF_CONSTRUCTION", "200"))
+# PQ sub-quantizers; must divide the embedding dimension (1536 for ada-002)
+INDEX_PQ_M = int(os.getenv("INDEX_PQ_M", "64"))
+INDEX_TRAIN_SAMPLE = int(os.getenv("INDEX_TRAIN_SAMPLE", "50000"))
+
+# Query-time knobs, read by backend/retriever.py
+FAISS_NPROBE = int(os.getenv("FAISS_NPROBE", "16"))
+FAISS_EF_SEARCH = int(os.getenv("FAISS_EF_SEARCH", "64"))
+
+# The flat index.faiss stays the source of truth (incremental builds start from
+# it); the ANN index is derived from it for every new version.
+ANN_FILE_NAME = "index.ann.faiss"
+ANN_META_FILE_NAME = "index.ann.json"
+
+# faiss warns below ~39 training points per IVF centroid
+_MIN_POINTS_PER_LIST = 39
+
+
+def default_nlist(n: int) -> int:
+    return max(1, min(int(4 * math.sqrt(n)), n // _MIN_POINTS_PER_LIST))
+
+
+def factory_string(index_type: str, dim: int, n: int, nlist: int = INDEX_NLIST) -> str:
+    nlist = nlist or default_nlist(n)
+    if index_type == "flat":
+        return "Flat"
+    if index_type == "ivf_flat":
+        return f"IVF{nlist},Flat"
+    if index_type == "hnsw":
+        return f"HNSW{INDEX_HNSW_M},Flat"
+    if index_type in ("ivf_pq", "opq_ivf_pq"):
+        if dim % INDEX_PQ_M:
+            raise ValueError(f"INDEX_PQ_M={INDEX_PQ_M} does not divide dimension {dim}")
+        pq = f"IVF{nlist},PQ{INDEX_PQ_M}x8"
+        return f"OPQ{INDEX_PQ_M},{pq}" if index_type == "opq_ivf_pq" else pq
+    raise ValueError(f"Unknown INDEX_TYPE: {index_type}")
+
+
+def sample_training_set(vectors: np.ndarray, max_points: int = INDEX_TRAIN_SAMPLE, seed: int = 0) -> np.ndarray:
+    if len(vectors) <= max_points:
+        return vectors
+    rows = np.random.default_rng(seed).choice(len(vectors), size=max_points, replace=False)
+    return vectors[np.sort(rows)]
+
+
+def build_ann_index(vectors: np.ndarray, factory: str, metric: int = faiss.METRIC_L2) -> faiss.Index:
+    """Train `factory` on a sample of `vectors`, then add all of them in their original order."""
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    index = faiss.index_factory(vectors.shape[1], factory, metric)
+    if isinstance(index, faiss.IndexHNSWFlat):
+        index.hnsw.efConstruction = INDEX_HNSW_EF_CONSTRUCTION
+    if not index.is_trained:
+        index.train(sample_training_set(vectors))
+    index.add(vectors)
+    return index
+
+
+def flat_vectors(index: faiss.Index) -> np.ndarray:
+    return index.reconstruct_n(0, index.ntotal)
+
+
+def write_ann_index(flat_index: faiss.Index, index_dir: str,
+                    index_type: str = INDEX_TYPE, factory: str = INDEX_FACTORY) -> Optional[str]:
+    """
+    Derive the configured ANN index from the flat one and save it next to it.
+    Row order is preserved, so LangChain's index_to_docstore_id still applies.
+    Returns the factory string used, or None when the flat index is all we need.
+    """
+    ann_path = os.path.join(index_dir, ANN_FILE_NAME)
+    meta_path = os.path.join(index_dir, ANN_META_FILE_NAME)
+    if not factory and index_type == "flat":
+        for path in (ann_path, meta_path):
+            if os.path.exists(path):
+                os.remove(path)
+        return None
+
+    factory = factory or factory_string(index_type, flat_index.d, flat_index.ntotal)
+    index = build_ann_index(flat_vectors(flat_index), factory, flat_index.metric_type)
+
+    tmp_path = ann_path + ".tmp"
+    faiss.write_index(index, tmp_path)
+    os.replace(tmp_path, ann_path)
+    with open(meta_path, "w", encoding="utf-8") as f:
+        json.dump({"factory": factory, "ntotal": index.ntotal, "dim": index.d,
+                   "built_at": datetime.now().isoformat()}, f)
+    return factory
+
+
+def tune_search(index: faiss.Index, nprobe: int = FAISS_NPROBE, ef_search: int = FAISS_EF_SEARCH) -> None:
+    """Apply query-time parameters to whichever of them the index understands."""
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        ivf.nprobe = nprobe
+        # MMR reconstructs candidate vectors by id, which IVF needs a direct map for
+        ivf.make_direct_map()
+    hnsw = getattr(faiss.downcast_index(index), "hnsw", None)
+    if hnsw is not None:
+        hnsw.efSearch = ef_search
@@ -0,0 +1,200 @@
+import os
+import time
+import random
+import asyncio
+import hashlib
+from typing import Dict, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from backend.embedding_cache import SQLiteVectorStore
+
+
+# -------------------------------
+# Config
+# -------------------------------
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "100"))
+EMBED_MAX_CONCURRENCY = int(os.getenv("EMBED_MAX_CONCURRENCY", "4"))
+# Tokens per minute the build may send to the embeddings API
+EMBED_TPM_BUDGET = int(os.getenv("EMBED_TPM_BUDGET", "1000000"))
+EMBED_MAX_RETRIES = int(os.getenv("EMBED_MAX_RETRIES", "6"))
+EMBED_BACKOFF_BASE = float(os.getenv("EMBED_BACKOFF_BASE", "1.0"))
+EMBED_CHECKPOINT_PATH = os.getenv(
+    "EMBED_CHECKPOINT_PATH",
+    os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "vectorstore", "embed_checkpoints.sqlite")),
+)
+# Checkpoints only need to outlive an interrupted build
+EMBED_CHECKPOINT_TTL = float(os.getenv("EMBED_CHECKPOINT_TTL", str(7 * 24 * 3600)))
+
+
+def estimate_tokens(text: str) -> int:
+    # ~4 characters per token for English text; close enough for rate budgeting
+    return max(1, len(text) // 4)
+
+
+def embedder_identity(embedder: Embeddings) -> str:
+    """Backend class, model and dimension: vectors are only interchangeable within one identity."""
+    model = getattr(embedder, "model", None) or getattr(embedder, "model_name", None) or ""
+    dim = getattr(embedder, "dimensions", None) or getattr(embedder, "dim", None) or ""
+    return f"{type(embedder).__name__}:{model}:{dim}"
+
+
+def _text_key(text: str, identity: str) -> str:
+    return hashlib.sha1(f"{identity}\x1f{text}".encode("utf-8")).hexdigest()
+
+
+class StubEmbeddings(Embeddings):
+    """
+    Offline embedder for benchmarks and dry runs: deterministic unit vectors
+    derived from a hash of the text, with optional simulated latency.
+    Its vectors are NOT comparable to a real model's.
+    """
+
+    def __init__(self, dim: int = 1536, latency: float = 0.0):
+        self.dim = dim
+        self.latency = latency
+
+    def _vector(self, text: str) -> List[float]:
+        seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+        v = np.random.default_rng(seed).standard_normal(self.dim).astype(np.float32)
+        return (v / np.linalg.norm(v)).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if self.latency:
+            time.sleep(self.latency)
+        return [self._vector(t) for t in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._vector(text)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return [self._vector(t) for t in texts]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return self._vector(text)
+
+
+class TokenBucket:
+    """Continuous-refill token bucket sized to a tokens-per-minute budget."""
+
+    def __init__(self, tokens_per_minute: int):
+        self.capacity = float(tokens_per_minute)
+        self.rate = tokens_per_minute / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, n: int) -> None:
+        n = min(float(n), self.capacity)
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= n:
+                    self.tokens -= n
+                    return
+                await asyncio.sleep((n - self.tokens) / self.rate)
+
+
+class EmbeddingPipeline:
+    """
+    Embeds chunks in request-sized batches with bounded concurrency, a
+    tokens-per-minute budget and exponential backoff on failures. Every
+    finished vector is checkpointed to SQLite keyed by the embedder's identity
+    and its chunk text, so re-running an interrupted build only embeds what
+    didn't finish, however the chunks end up grouped into batches the second
+    time, and never reuses vectors from a different backend or model.
+    """
+
+    def __init__(self, embedder: Embeddings, batch_size: int = EMBED_BATCH_SIZE,
+                 max_concurrency: int = EMBED_MAX_CONCURRENCY, tpm_budget: int = EMBED_TPM_BUDGET,
+                 max_retries: int = EMBED_MAX_RETRIES,
+                 checkpoint_path: Optional[str] = EMBED_CHECKPOINT_PATH, verbose: bool = True):
+        self.embedder = embedder
+        self.identity = embedder_identity(embedder)
+        self.batch_size = batch_size
+        self.max_concurrency = max_concurrency
+        self.tpm_budget = tpm_budget
+        self.max_retries = max_retries
+        self.verbose = verbose
+        self.checkpoints = SQLiteVectorStore(checkpoint_path, EMBED_CHECKPOINT_TTL) if checkpoint_path else None
+        # Semaphore and bucket belong to the event loop they were created on
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._bucket: Optional[TokenBucket] = None
+        self.reset_progress()
+
+    def _limits(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._slots = asyncio.Semaphore(self.max_concurrency)
+            self._bucket = TokenBucket(self.tpm_budget)
+        return self._slots, self._bucket
+
+    # ---- progress ----
+    def reset_progress(self) -> None:
+        self.progress = {"embedded": 0, "resumed": 0}
+        self._started = time.perf_counter()
+
+    def rate(self) -> float:
+        elapsed = time.perf_counter() - self._started
+        return self.progress["embedded"] / elapsed if elapsed else 0.0
+
+    def report(self) -> None:
+        if self.verbose:
+            elapsed = time.perf_counter() - self._started
+            print(f"✅ Embedding finished: {self.progress['embedded']} embedded, "
+                  f"{self.progress['resumed']} from checkpoints, {elapsed:.1f}s ({self.rate():.1f} chunks/s)")
+
+    def clear_checkpoints(self) -> None:
+        """Call once the index that used these vectors has been saved."""
+        if self.checkpoints:
+            self.checkpoints.clear()
+
+    # ---- embedding ----
+    async def _embed_with_retry(self, batch: List[str]) -> List[List[float]]:
+        for attempt in range(self.max_retries + 1):
+            try:
+                return await self.embedder.aembed_documents(batch)
+            except Exception as e:
+                if attempt == self.max_retries:
+                    raise
+                delay = EMBED_BACKOFF_BASE * (2 ** attempt) * (0.5 + random.random())
+                print(f"⏳ Embedding batch failed ({type(e).__name__}: {e}); retry {attempt + 1} in {delay:.1f}s")
+                await asyncio.sleep(delay)
+
+    async def aembed_batch(self, batch: List[str]) -> List[List[float]]:
+        """Embed one batch (at most `batch_size` texts), reusing checkpointed vectors."""
+        keys = [_text_key(t, self.identity) for t in batch]
+        found: Dict[str, List[float]] = self.checkpoints.get_many(keys) if self.checkpoints else {}
+        missing = [(k, t) for k, t in zip(keys, batch) if k not in found]
+        self.progress["resumed"] += len(batch) - len(missing)
+
+        if missing:
+            slots, bucket = self._limits()
+            async with slots:
+                await bucket.acquire(sum(estimate_tokens(t) for _, t in missing))
+                vectors = await self._embed_with_retry([t for _, t in missing])
+            new = {k: v for (k, _), v in zip(missing, vectors)}
+            if self.checkpoints:
+                self.checkpoints.set_many(new)
+            found.update(new)
+            self.progress["embedded"] += len(missing)
+            if self.verbose:
+                print(f"🧠 Embedded {self.progress['embedded']} chunks ({self.rate():.1f} chunks/s)")
+        return [found[k] for k in keys]
+
+    async def aembed(self, texts: List[str]) -> List[List[float]]:
+        self.reset_progress()
+        batches = [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+        results = await asyncio.gather(*(self.aembed_batch(b) for b in batches))
+        self.report()
+        return [v for batch in results for v in batch]
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        return asyncio.run(self.aembed(texts))
@@ -0,0 +1,73 @@
+import os
+import json
+import hashlib
+from datetime import datetime
+from typing import Dict, List, Optional
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def chunk_ids_for(url: str, page_hash: str, n_chunks: int) -> List[str]:
+    """
+    Stable vector ids for a page version. Including the content hash means a
+    changed page never reuses the ids of the version it replaces.
+    """
+    url_key = hashlib.sha1(url.encode("utf-8")).hexdigest()[:16]
+    return [f"{url_key}-{page_hash[:12]}-{i}" for i in range(n_chunks)]
+
+
+class IndexManifest:
+    """
+    Per-URL record of what is in the FAISS index:
+    {url: {"etag", "last_modified", "content_hash", "chunk_ids", "links", "indexed_at"}}.
+    Lets an incremental build skip unchanged pages and delete vectors of
+    changed or vanished ones.
+    """
+
+    FILE_NAME = "manifest.json"
+
+    def __init__(self, pages: Optional[Dict[str, dict]] = None):
+        self.pages: Dict[str, dict] = pages or {}
+
+    @classmethod
+    def load(cls, index_dir: str) -> "IndexManifest":
+        path = os.path.join(index_dir, cls.FILE_NAME)
+        if not os.path.exists(path):
+            return cls()
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(json.load(f).get("pages", {}))
+
+    def save(self, index_dir: str) -> None:
+        os.makedirs(index_dir, exist_ok=True)
+        path = os.path.join(index_dir, self.FILE_NAME)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": 1, "pages": self.pages}, f)
+        os.replace(tmp_path, path)  # never leave a half-written manifest behind
+
+    def known_pages(self) -> Dict[str, dict]:
+        """Validators and links in the shape `crawler.scraper.iter_crawl` expects."""
+        return {
+            url: {"etag": e.get("etag"), "last_modified": e.get("last_modified"), "links": e.get("links", [])}
+            for url, e in self.pages.items()
+        }
+
+    def record(self, url: str, *, headers: Dict[str, str], page_hash: str,
+               chunk_ids: List[str], links: List[str]) -> None:
+        self.pages[url] = {
+            "etag": headers.get("etag"),
+            "last_modified": headers.get("last-modified"),
+            "content_hash": page_hash,
+            "chunk_ids": chunk_ids,
+            "links": links,
+            "indexed_at": datetime.now().isoformat(),
+        }
+
+    def refresh_validators(self, url: str, headers: Dict[str, str], links: List[str]) -> None:
+        entry = self.pages[url]
+        entry["etag"] = headers.get("etag") or entry.get("etag")
+        entry["last_modified"] = headers.get("last-modified") or entry.get("last_modified")
+        if links:
+            entry["links"] = links
@@ -0,0 +1,239 @@
+import os
+import json
+import shutil
+import sqlite3
+import threading
+from datetime import datetime
+from collections.abc import Mapping
+from typing import Iterator, List, Optional, Tuple, Union
+
+import faiss
+from langchain_core.embeddings import Embeddings
+from langchain_community.vectorstores import FAISS
+from langchain_community.docstore.base import Docstore
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain.docstore.document import Document
+
+from context.ann_index import ANN_FILE_NAME, tune_search
+from context.lexical_index import build_lexical_index, has_lexical_index, lexical_search
+
+
+# -------------------------------
+# Versioned index root
+# -------------------------------
+# vectorstore/faiss_index/
+#   CURRENT             name of the live version, swapped atomically with os.replace
+#   versions/<version>/ one complete, never-modified index directory per build
+# A root without CURRENT is a pre-versioning index whose files sit in the root.
+CURRENT_FILE_NAME = "CURRENT"
+VERSIONS_DIR_NAME = "versions"
+INDEX_KEEP_VERSIONS = int(os.getenv("INDEX_KEEP_VERSIONS", "3"))
+
+
+def current_version(root: str) -> Optional[str]:
+    try:
+        with open(os.path.join(root, CURRENT_FILE_NAME), "r", encoding="utf-8") as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def current_index_dir(root: str) -> str:
+    version = current_version(root)
+    return os.path.join(root, VERSIONS_DIR_NAME, version) if version else root
+
+
+def new_version_dir(root: str) -> Tuple[str, str]:
+    version = datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+    path = os.path.join(root, VERSIONS_DIR_NAME, version)
+    os.makedirs(path)
+    return version, path
+
+
+def publish_version(root: str, version: str, keep: int = INDEX_KEEP_VERSIONS) -> None:
+    """
+    Point CURRENT at a fully written version. Readers see either the old or
+    the new name, never a partial file, and never a half-written index.
+    """
+    tmp_path = os.path.join(root, CURRENT_FILE_NAME + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(version)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, os.path.join(root, CURRENT_FILE_NAME))
+    _prune_versions(root, keep)
+
+
+def _prune_versions(root: str, keep: int) -> None:
+    # Older versions stay around briefly: workers that haven't swapped yet
+    # still read from them.
+    versions_dir = os.path.join(root, VERSIONS_DIR_NAME)
+    live = current_version(root)
+    for version in sorted(os.listdir(versions_dir))[:-keep or None]:
+        if version != live:
+            shutil.rmtree(os.path.join(versions_dir, version), ignore_errors=True)
+
+
+# -------------------------------
+# Layout of one index directory
+# -------------------------------
+# index.faiss       flat index (source of truth, written with faiss.write_index)
+# chunks.sqlite     chunk text + metadata, one row per FAISS position, plus a
+#                   BM25 (FTS5) index over the text (see lexical_index.py)
+# index.ann.faiss   optional ANN index derived from index.faiss (see ann_index.py)
+# index.pkl         legacy LangChain pickle, read only when chunks.sqlite is missing
+FLAT_FILE_NAME = "index.faiss"
+CHUNKS_FILE_NAME = "chunks.sqlite"
+LEGACY_PICKLE_NAME = "index.pkl"
+
+# Read-only mmap: worker processes share the index pages through the OS page
+# cache instead of each holding a private copy. IO_FLAG_MMAP_IFC (faiss >= 1.11)
+# also maps flat/PQ codes; older builds only map IVF inverted lists.
+MMAP_FLAGS = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP) | faiss.IO_FLAG_READ_ONLY
+
+
+def read_index_mmap(path: str) -> faiss.Index:
+    try:
+        index = faiss.read_index(path, MMAP_FLAGS)
+    except RuntimeError as e:
+        # Not every index type supports mapped reads in every faiss build
+        print(f"⚠️ mmap read of {path} failed ({e}) — loading it into memory")
+        index = faiss.read_index(path)
+    tune_search(index)
+    return index
+
+
+def write_chunk_store(vectorstore: FAISS, index_dir: str) -> None:
+    path = os.path.join(index_dir, CHUNKS_FILE_NAME)
+    tmp_path = path + ".tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    conn = sqlite3.connect(tmp_path)
+    try:
+        conn.execute("CREATE TABLE chunks (row INTEGER PRIMARY KEY, id TEXT NOT NULL, content TEXT NOT NULL,"
+                     " metadata TEXT NOT NULL)")
+        rows = []
+        for row, doc_id in vectorstore.index_to_docstore_id.items():
+            doc = vectorstore.docstore.search(doc_id)
+            rows.append((row, doc_id, doc.page_content, json.dumps(doc.metadata)))
+        conn.executemany("INSERT INTO chunks VALUES (?, ?, ?, ?)", rows)
+        build_lexical_index(conn)
+        conn.commit()
+    finally:
+        conn.close()
+    os.replace(tmp_path, path)
+
+
+def save_index(vectorstore: FAISS, index_dir: str) -> None:
+    """Write the flat index and chunk store; replaces LangChain's pickled save_local."""
+    os.makedirs(index_dir, exist_ok=True)
+    path = os.path.join(index_dir, FLAT_FILE_NAME)
+    faiss.write_index(vectorstore.index, path + ".tmp")
+    os.replace(path + ".tmp", path)
+    write_chunk_store(vectorstore, index_dir)
+    legacy = os.path.join(index_dir, LEGACY_PICKLE_NAME)
+    if os.path.exists(legacy):
+        os.remove(legacy)
+
+
+class SQLiteChunkStore(Docstore):
+    """
+    Read-only docstore over chunks.sqlite, addressed by FAISS row. Chunks are
+    fetched on demand, so a worker only holds the pages SQLite has cached.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self.has_lexical = has_lexical_index(self._conn())
+
+    def _conn(self) -> sqlite3.Connection:
+        # searches run on a thread pool and sqlite3 connections can't cross threads
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, check_same_thread=False)
+            self._local.conn = conn
+        return conn
+
+    def search(self, search: str) -> Union[Document, str]:
+        row = self._conn().execute(
+            "SELECT content, metadata FROM chunks WHERE row = ?", (int(search),)
+        ).fetchone()
+        if row is None:
+            return f"ID {search} not found."
+        return Document(page_content=row[0], metadata=json.loads(row[1]))
+
+    def __len__(self) -> int:
+        return self._conn().execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+
+    def lexical_search(self, query: str, k: int) -> List[Tuple[Document, float]]:
+        """BM25 top-k chunks with their scores; empty when the index has no FTS table."""
+        if not self.has_lexical:
+            return []
+        hits = lexical_search(self._conn(), query, k)
+        return [(self.search(row), score) for row, score in hits]
+
+
+class RowIdMap(Mapping):
+    """index_to_docstore_id for SQLiteChunkStore: FAISS row i is docstore id i."""
+
+    def __init__(self, n: int):
+        self._n = n
+
+    def __getitem__(self, row: int) -> int:
+        if not 0 <= row < self._n:
+            raise KeyError(row)
+        return row
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(range(self._n))
+
+    def __len__(self) -> int:
+        return self._n
+
+
+def _load_legacy(index_dir: str, embeddings: Embeddings) -> FAISS:
+    print(f"⚠️ {CHUNKS_FILE_NAME} missing in {index_dir} — loading the legacy pickle; rebuild to migrate")
+    return FAISS.load_local(index_dir, embeddings, allow_dangerous_deserialization=True)
+
+
+def load_for_serving(index_dir: str, embeddings: Embeddings, use_ann: bool = True) -> FAISS:
+    """
+    Memory-mapped, read-only vector store for the API. Uses the ANN index when
+    one was derived from this exact flat index (rows map to chunks by position).
+    """
+    chunks_path = os.path.join(index_dir, CHUNKS_FILE_NAME)
+    if not os.path.exists(chunks_path):
+        return _load_legacy(index_dir, embeddings)
+
+    store = SQLiteChunkStore(chunks_path)
+    n_chunks = len(store)
+    index: Optional[faiss.Index] = None
+    ann_path = os.path.join(index_dir, ANN_FILE_NAME)
+    if use_ann and os.path.exists(ann_path):
+        index = read_index_mmap(ann_path)
+        if index.ntotal != n_chunks:
+            print(f"⚠️ ANN index has {index.ntotal} vectors, chunk store {n_chunks} — using flat")
+            index = None
+    if index is None:
+        index = read_index_mmap(os.path.join(index_dir, FLAT_FILE_NAME))
+    return FAISS(embeddings, index, store, RowIdMap(n_chunks))
+
+
+def load_for_update(index_dir: str, embeddings: Embeddings) -> FAISS:
+    """Fully in-memory, writable vector store for incremental builds."""
+    chunks_path = os.path.join(index_dir, CHUNKS_FILE_NAME)
+    if not os.path.exists(chunks_path):
+        return _load_legacy(index_dir, embeddings)
+
+    index = faiss.read_index(os.path.join(index_dir, FLAT_FILE_NAME))
+    conn = sqlite3.connect(f"file:{chunks_path}?mode=ro", uri=True)
+    try:
+        rows = conn.execute("SELECT row, id, content, metadata FROM chunks ORDER BY row").fetchall()
+    finally:
+        conn.close()
+    docstore = InMemoryDocstore({
+        doc_id: Document(page_content=content, metadata=json.loads(metadata))
+        for _, doc_id, content, metadata in rows
+    })
+    return FAISS(embeddings, index, docstore, {row: doc_id for row, doc_id, _, _ in rows})
@@ -0,0 +1,63 @@
+import os
+import re
+import sqlite3
+from typing import List, Tuple
+
+
+# -------------------------------
+# Config
+# -------------------------------
+# BM25 runs on SQLite's FTS5 inverted index, stored in chunks.sqlite next to the
+# FAISS index. External-content mode indexes the chunk text without a second copy.
+FTS_TABLE = "chunks_fts"
+FTS_TOKENIZER = os.getenv("FTS_TOKENIZER", "porter unicode61 remove_diacritics 2")
+
+# Dropped from queries only; they match nearly every chunk and slow the OR query
+_STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "can", "do", "does", "for", "from", "how", "i",
+    "in", "is", "it", "me", "my", "of", "on", "or", "our", "the", "to", "we", "what", "which", "who",
+    "with", "you", "your",
+}
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def build_lexical_index(conn: sqlite3.Connection) -> bool:
+    """Create and fill the FTS5 index over `chunks`. Returns False if SQLite lacks FTS5."""
+    try:
+        conn.execute(
+            f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5("
+            f"content, content='chunks', content_rowid='row', tokenize='{FTS_TOKENIZER}')"
+        )
+    except sqlite3.OperationalError as e:
+        print(f"⚠️ SQLite FTS5 unavailable ({e}) — index built without BM25")
+        return False
+    conn.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES('rebuild')")
+    return True
+
+
+def has_lexical_index(conn: sqlite3.Connection) -> bool:
+    return conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (FTS_TABLE,)
+    ).fetchone() is not None
+
+
+def match_expression(query: str) -> str:
+    """
+    Free text -> FTS5 MATCH expression: every term quoted (so user input can't
+    inject FTS syntax) and OR-ed together, leaving BM25 to rank by term rarity.
+    """
+    terms = [t for t in _TOKEN_RE.findall(query.lower()) if t not in _STOPWORDS]
+    return " OR ".join(f'"{t}"' for t in dict.fromkeys(terms))
+
+
+def lexical_search(conn: sqlite3.Connection, query: str, k: int) -> List[Tuple[int, float]]:
+    """Top-k (row, score) by BM25; higher score is better."""
+    expression = match_expression(query)
+    if not expression:
+        return []
+    # FTS5's bm25() is "lower is better", so negate it
+    return conn.execute(
+        f"SELECT rowid, -bm25({FTS_TABLE}) FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH ?"
+        f" ORDER BY bm25({FTS_TABLE}) LIMIT ?",
+        (expression, k),
+    ).fetchall()
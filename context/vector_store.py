@@ -1,7 +1,8 @@
 import os
+import sys
 import asyncio
-import importlib.util
-from typing import Dict, List
+import argparse
+from typing import AsyncIterator, List, Optional, Set
 
 from dotenv import load_dotenv
 from langchain_community.embeddings import OpenAIEmbeddings
@@ -11,14 +12,19 @@ from langchain.text_splitter import RecursiveCharacterTextSplitter
 
 
 # -------------------------------
-# Dynamic imports for project layout
+# Project imports
 # -------------------------------
-# scraper.py (should expose: async def scrape_website_recursive(start_url, ...))
-scraper_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'crawler', 'scraper.py'))
-spec = importlib.util.spec_from_file_location("scraper", scraper_path)
-scraper = importlib.util.module_from_spec(spec)
-spec.loader.exec_module(scraper)
-scrape_website_recursive = getattr(scraper, "scrape_website_recursive")
+# Imported as a package module (not loaded from its file path) so the crawler,
+# the chat fallback and this build all share one crawler.browser_pool instance.
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from crawler.scraper import iter_crawl, PageFetch
+from crawler.browser_pool import browser_pool
+from context.index_manifest import IndexManifest, content_hash, chunk_ids_for
+from context.ann_index import write_ann_index
+from context.index_store import (
+    FLAT_FILE_NAME, save_index, load_for_update, current_index_dir, new_version_dir, publish_version,
+)
+from context.embedding_pipeline import EmbeddingPipeline, StubEmbeddings, EMBED_MAX_CONCURRENCY
 
 # chunker (optional if you have a custom one; we’ll use LangChain splitter here)
 # If you prefer your custom chunker, import and use it instead of RecursiveCharacterTextSplitter.
@@ -28,9 +34,20 @@ scrape_website_recursive = getattr(scraper, "scrape_website_recursive")
 # Config
 # -------------------------------
 load_dotenv()
+# Root of the versioned index (see context/index_store.py for the layout)
 INDEX_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "vectorstore", "faiss_index"))
-os.makedirs(os.path.dirname(INDEX_DIR), exist_ok=True)
-embedding_model = OpenAIEmbeddings()
+os.makedirs(INDEX_DIR, exist_ok=True)
+# "stub" swaps in a deterministic offline embedder for benchmarking the build;
+# its vectors are not comparable to OpenAI's, so never serve an index built with it.
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "openai").lower()
+embedding_model = StubEmbeddings(latency=0.05) if EMBEDDING_BACKEND == "stub" else OpenAIEmbeddings()
+embed_pipeline = EmbeddingPipeline(embedding_model)
+# Crawl limits. The crawl budget is per domain and shared by every seed on it,
+# so by default it scales with the seed count: each seed used to get its own
+# 300-page crawl. CRAWL_MAX_PAGES, if set, overrides it with a fixed cap.
+CRAWL_MAX_PAGES_PER_SEED = int(os.getenv("CRAWL_MAX_PAGES_PER_SEED", "300"))
+CRAWL_MAX_PAGES = int(os.getenv("CRAWL_MAX_PAGES", "0"))
+CRAWL_MAX_DEPTH = int(os.getenv("CRAWL_MAX_DEPTH", "5"))
 
 # default start URLs
 URLS = [
@@ -54,66 +71,233 @@ def load_extra_urls(file_name: str = "urls.txt") -> List[str]:
 
 
 # -------------------------------
-# Crawl one start URL (handles async scraper)
+# Build & Save FAISS Index
 # -------------------------------
-def crawl_start_url(start_url: str, max_pages: int = 300, max_depth: int = 5) -> Dict[str, str]:
-    """Runs async scraper even if we’re in a sync context."""
-    if asyncio.iscoroutinefunction(scrape_website_recursive):
-        return asyncio.run(scrape_website_recursive(start_url, max_pages=max_pages, max_depth=max_depth))
-    # If your scraper is synchronous (older version), call directly:
-    return scrape_website_recursive(start_url, max_pages=max_pages, max_depth=max_depth)
+# Chunking (use LC’s Recursive splitter for consistent granularity)
+splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
 
+# If an incremental crawl reaches fewer than this fraction of the pages in the
+# manifest it looks like an outage, so "vanished" pages are kept, not deleted.
+MIN_CRAWL_COVERAGE = 0.5
 
-# -------------------------------
-# Build & Save FAISS Index
-# -------------------------------
-def build_vectorstore(auto_urls: List[str]) -> None:
-    # Merge auto-crawl + urls.txt
-    extra_urls = load_extra_urls()
-    all_seeds = list(dict.fromkeys(auto_urls + extra_urls))  # de-dupe, keep order
+# Embedding batches allowed in flight or awaiting indexing before the build
+# stops pulling pages from the crawler.
+EMBED_MAX_PENDING_BATCHES = int(os.getenv("EMBED_MAX_PENDING_BATCHES", str(2 * EMBED_MAX_CONCURRENCY)))
 
-    print("\n🔎 Seeds to crawl (auto + urls.txt):")
-    for u in all_seeds:
-        print(f"   - {u}")
 
-    # Crawl
-    pages_collected: Dict[str, str] = {}
-    for seed in all_seeds:
-        print(f"\n🚀 Crawling seed: {seed}")
-        result = crawl_start_url(seed, max_pages=300, max_depth=5)
-        print(f"✅ Collected {len(result)} pages from {seed}")
-        pages_collected.update(result)  # later seeds overwrite duplicates
+def _chunk_page(page_url: str, page_text: str, page_hash: str):
+    chunks = splitter.split_text(page_text)
+    documents = [
+        Document(
+            page_content=chunk,
+            metadata={"source": page_url, "chunk_index": i}
+        )
+        for i, chunk in enumerate(chunks)
+    ]
+    return documents, chunk_ids_for(page_url, page_hash, len(documents))
 
-    print(f"\n🧾 Total unique pages collected: {len(pages_collected)}")
 
-    if not pages_collected:
-        print("⚠️ No pages collected — aborting index build.")
-        return
+class StreamingIndexer:
+    """
+    Takes chunks as pages arrive, embeds them in batches while the crawl keeps
+    going, and adds each finished batch straight into the FAISS index. Only the
+    current partial batch and at most EMBED_MAX_PENDING_BATCHES in-flight
+    batches are held in memory; past that `add` blocks, which stops the build
+    from pulling pages and so pauses the crawl.
+    """
+
+    def __init__(self, vectorstore: Optional[FAISS] = None):
+        self.vectorstore = vectorstore
+        self.added = 0
+        self._docs: List[Document] = []
+        self._ids: List[str] = []
+        self._pending = asyncio.Semaphore(EMBED_MAX_PENDING_BATCHES)
+        self._tasks: Set[asyncio.Task] = set()
+        self._error: Optional[BaseException] = None
 
-    # Chunking (use LC’s Recursive splitter for consistent granularity)
-    splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
-    documents: List[Document] = []
-    for page_url, page_text in pages_collected.items():
-        if not page_text:
+    async def add(self, documents: List[Document], ids: List[str]) -> None:
+        if self._error:
+            raise self._error
+        self._docs.extend(documents)
+        self._ids.extend(ids)
+        while len(self._docs) >= embed_pipeline.batch_size:
+            await self._launch(embed_pipeline.batch_size)
+
+    async def _launch(self, n: int) -> None:
+        docs, ids = self._docs[:n], self._ids[:n]
+        del self._docs[:n], self._ids[:n]
+        await self._pending.acquire()
+        task = asyncio.create_task(self._embed_and_index(docs, ids))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        # Released on completion of any kind, including a task cancelled
+        # before its body ever ran (where a `finally` inside it never executes)
+        task.add_done_callback(lambda _: self._pending.release())
+
+    async def _embed_and_index(self, docs: List[Document], ids: List[str]) -> None:
+        try:
+            texts = [d.page_content for d in docs]
+            pairs = list(zip(texts, await embed_pipeline.aembed_batch(texts)))
+            metadatas = [d.metadata for d in docs]
+            if self.vectorstore is None:
+                self.vectorstore = FAISS.from_embeddings(pairs, embedding_model, metadatas=metadatas, ids=ids)
+            else:
+                self.vectorstore.add_embeddings(pairs, metadatas=metadatas, ids=ids)
+            self.added += len(ids)
+        except BaseException as e:
+            self._error = self._error or e
+            raise
+
+    async def finish(self) -> Optional[FAISS]:
+        if self._docs:
+            await self._launch(len(self._docs))
+        await asyncio.gather(*self._tasks)  # re-raises the first failed batch
+        if self._error:
+            raise self._error
+        embed_pipeline.report()
+        return self.vectorstore
+
+
+def _publish(vectorstore: FAISS, manifest: IndexManifest) -> str:
+    """
+    Write a complete new index version, then flip CURRENT to it. Running API
+    workers pick it up on their next reload; the live version is never modified.
+    """
+    version, version_dir = new_version_dir(INDEX_DIR)
+    save_index(vectorstore, version_dir)
+    factory = write_ann_index(vectorstore.index, version_dir)
+    if factory:
+        print(f"🗂️ ANN index ({factory}) saved alongside the flat index")
+    manifest.save(version_dir)
+    publish_version(INDEX_DIR, version)
+    embed_pipeline.clear_checkpoints()
+    return version_dir
+
+
+def _crawl(seeds: List[str], manifest: IndexManifest) -> AsyncIterator[PageFetch]:
+    max_pages = CRAWL_MAX_PAGES or CRAWL_MAX_PAGES_PER_SEED * len(seeds)
+    print(f"🕸️ Crawl budget: {max_pages} pages per domain, depth {CRAWL_MAX_DEPTH}")
+    # Incremental builds send the manifest's validators as conditional GETs
+    return iter_crawl(seeds, max_pages=max_pages, max_depth=CRAWL_MAX_DEPTH, known_pages=manifest.known_pages())
+
+
+async def _full_build(pages: AsyncIterator[PageFetch]) -> None:
+    manifest = IndexManifest()
+    indexer = StreamingIndexer()
+    embed_pipeline.reset_progress()
+    n_pages = 0
+    async for page in pages:
+        n_pages += 1
+        if not page.text.strip():
             continue
-        chunks = splitter.split_text(page_text)
-        for i, chunk in enumerate(chunks):
-            documents.append(
-                Document(
-                    page_content=chunk,
-                    metadata={"source": page_url, "chunk_index": i}
-                )
-            )
-
-    if not documents:
+        page_hash = content_hash(page.text)
+        docs, doc_ids = _chunk_page(page.url, page.text, page_hash)
+        manifest.record(page.url, headers=page.headers, page_hash=page_hash, chunk_ids=doc_ids, links=page.links)
+        await indexer.add(docs, doc_ids)
+
+    vectorstore = await indexer.finish()
+    print(f"\n🧾 Total unique pages collected: {n_pages}")
+    if vectorstore is None:
         print("⚠️ No chunks produced — aborting index build.")
         return
 
-    print(f"📦 Prepared {len(documents)} chunks for embedding.")
-    vectorstore = FAISS.from_documents(documents, embedding_model)
-    vectorstore.save_local(INDEX_DIR)
-    print(f"✅ FAISS index saved to: {INDEX_DIR}")
+    version_dir = _publish(vectorstore, manifest)
+    print(f"✅ FAISS index saved to: {version_dir} ({indexer.added} vectors)")
+
+
+async def _incremental_build(pages: AsyncIterator[PageFetch], manifest: IndexManifest) -> None:
+    counts = {"unchanged": 0, "changed": 0, "new": 0, "removed": 0}
+    live_dir = current_index_dir(INDEX_DIR)
+    vectorstore = load_for_update(live_dir, embedding_model)
+    existing = set(vectorstore.index_to_docstore_id.values())
+    indexer = StreamingIndexer(vectorstore)
+    embed_pipeline.reset_progress()
+    n_deleted = 0
+    seen = set()
+
+    def drop(ids: List[str]) -> None:
+        nonlocal n_deleted
+        ids = [i for i in ids if i in existing]
+        if ids:
+            vectorstore.delete(ids)
+            existing.difference_update(ids)
+            n_deleted += len(ids)
+
+    async for page in pages:
+        seen.add(page.url)
+        entry = manifest.pages.get(page.url)
+        if entry and (page.not_modified or content_hash(page.text) == entry["content_hash"]):
+            manifest.refresh_validators(page.url, page.headers, page.links)
+            counts["unchanged"] += 1
+            continue
+        if not page.text.strip():
+            continue
+
+        page_hash = content_hash(page.text)
+        docs, doc_ids = _chunk_page(page.url, page.text, page_hash)
+        if entry:
+            drop(entry["chunk_ids"])
+            counts["changed"] += 1
+        else:
+            counts["new"] += 1
+        manifest.record(page.url, headers=page.headers, page_hash=page_hash, chunk_ids=doc_ids, links=page.links)
+        await indexer.add(docs, doc_ids)
+
+    await indexer.finish()
+    print(f"\n🧾 Total unique pages collected: {len(seen)}")
+
+    vanished = [url for url in manifest.pages if url not in seen]
+    if vanished and len(seen) < MIN_CRAWL_COVERAGE * len(manifest.pages):
+        print(f"⚠️ Crawl reached only {len(seen)}/{len(manifest.pages)} known pages — "
+              f"keeping {len(vanished)} unseen pages in the index.")
+    else:
+        for url in vanished:
+            drop(manifest.pages.pop(url)["chunk_ids"])
+        counts["removed"] = len(vanished)
+
+    print(f"🧮 Incremental diff: {counts}")
+    if not indexer.added and not n_deleted:
+        # Published versions are immutable, so refreshed validators aren't saved;
+        # the next run just re-checks those pages by content hash
+        print("✅ Index already up to date.")
+        return
+
+    version_dir = _publish(vectorstore, manifest)
+    print(f"✅ FAISS index updated: +{indexer.added} / -{n_deleted} vectors, saved to {version_dir}")
+
+
+def build_vectorstore(auto_urls: List[str], incremental: bool = False) -> None:
+    # Merge auto-crawl + urls.txt
+    extra_urls = load_extra_urls()
+    all_seeds = list(dict.fromkeys(auto_urls + extra_urls))  # de-dupe, keep order
+
+    print("\n🔎 Seeds to crawl (auto + urls.txt):")
+    for u in all_seeds:
+        print(f"   - {u}")
+
+    live_dir = current_index_dir(INDEX_DIR)
+    manifest = IndexManifest.load(live_dir) if incremental else IndexManifest()
+    if incremental and not (manifest.pages and os.path.exists(os.path.join(live_dir, FLAT_FILE_NAME))):
+        print("⚠️ No existing index/manifest — running a full build instead.")
+        incremental = False
+
+    # Crawl all seeds through one shared frontier (they mostly share a domain,
+    # so crawling them one by one re-fetched the same pages for every seed).
+    # Pages are chunked and embedded as they arrive rather than after the crawl.
+    print(f"\n🚀 Crawling {len(all_seeds)} seeds")
+    pages = _crawl(all_seeds, manifest)
+    if incremental:
+        asyncio.run(_incremental_build(pages, manifest))
+    else:
+        asyncio.run(_full_build(pages))
 
 
 if __name__ == "__main__":
-    build_vectorstore(URLS)
+    parser = argparse.ArgumentParser(description="Crawl the site and build the FAISS index.")
+    parser.add_argument("--incremental", action="store_true",
+                        help="only re-embed new/changed pages and drop vanished ones")
+    args = parser.parse_args()
+    try:
+        build_vectorstore(URLS, incremental=args.incremental)
+    finally:
+        browser_pool.close()
@@ -0,0 +1,168 @@
+import os
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from playwright.async_api import async_playwright, Error as PlaywrightError
+
+
+# -------------------------------
+# Config
+# -------------------------------
+# Max pages rendering at once across the whole process
+BROWSER_POOL_SIZE = int(os.getenv("BROWSER_POOL_SIZE", "4"))
+BROWSER_HEADLESS = os.getenv("BROWSER_HEADLESS", "true").lower() == "true"
+# Recycle a page after this many navigations to cap memory growth
+BROWSER_PAGE_MAX_USES = int(os.getenv("BROWSER_PAGE_MAX_USES", "50"))
+
+PageTask = Callable[[Any], Awaitable[Any]]
+
+
+class BrowserPool:
+    """
+    One long-lived headless Chromium shared by every scraper in the process.
+
+    Playwright objects are bound to the event loop that created them, so the
+    pool runs its own loop on a daemon thread. Async callers (any loop) and sync
+    callers (Streamlit, the chat fallback) both submit work to that loop, which
+    lets the crawler, `scrape_url` and the index build share one browser.
+
+    Pages are reused between tasks, concurrency is capped at `size`, and if
+    Chromium crashes or disconnects it is relaunched on the next task.
+    """
+
+    def __init__(self, size: int = BROWSER_POOL_SIZE, headless: bool = BROWSER_HEADLESS,
+                 page_max_uses: int = BROWSER_PAGE_MAX_USES):
+        self.size = size
+        self.headless = headless
+        self.page_max_uses = page_max_uses
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self._playwright = None
+        self._browser = None
+        self._context = None
+        self._idle_pages: List[Any] = []
+        self._page_uses: Dict[int, int] = {}
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._launch_lock: Optional[asyncio.Lock] = None
+        self._closing = False
+        self.stats = {"launches": 0, "crashes": 0, "tasks": 0, "pages_created": 0}
+
+    # ---- loop management ----
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        if self._loop is None:
+            with self._start_lock:
+                if self._loop is None:
+                    loop = asyncio.new_event_loop()
+                    self._thread = threading.Thread(target=loop.run_forever, name="browser-pool", daemon=True)
+                    self._thread.start()
+                    self._loop = loop
+        return self._loop
+
+    # ---- browser lifecycle (runs on the pool loop) ----
+    def _on_disconnected(self, _browser) -> None:
+        if not self._closing:
+            self.stats["crashes"] += 1
+        self._browser = None
+        self._context = None
+        self._idle_pages.clear()
+        self._page_uses.clear()
+
+    async def _ensure_browser(self) -> None:
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.size)
+            self._launch_lock = asyncio.Lock()
+        async with self._launch_lock:
+            if self._browser is not None and self._browser.is_connected():
+                return
+            if self._playwright is None:
+                self._playwright = await async_playwright().start()
+            self._browser = await self._playwright.chromium.launch(headless=self.headless)
+            self._browser.on("disconnected", self._on_disconnected)
+            self._context = await self._browser.new_context()
+            self._idle_pages.clear()
+            self._page_uses.clear()
+            self.stats["launches"] += 1
+            print(f"🧭 Browser pool launched Chromium (size={self.size})")
+
+    async def _checkout_page(self):
+        while self._idle_pages:
+            page = self._idle_pages.pop()
+            if not page.is_closed():
+                return page
+        page = await self._context.new_page()
+        self.stats["pages_created"] += 1
+        return page
+
+    async def _checkin_page(self, page, healthy: bool) -> None:
+        if page.is_closed() or self._browser is None:
+            return
+        uses = self._page_uses.get(id(page), 0) + 1
+        if not healthy or uses >= self.page_max_uses:
+            self._page_uses.pop(id(page), None)
+            try:
+                await page.close()
+            except PlaywrightError:
+                pass
+            return
+        self._page_uses[id(page)] = uses
+        try:
+            # Drop the previous document so it doesn't keep running scripts
+            await page.goto("about:blank")
+        except PlaywrightError:
+            self._page_uses.pop(id(page), None)
+            return
+        self._idle_pages.append(page)
+
+    async def _run_task(self, task: PageTask, retries: int = 1):
+        await self._ensure_browser()
+        async with self._slots:
+            for attempt in range(retries + 1):
+                await self._ensure_browser()
+                page = await self._checkout_page()
+                healthy = True
+                try:
+                    self.stats["tasks"] += 1
+                    return await task(page)
+                except PlaywrightError:
+                    healthy = False
+                    # Navigation errors are the caller's problem; a dead browser is ours
+                    if attempt < retries and (self._browser is None or not self._browser.is_connected()):
+                        continue
+                    raise
+                finally:
+                    await self._checkin_page(page, healthy)
+
+    # ---- public API ----
+    async def run(self, task: PageTask):
+        """Run `await task(page)` on a pooled page; awaitable from any event loop."""
+        future = asyncio.run_coroutine_threadsafe(self._run_task(task), self._ensure_loop())
+        return await asyncio.wrap_future(future)
+
+    def run_sync(self, task: PageTask, timeout: Optional[float] = None):
+        """Blocking variant of `run()` for sync code."""
+        future = asyncio.run_coroutine_threadsafe(self._run_task(task), self._ensure_loop())
+        return future.result(timeout)
+
+    async def _shutdown(self) -> None:
+        self._closing = True
+        if self._browser is not None and self._browser.is_connected():
+            await self._browser.close()
+        if self._playwright is not None:
+            await self._playwright.stop()
+        self._browser = self._context = self._playwright = None
+        self._idle_pages.clear()
+        self._closing = False
+
+    def close(self) -> None:
+        if self._loop is None:
+            return
+        asyncio.run_coroutine_threadsafe(self._shutdown(), self._loop).result(30)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=5)
+        self._loop = self._thread = None
+        self._slots = self._launch_lock = None
+
+
+browser_pool = BrowserPool()
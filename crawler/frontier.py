@@ -0,0 +1,157 @@
+import os
+import time
+import asyncio
+from typing import Dict, Optional, Set, Tuple
+from urllib.parse import urlparse, urlunparse, parse_qsl, urlencode
+from urllib.robotparser import RobotFileParser
+
+from crawler.http_fetcher import HttpFetcher, CRAWL_USER_AGENT
+
+
+# -------------------------------
+# Config
+# -------------------------------
+CRAWL_CONCURRENCY = int(os.getenv("CRAWL_CONCURRENCY", "4"))
+# Minimum seconds between two requests to the same host
+CRAWL_HOST_DELAY = float(os.getenv("CRAWL_HOST_DELAY", "0.5"))
+CRAWL_PER_HOST_CONCURRENCY = int(os.getenv("CRAWL_PER_HOST_CONCURRENCY", "2"))
+CRAWL_RESPECT_ROBOTS = os.getenv("CRAWL_RESPECT_ROBOTS", "true").lower() == "true"
+# A slow robots.txt holds up every URL on its host, so give up on it quickly
+CRAWL_ROBOTS_TIMEOUT = float(os.getenv("CRAWL_ROBOTS_TIMEOUT", "10"))
+
+# Query parameters that never change page content
+_TRACKING_PARAMS = {"fbclid", "gclid", "msclkid", "mc_cid", "mc_eid", "ref", "_ga"}
+
+
+def normalize_url(url: str) -> str:
+    """
+    Canonical form used for de-duplication: lowercase scheme/host, no default
+    port, no fragment, no trailing slash (except the root), tracking params
+    removed and the rest sorted.
+    """
+    parts = urlparse(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    if parts.port and not ((scheme == "http" and parts.port == 80) or (scheme == "https" and parts.port == 443)):
+        host = f"{host}:{parts.port}"
+
+    path = parts.path or "/"
+    if len(path) > 1:
+        path = path.rstrip("/")
+
+    query = urlencode(sorted(
+        (k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+        if not k.lower().startswith("utm_") and k.lower() not in _TRACKING_PARAMS
+    ))
+    return urlunparse((scheme, host, path, "", query, ""))
+
+
+class CrawlFrontier:
+    """
+    FIFO of (url, depth) with O(1) dequeue (asyncio.Queue is deque-backed) and
+    de-duplication at enqueue time, so each normalized URL is queued at most once.
+    """
+
+    def __init__(self):
+        self.queue: "asyncio.Queue[Tuple[str, int]]" = asyncio.Queue()
+        self.seen: Set[str] = set()
+
+    def push(self, url: str, depth: int) -> bool:
+        key = normalize_url(url)
+        if key in self.seen:
+            return False
+        self.seen.add(key)
+        self.queue.put_nowait((key, depth))
+        return True
+
+    def __len__(self) -> int:
+        return self.queue.qsize()
+
+
+class RobotsCache:
+    """
+    Fetches and caches robots.txt per host; unreachable robots.txt allows
+    everything. Pass the crawl's HttpFetcher to reuse its pooled connections
+    (and User-Agent); otherwise the cache opens its own, closed by aclose().
+    """
+
+    def __init__(self, http: Optional[HttpFetcher] = None, user_agent: str = CRAWL_USER_AGENT,
+                 enabled: bool = CRAWL_RESPECT_ROBOTS, timeout: float = CRAWL_ROBOTS_TIMEOUT):
+        self.user_agent = user_agent
+        self.enabled = enabled
+        self.timeout = timeout
+        self._http = http
+        self._owns_http = http is None
+        self._parsers: Dict[str, Optional[RobotFileParser]] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+
+    async def _fetch(self, robots_url: str) -> RobotFileParser:
+        if self._http is None:
+            self._http = HttpFetcher()
+        response = await self._http.get_raw(robots_url, timeout=self.timeout)
+        parser = RobotFileParser(robots_url)
+        # Same status handling as RobotFileParser.read()
+        if response.status_code in (401, 403):
+            parser.disallow_all = True
+        elif 400 <= response.status_code < 500:
+            parser.allow_all = True
+        else:
+            response.raise_for_status()
+            parser.parse(response.text.splitlines())
+        return parser
+
+    async def _parser_for(self, url: str) -> Optional[RobotFileParser]:
+        parts = urlparse(url)
+        origin = f"{parts.scheme}://{parts.netloc}"
+        if origin in self._parsers:
+            return self._parsers[origin]
+        async with self._locks.setdefault(origin, asyncio.Lock()):
+            if origin not in self._parsers:
+                try:
+                    parser = await self._fetch(f"{origin}/robots.txt")
+                except Exception as e:
+                    print(f"⚠️ robots.txt unavailable for {origin}: {e}")
+                    parser = None
+                self._parsers[origin] = parser
+        return self._parsers[origin]
+
+    async def allowed(self, url: str) -> bool:
+        if not self.enabled:
+            return True
+        parser = await self._parser_for(url)
+        return parser is None or parser.can_fetch(self.user_agent, url)
+
+    async def crawl_delay(self, url: str) -> Optional[float]:
+        if not self.enabled:
+            return None
+        parser = await self._parser_for(url)
+        delay = parser.crawl_delay(self.user_agent) if parser else None
+        return float(delay) if delay is not None else None
+
+    async def aclose(self) -> None:
+        if self._owns_http and self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+
+class HostRateLimiter:
+    """Per-host politeness: bounded concurrency plus a minimum gap between request starts."""
+
+    def __init__(self, delay: float = CRAWL_HOST_DELAY, per_host: int = CRAWL_PER_HOST_CONCURRENCY):
+        self.delay = delay
+        self.per_host = per_host
+        self._slots: Dict[str, asyncio.Semaphore] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._next_start: Dict[str, float] = {}
+
+    def host_slot(self, host: str) -> asyncio.Semaphore:
+        return self._slots.setdefault(host, asyncio.Semaphore(self.per_host))
+
+    async def wait_turn(self, host: str, delay: Optional[float] = None) -> None:
+        gap = max(self.delay, delay or 0.0)
+        async with self._locks.setdefault(host, asyncio.Lock()):
+            now = time.monotonic()
+            start_at = max(now, self._next_start.get(host, 0.0))
+            self._next_start[host] = start_at + gap
+        if start_at > now:
+            await asyncio.sleep(start_at - now)
@@ -0,0 +1,154 @@
+import os
+import re
+import time
+import importlib.util
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+import httpx
+
+
+# -------------------------------
+# Config
+# -------------------------------
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "15"))
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "20"))
+# Sent on every crawler request and matched against robots.txt groups; robots
+# matching uses the product token before the first "/", so keep it first
+CRAWL_USER_AGENT = os.getenv(
+    "CRAWL_USER_AGENT",
+    "ditstek-chatbot-crawler/1.0 (+https://www.ditstek.com/)",
+)
+# Pages whose static HTML yields less visible text than this are re-rendered in Chromium
+HTTP_MIN_TEXT_CHARS = int(os.getenv("HTTP_MIN_TEXT_CHARS", "300"))
+# Comma-separated regexes of URLs that always need the browser
+BROWSER_ONLY_URL_PATTERNS = [
+    re.compile(p.strip()) for p in os.getenv("BROWSER_ONLY_URL_PATTERNS", "").split(",") if p.strip()
+]
+
+# lxml is several times faster than html.parser when it's installed
+HTML_PARSER = "lxml" if importlib.util.find_spec("lxml") else "html.parser"
+
+# Markers of client-rendered apps whose initial HTML is an empty shell
+_SPA_MARKERS = [
+    re.compile(r'<div[^>]+id=["\'](root|app|__next|__nuxt)["\'][^>]*>\s*</div>', re.I),
+    re.compile(r"window\.__NUXT__|ng-version=|data-server-rendered=\"false\"", re.I),
+    re.compile(r"<noscript>[^<]*(enable|requires?) javascript", re.I),
+]
+
+
+@dataclass
+class HttpResponse:
+    url: str
+    final_url: str
+    status: int
+    headers: Dict[str, str]
+    html: str
+    elapsed: float
+    not_modified: bool = False
+
+
+def needs_browser(url: str, html: str, text: str) -> Optional[str]:
+    """Return why a statically fetched page must be rendered, or None if it's usable."""
+    if any(p.search(url) for p in BROWSER_ONLY_URL_PATTERNS):
+        return "url_rule"
+    if len(text) < HTTP_MIN_TEXT_CHARS:
+        return "empty_body"
+    if any(p.search(html) for p in _SPA_MARKERS):
+        return "spa_marker"
+    return None
+
+
+class HttpFetcher:
+    """
+    Pooled keep-alive HTTP client for static pages. Responses are requested
+    compressed, and callers pass the ETag/Last-Modified validators from the
+    crawl manifest so re-fetches of unchanged pages come back as cheap 304s.
+    Nothing is kept per URL, so memory stays flat however big the site is.
+    """
+
+    def __init__(self, timeout: float = HTTP_TIMEOUT, max_connections: int = HTTP_MAX_CONNECTIONS):
+        self._client: Optional[httpx.AsyncClient] = None
+        self._timeout = timeout
+        self._limits = httpx.Limits(max_connections=max_connections,
+                                    max_keepalive_connections=max_connections)
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=self._timeout,
+                limits=self._limits,
+                follow_redirects=True,
+                headers={"User-Agent": CRAWL_USER_AGENT, "Accept": "text/html,application/xhtml+xml"},
+            )
+        return self._client
+
+    async def get_raw(self, url: str, timeout: Optional[float] = None) -> httpx.Response:
+        """Plain GET on the pooled client, any content type and status (e.g. robots.txt)."""
+        return await self._get_client().get(url, headers={"Accept": "*/*"},
+                                            timeout=timeout if timeout is not None else self._timeout)
+
+    async def get(self, url: str, etag: Optional[str] = None,
+                  last_modified: Optional[str] = None) -> Optional[HttpResponse]:
+        """
+        Fetch `url`, conditionally if validators are given. Returns None for
+        non-HTML responses; a 304 comes back with empty html and
+        `not_modified` set, as the caller already has the page.
+        """
+        headers = {}
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+
+        started = time.perf_counter()
+        response = await self._get_client().get(url, headers=headers)
+        elapsed = time.perf_counter() - started
+
+        if response.status_code == 304:
+            return HttpResponse(url, str(response.url), 304, dict(response.headers), "", elapsed,
+                                not_modified=True)
+
+        response.raise_for_status()
+        if "html" not in response.headers.get("content-type", "html"):
+            return None
+
+        return HttpResponse(url, str(response.url), response.status_code,
+                            dict(response.headers), response.text, elapsed)
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+@dataclass
+class TierStats:
+    pages: int = 0
+    seconds: float = 0.0
+    not_modified: int = 0
+    fallback_reasons: Dict[str, int] = field(default_factory=dict)
+    # Responses dropped without rendering (non-HTML content, 4xx)
+    skipped: Dict[str, int] = field(default_factory=dict)
+
+    def as_dict(self) -> dict:
+        return {"pages": self.pages, "seconds": round(self.seconds, 2),
+                "not_modified": self.not_modified, "fallback_reasons": dict(self.fallback_reasons),
+                "skipped": dict(self.skipped)}
+
+
+def format_tier_report(stats: Dict[str, TierStats]) -> List[str]:
+    lines = []
+    for tier, s in stats.items():
+        avg = s.seconds / s.pages if s.pages else 0.0
+        line = f"   {tier:<8} {s.pages:>5} pages  {s.seconds:8.1f}s total  {avg:5.2f}s/page"
+        if s.not_modified:
+            line += f"  ({s.not_modified} not modified)"
+        if s.fallback_reasons:
+            reasons = ", ".join(f"{k}={v}" for k, v in sorted(s.fallback_reasons.items()))
+            line += f"  (sent to browser: {reasons})"
+        if s.skipped:
+            skipped = ", ".join(f"{k}={v}" for k, v in sorted(s.skipped.items()))
+            line += f"  (skipped: {skipped})"
+        lines.append(line)
+    return lines
@@ -1,106 +1,362 @@
 import asyncio
 import os
-from playwright.async_api import async_playwright
+import sys
+import time
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Dict, List, Optional
+import httpx
 from bs4 import BeautifulSoup
-from urllib.parse import urlparse
-from playwright.sync_api import sync_playwright
+from urllib.parse import urlparse, urljoin
+from playwright.async_api import Error as PlaywrightError
 
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from crawler.browser_pool import browser_pool
+from crawler.frontier import CrawlFrontier, RobotsCache, HostRateLimiter, CRAWL_CONCURRENCY
+from crawler.http_fetcher import (
+    HttpFetcher, HttpResponse, TierStats, needs_browser, format_tier_report, HTML_PARSER,
+)
+
+
+# -------------------------------
+# Page readiness
+# -------------------------------
+# How to decide a rendered page is "ready" instead of sleeping a fixed 5 s:
+#   dom_stable - no DOM mutations for PAGE_DOM_STABLE_MS (capped by PAGE_MAX_WAIT_MS)
+#   selector   - PAGE_READY_SELECTOR is present (capped by PAGE_MAX_WAIT_MS)
+#   max_wait   - network idle, or PAGE_MAX_WAIT_MS, whichever comes first
+PAGE_READINESS = os.getenv("PAGE_READINESS", "dom_stable")
+PAGE_READY_SELECTOR = os.getenv("PAGE_READY_SELECTOR", "")
+PAGE_MAX_WAIT_MS = int(os.getenv("PAGE_MAX_WAIT_MS", "5000"))
+PAGE_DOM_STABLE_MS = int(os.getenv("PAGE_DOM_STABLE_MS", "500"))
+PAGE_NAV_TIMEOUT_MS = int(os.getenv("PAGE_NAV_TIMEOUT_MS", "30000"))
+# Try a plain HTTP fetch before rendering in Chromium
+CRAWL_HTTP_TIER = os.getenv("CRAWL_HTTP_TIER", "true").lower() == "true"
+
+_DOM_STABLE_JS = """
+([quietMs, maxMs]) => new Promise(resolve => {
+    let timer = setTimeout(done, quietMs);
+    const cap = setTimeout(done, maxMs);
+    const observer = new MutationObserver(() => {
+        clearTimeout(timer);
+        timer = setTimeout(done, quietMs);
+    });
+    observer.observe(document, {childList: true, subtree: true, characterData: true});
+    function done() {
+        observer.disconnect();
+        clearTimeout(timer);
+        clearTimeout(cap);
+        resolve(true);
+    }
+})
+"""
+
+
+@dataclass
+class Readiness:
+    strategy: str = PAGE_READINESS
+    selector: str = PAGE_READY_SELECTOR
+    max_wait_ms: int = PAGE_MAX_WAIT_MS
+    stable_ms: int = PAGE_DOM_STABLE_MS
+
+
+@dataclass
+class PageFetch:
+    """Everything one navigation yields."""
+    url: str
+    final_url: str
+    status: Optional[int]
+    headers: Dict[str, str]
+    html: str
+    text: str
+    links: List[str] = field(default_factory=list)
+    elapsed: float = 0.0
+    tier: str = "browser"
+    not_modified: bool = False
+
+
+async def _wait_until_ready(page, readiness: Readiness) -> None:
+    try:
+        if readiness.strategy == "selector" and readiness.selector:
+            await page.wait_for_selector(readiness.selector, timeout=readiness.max_wait_ms)
+        elif readiness.strategy == "max_wait":
+            await page.wait_for_load_state("networkidle", timeout=readiness.max_wait_ms)
+        else:
+            await page.evaluate(_DOM_STABLE_JS, [readiness.stable_ms, readiness.max_wait_ms])
+    except PlaywrightError:
+        # Readiness is best effort (timeouts, client-side redirects mid-wait):
+        # take whatever rendered within the budget
+        pass
+
+
+async def _fetch_with_page(page, url: str, readiness: Readiness) -> PageFetch:
+    started = time.perf_counter()
+    response = await page.goto(url, timeout=PAGE_NAV_TIMEOUT_MS, wait_until="domcontentloaded")
+    await _wait_until_ready(page, readiness)
+
+    html = await page.content()
+    links = await page.eval_on_selector_all("a[href]", "els => els.map(el => el.href)")
+    return PageFetch(
+        url=url,
+        final_url=page.url,
+        status=response.status if response else None,
+        headers=dict(response.headers) if response else {},
+        html=html,
+        text=_html_to_text(html),
+        links=links,
+        elapsed=time.perf_counter() - started,
+    )
+
+
+def _soup_to_text(soup: BeautifulSoup) -> str:
+    for tag in soup(["script", "style", "noscript"]):
+        tag.decompose()
+    return soup.get_text(separator=" ", strip=True)
+
+
+def _html_to_text(html: str) -> str:
+    return _soup_to_text(BeautifulSoup(html, HTML_PARSER))
+
+
+def _page_from_http(resp: HttpResponse) -> PageFetch:
+    soup = BeautifulSoup(resp.html, HTML_PARSER)
+    links = [urljoin(resp.final_url, a["href"]) for a in soup.find_all("a", href=True)]
+    return PageFetch(
+        url=resp.url,
+        final_url=resp.final_url,
+        status=resp.status,
+        headers=resp.headers,
+        html=resp.html,
+        text=_soup_to_text(soup),
+        links=links,
+        elapsed=resp.elapsed,
+        tier="http",
+        not_modified=resp.not_modified,
+    )
+
+
+async def fetch_page(url: str, readiness: Optional[Readiness] = None) -> PageFetch:
+    """Render `url` once and return its HTML, text, links and response metadata."""
+    readiness = readiness or Readiness()
+    return await browser_pool.run(lambda page: _fetch_with_page(page, url, readiness))
+
+
+def fetch_page_sync(url: str, readiness: Optional[Readiness] = None) -> PageFetch:
+    readiness = readiness or Readiness()
+    return browser_pool.run_sync(lambda page: _fetch_with_page(page, url, readiness))
 
 
 def scrape_url(url: str) -> str:
     """
-    Synchronous single-page scraper using Playwright sync API.
+    Synchronous single-page scraper on the shared browser pool.
     Safe to call from Streamlit/normal sync code.
     """
     try:
-        with sync_playwright() as p:
-            browser = p.chromium.launch(headless=True)
-            page = browser.new_page()
-            page.goto(url, timeout=30000)
-            page.wait_for_load_state("networkidle")
-            # Extra wait for lazy/dynamic content; adjust if needed
-            page.wait_for_timeout(5000)
-            html = page.content()
-            browser.close()
+        return fetch_page_sync(url).text
     except Exception as e:
         print(f"❌ Playwright (sync) failed for {url}: {e}")
         return ""
 
-    soup = BeautifulSoup(html, "html.parser")
-    for tag in soup(["script", "style", "noscript"]):
-        tag.decompose()
-    return soup.get_text(separator=" ", strip=True)
-
 
 # -------------------------------
 # Scrape a single page
 # -------------------------------
 async def scrape_page(url: str) -> str:
     try:
-        async with async_playwright() as p:
-            browser = await p.chromium.launch(headless=True)
-            page = await browser.new_page()
-            await page.goto(url, timeout=30000)  # allow more time
-            await page.wait_for_load_state("networkidle")  
-
-            # wait extra for lazy/dynamic content (tweak as needed)
-            await page.wait_for_timeout(5000)  
-
-            html = await page.content()
-            await browser.close()
+        return (await fetch_page(url)).text
     except Exception as e:
         print(f"❌ Playwright failed for {url}: {e}")
         return ""
 
-    soup = BeautifulSoup(html, "html.parser")
-    for tag in soup(["script", "style", "noscript"]):
-        tag.decompose()
-    return soup.get_text(separator=" ", strip=True)
+
+# -------------------------------
+# Tiered fetch: HTTP first, browser only when needed
+# -------------------------------
+class TieredFetcher:
+    """
+    Fetches a page over plain HTTP and only renders it in Chromium when the
+    static HTML looks client-rendered (see `needs_browser`) or the HTTP fetch
+    fails. Non-HTML responses and 4xx errors are final: they come back as an
+    empty page (which the crawl skips) without spending a browser slot.
+    Per-tier page counts and time are kept for the crawl report.
+    """
+
+    def __init__(self, http_enabled: bool = CRAWL_HTTP_TIER, readiness: Optional[Readiness] = None):
+        self.http = HttpFetcher() if http_enabled else None
+        self.readiness = readiness
+        self.stats: Dict[str, TierStats] = {"http": TierStats(), "browser": TierStats()}
+
+    async def fetch(self, url: str, etag: Optional[str] = None,
+                    last_modified: Optional[str] = None) -> PageFetch:
+        if self.http is not None:
+            http_stats = self.stats["http"]
+            started = time.perf_counter()
+            try:
+                resp = await self.http.get(url, etag=etag, last_modified=last_modified)
+            except httpx.HTTPStatusError as e:
+                if 400 <= e.response.status_code < 500:
+                    return self._skip(url, f"http_{e.response.status_code}", e.response.status_code, started)
+                resp, reason = None, f"http_error:{e.response.status_code}"
+            except httpx.HTTPError as e:
+                resp, reason = None, f"http_error:{type(e).__name__}"
+            else:
+                if resp is None:
+                    return self._skip(url, "not_html", None, started)
+
+            if resp is not None:
+                page = _page_from_http(resp)
+                reason = None if resp.not_modified else needs_browser(url, resp.html, page.text)
+            http_stats.seconds += time.perf_counter() - started
+
+            if reason is None:
+                http_stats.pages += 1
+                http_stats.not_modified += int(page.not_modified)
+                return page
+            http_stats.fallback_reasons[reason] = http_stats.fallback_reasons.get(reason, 0) + 1
+
+        started = time.perf_counter()
+        try:
+            return await fetch_page(url, self.readiness)
+        finally:
+            self.stats["browser"].pages += 1
+            self.stats["browser"].seconds += time.perf_counter() - started
+
+    def _skip(self, url: str, reason: str, status: Optional[int], started: float) -> PageFetch:
+        http_stats = self.stats["http"]
+        http_stats.seconds += time.perf_counter() - started
+        http_stats.skipped[reason] = http_stats.skipped.get(reason, 0) + 1
+        print(f"⏭️ Skipping {url} ({reason})")
+        return PageFetch(url=url, final_url=url, status=status, headers={}, html="", text="", tier="http")
+
+    def report(self) -> List[str]:
+        return format_tier_report(self.stats)
+
+    async def aclose(self) -> None:
+        if self.http is not None:
+            await self.http.aclose()
 
 
 # -------------------------------
 # Recursive crawler + manual links
 # -------------------------------
-async def scrape_website_recursive(start_url: str, max_pages: int = 1500, max_depth: int = 300) -> dict:
-    visited = set()
-    scraped_data = {}
-    base_domain = urlparse(start_url).netloc
+CRAWL_RESULT_BUFFER = int(os.getenv("CRAWL_RESULT_BUFFER", "64"))
+
+
+async def iter_crawl(seeds: List[str], max_pages: int = 1500, max_depth: int = 300,
+                     concurrency: int = CRAWL_CONCURRENCY,
+                     known_pages: Optional[Dict[str, dict]] = None) -> AsyncIterator[PageFetch]:
+    """
+    Crawl breadth-first from every seed through one shared frontier, so pages
+    reachable from several seeds are fetched once, yielding each page as soon
+    as it's fetched. Links are followed within the seeds' domains, up to
+    `max_pages` discovered pages per domain (seeds themselves are always
+    fetched), with `concurrency` workers.
+
+    `known_pages` maps URL -> {"etag", "last_modified", "links"} from a
+    previous crawl: validators are sent as conditional GETs, and pages that
+    come back 304 are yielded with `not_modified=True` and their known links.
+
+    At most CRAWL_RESULT_BUFFER pages wait for the consumer, so a slow
+    consumer throttles the crawl instead of buffering the site in memory.
+    """
+    known_pages = known_pages or {}
+    pages_per_domain: Dict[str, int] = {}
+    domains = {urlparse(seed).netloc for seed in seeds}
+    frontier = CrawlFrontier()
+    limiter = HostRateLimiter()
+    fetcher = TieredFetcher()
+    robots = RobotsCache(fetcher.http)
+    results: "asyncio.Queue[Optional[PageFetch]]" = asyncio.Queue(maxsize=CRAWL_RESULT_BUFFER)
 
     # start queue: auto + manual URLs
-    to_visit = [(start_url, 0)]
+    for seed in seeds:
+        frontier.push(seed, 0)
 
-    while to_visit and len(visited) < max_pages:
-        url, depth = to_visit.pop(0)
-        if url in visited or depth > max_depth:
-            continue
+    def domain_full(url: str, depth: int) -> bool:
+        return depth > 0 and pages_per_domain.get(urlparse(url).netloc, 0) >= max_pages
 
-        print(f"🌐 Crawling: {url} (depth {depth}) | Queue size: {len(to_visit)}")
-        text = await scrape_page(url)
-        if not text.strip():
-            continue
+    async def worker():
+        while True:
+            url, depth = await frontier.queue.get()
+            try:
+                if domain_full(url, depth):
+                    continue
+                if not await robots.allowed(url):
+                    print(f"🚫 Disallowed by robots.txt: {url}")
+                    continue
 
-        scraped_data[url] = text
-        visited.add(url)
-        print(f"✅ Crawled: {url}")
+                known = known_pages.get(url, {})
+                host = urlparse(url).netloc
+                async with limiter.host_slot(host):
+                    await limiter.wait_turn(host, await robots.crawl_delay(url))
+                    print(f"🌐 Crawling: {url} (depth {depth}) | Queue size: {len(frontier)}")
+                    try:
+                        # text and links from one fetch
+                        fetched = await fetcher.fetch(url, etag=known.get("etag"),
+                                                      last_modified=known.get("last_modified"))
+                    except Exception as e:
+                        print(f"❌ Fetch failed for {url}: {e}")
+                        continue
 
-        # discover new internal links automatically
-        try:
-            async with async_playwright() as p:
-                browser = await p.chromium.launch(headless=True)
-                page = await browser.new_page()
-                await page.goto(url, timeout=20000)
-                links = await page.eval_on_selector_all("a[href]", "els => els.map(el => el.href)")
-                await browser.close()
-        except:
-            links = []
-
-        for link in links:
-            if urlparse(link).netloc == base_domain and link not in visited:
-                to_visit.append((link, depth + 1))
+                if fetched.not_modified and not fetched.links:
+                    fetched.links = list(known.get("links", []))
+                if (not fetched.text.strip() and not fetched.not_modified) or domain_full(url, depth):
+                    continue
+                pages_per_domain[host] = pages_per_domain.get(host, 0) + 1
+                print(f"✅ Crawled: {url} in {fetched.elapsed:.1f}s ({fetched.tier}"
+                      f"{', not modified' if fetched.not_modified else ''})")
+
+                # discover new internal links automatically
+                if depth < max_depth:
+                    for link in fetched.links:
+                        if urlparse(link).netloc in domains:
+                            frontier.push(link, depth + 1)
+
+                fetched.url = url
+                await results.put(fetched)
+            finally:
+                frontier.queue.task_done()
 
+    async def finish():
+        await frontier.queue.join()
+        await results.put(None)
+
+    tasks = [asyncio.create_task(worker()) for _ in range(max(1, concurrency))]
+    tasks.append(asyncio.create_task(finish()))
+    yielded = 0
+    try:
+        while True:
+            page = await results.get()
+            if page is None:
+                break
+            yielded += 1
+            yield page
+    finally:
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await robots.aclose()
+        await fetcher.aclose()
+
+        print(f"\n📊 Crawl report: {yielded} pages")
+        for line in fetcher.report():
+            print(line)
+
+
+async def crawl_websites(seeds: List[str], max_pages: int = 1500, max_depth: int = 300,
+                         concurrency: int = CRAWL_CONCURRENCY) -> dict:
+    """Collect `iter_crawl` into {normalized_url: page_text}."""
+    scraped_data = {}
+    async for page in iter_crawl(seeds, max_pages=max_pages, max_depth=max_depth, concurrency=concurrency):
+        if page.text.strip():
+            scraped_data[page.url] = page.text
     return scraped_data
 
 
+async def scrape_website_recursive(start_url: str, max_pages: int = 1500, max_depth: int = 300) -> dict:
+    return await crawl_websites([start_url], max_pages=max_pages, max_depth=max_depth)
+
+
 # -------------------------------
 # Runner
 # -------------------------------
@@ -108,3 +364,4 @@ if __name__ == "__main__":
     start_url = "https://www.ditstek.com/"
     site_data = asyncio.run(scrape_website_recursive(start_url, max_pages=1500, max_depth=300))
     print(f"Scraped {len(site_data)} pages.")
+    browser_pool.close()
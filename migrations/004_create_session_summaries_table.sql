@@ -0,0 +1,7 @@
+-- 4. Rolling conversation summaries (one row per session)
+CREATE TABLE IF NOT EXISTS session_summaries (
+    session_id UUID PRIMARY KEY REFERENCES sessions(session_id) ON DELETE CASCADE,
+    summary TEXT NOT NULL,
+    summarized_messages INTEGER NOT NULL DEFAULT 0,  -- leading messages the summary covers
+    updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
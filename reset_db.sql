@@ -2,6 +2,7 @@
 CREATE EXTENSION IF NOT EXISTS "uuid-ossp";
 
 -- Drop tables in correct order (avoid FK conflicts)
+DROP TABLE IF EXISTS session_summaries CASCADE;
 DROP TABLE IF EXISTS messages CASCADE;
 DROP TABLE IF EXISTS sessions CASCADE;
 DROP TABLE IF EXISTS users CASCADE;
@@ -45,3 +46,11 @@ CREATE TABLE messages (
 );
 
 CREATE INDEX idx_messages_session_id ON messages(session_id);
+
+-- 4. Rolling conversation summaries
+CREATE TABLE session_summaries (
+    session_id UUID PRIMARY KEY REFERENCES sessions(session_id) ON DELETE CASCADE,
+    summary TEXT NOT NULL,
+    summarized_messages INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
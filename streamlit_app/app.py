@@ -3,22 +3,15 @@ import streamlit as st
 from datetime import datetime
 import sys
 import os
-import psycopg2
 import uuid  # Import uuid for generating session IDs
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from streamlit_app.session_store import load_sessions, save_session_metadata, load_chat_history_from_session, append_message_to_chat_history
-from backend.api import save_message_to_db
+from backend.message_writer import save_turn
+from backend import db
 
-from backend.chat_logic import build_chatbot_response # ✅ Import patched function
-
-# Database connection parameters
-DB_NAME = "chatbot_db"  # Replace with your actual database name
-DB_USER = "postgres"  # Replace with your actual database username
-DB_PASSWORD = "postgres"  # Replace with your actual database password
-DB_HOST = "localhost"  # Use localhost for local PostgreSQL server
-DB_PORT = 5432  # Correct port number for PostgreSQL
+from backend.chat_logic import stream_chatbot_response
 
 # --- Page Config ---
 st.set_page_config(page_title="Chatbot", layout="wide", initial_sidebar_state="expanded")
@@ -55,16 +48,10 @@ for session in st.session_state.chat_sessions:
         delete_button = st.button("🗑️", key=f"delete_{session['session_id']}")
         if delete_button:
             try:
-                conn = psycopg2.connect(
-                    dbname=DB_NAME, user=DB_USER, password=DB_PASSWORD, host=DB_HOST, port=DB_PORT
-                )
-                cursor = conn.cursor()
-                # Delete messages and session from the database
-                cursor.execute("DELETE FROM messages WHERE session_id = %s", (session["session_id"],))
-                cursor.execute("DELETE FROM sessions WHERE session_id = %s", (session["session_id"],))
-                conn.commit()
-                cursor.close()
-                conn.close()
+                with db.cursor() as cursor:
+                    # Delete messages and session from the database
+                    cursor.execute("DELETE FROM messages WHERE session_id = %s", (session["session_id"],))
+                    cursor.execute("DELETE FROM sessions WHERE session_id = %s", (session["session_id"],))
 
                 # Clear active session if it matches the deleted session
                 if st.session_state.session_id == session["session_id"]:
@@ -101,23 +88,36 @@ if user_input:
         # Prepare plain history for your context function (ignore timestamps)
         # NEW
         plain_history = [(r, m) for r, m, _ in st.session_state.chat_history if r in ("user", "bot")]
-        bot_msg, _ = build_chatbot_response(user_input, plain_history)
+
+        # Render the answer as tokens arrive instead of waiting for the full reply
+        with chat_container:
+            st.markdown(f"**🧑 You:**\n\n{user_input}")
+            answer_placeholder = st.empty()
+        bot_msg = ""
+        meta = {}
+        for piece in stream_chatbot_response(user_input, plain_history, metadata=meta):
+            bot_msg += piece
+            answer_placeholder.markdown(f"**🤖 Bot:**\n\n{bot_msg}▌")
+        answer_placeholder.markdown(f"**🤖 Bot:**\n\n{bot_msg}")
         st.session_state.chat_history.append(("bot", bot_msg, now))
 
 
-        # Save session data
-        if st.session_state.session_id:
-            timestamp = datetime.now().isoformat()  # Define timestamp
-            save_message_to_db(st.session_state.session_id, "user", user_input, timestamp)
-            save_message_to_db(st.session_state.session_id, "bot", bot_msg, timestamp)
-        else:
-            st.session_state.session_id = str(uuid.uuid4())  # Generate a valid UUID for the new session
-            timestamp = datetime.now().isoformat()  # Define timestamp for new session
-            save_session_metadata(
-                st.session_state.session_id,
-                user_input[:30], user_input, bot_msg
-            )
-            st.session_state.chat_sessions = load_sessions()
+        # Save session data; a reply the LLM broke off mid-stream is never saved
+        if not meta.get("failed"):
+            if st.session_state.session_id:
+                timestamp = datetime.now().isoformat()  # Define timestamp
+                save_turn([
+                    (st.session_state.session_id, "user", user_input, timestamp),
+                    (st.session_state.session_id, "bot", bot_msg, timestamp),
+                ])
+            else:
+                st.session_state.session_id = str(uuid.uuid4())  # Generate a valid UUID for the new session
+                timestamp = datetime.now().isoformat()  # Define timestamp for new session
+                save_session_metadata(
+                    st.session_state.session_id,
+                    user_input[:30], user_input, bot_msg
+                )
+                st.session_state.chat_sessions = load_sessions()
 
     except Exception as e:
         append_message_to_chat_history("bot", f"⚠️ Unexpected Error: {str(e)}", st.session_state.chat_history)
@@ -1,21 +1,12 @@
 from datetime import datetime
-import psycopg2
 import uuid
 
-DB_NAME = "chatbot_db"
-DB_USER = "postgres"
-DB_PASSWORD = "postgres"
-DB_HOST = "localhost"
-DB_PORT = "5432"
+from backend import db
 
 def load_sessions():
-    conn = psycopg2.connect(
-        dbname=DB_NAME, user=DB_USER, password=DB_PASSWORD, host=DB_HOST, port=DB_PORT
-    )
-    cursor = conn.cursor()
-    cursor.execute("SELECT session_id, title, timestamp FROM sessions")
-    sessions = cursor.fetchall()
-    conn.close()
+    with db.cursor() as cursor:
+        cursor.execute("SELECT session_id, title, timestamp FROM sessions")
+        sessions = cursor.fetchall()
     return [
         {
             "session_id": session_id,
@@ -34,11 +25,10 @@ def save_session_metadata(session_id: str, title: str, query: str, answer: str):
         # Generate a new UUID if validation fails
         session_id = str(uuid.uuid4())
 
-    conn = psycopg2.connect(
-        dbname=DB_NAME, user=DB_USER, password=DB_PASSWORD, host=DB_HOST, port=DB_PORT
-    )
-    cursor = conn.cursor()
+    with db.cursor() as cursor:
+        _save_session_metadata(cursor, session_id, title, query, answer)
 
+def _save_session_metadata(cursor, session_id, title, query, answer):
     # Save session metadata
     cursor.execute(
         """
@@ -65,10 +55,6 @@ def save_session_metadata(session_id: str, title: str, query: str, answer: str):
         (session_id, "bot", answer)
     )
 
-    conn.commit()
-    cursor.close()
-    conn.close()
-
 def load_chat_history_from_session(session):
     """
     Convert session['history'] (list of dicts with 'query' & 'answer') into
@@ -77,18 +63,14 @@ def load_chat_history_from_session(session):
     return get_chat_history(session["session_id"])
 
 def get_chat_history(session_id):
-    conn = psycopg2.connect(
-        dbname=DB_NAME, user=DB_USER, password=DB_PASSWORD, host=DB_HOST, port=DB_PORT
-    )
-    cursor = conn.cursor()
-    cursor.execute(
-        """
-        SELECT role, message, timestamp FROM messages WHERE session_id = %s ORDER BY id
-        """,
-        (session_id,)
-    )
-    history = cursor.fetchall()
-    conn.close()
+    with db.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT role, message, timestamp FROM messages WHERE session_id = %s ORDER BY id
+            """,
+            (session_id,)
+        )
+        history = cursor.fetchall()
     return [(role, message, timestamp.strftime("%H:%M")) for role, message, timestamp in history]
 
 def append_message_to_chat_history(role, message, chat_history):